@@ -0,0 +1,189 @@
+from __future__ import annotations
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+from .db import DataBase
+
+# Repositories of DataBase exposed with awaitable methods
+REPOSITORIES = ("exchange_repo", "market_repo", "ticker_repo", "equity_repo", "prices_repo", "options_repo", "actions_repo")
+
+# Sentinel queued by close()
+_STOP = object()
+
+Job = Tuple[Callable[[DataBase], Any], Future]
+
+
+class AsyncRepository:
+    """
+    Awaitable proxy of one repository: every method of the wrapped repository is available
+    with the same arguments, and calling it queues the call on the database thread and
+    returns an asyncio future for its result.
+    """
+
+    def __init__(self, database: AsyncDataBase, name: str):
+        self._database = database
+        self._name = name
+
+    def __getattr__(self, method: str) -> Callable[..., asyncio.Future]:
+        if method.startswith("_"):
+            raise AttributeError(method)
+        name = self._name
+
+        def call(*args: Any, **kwargs: Any) -> asyncio.Future:
+            return self._database.run(lambda db: getattr(getattr(db, name), method)(*args, **kwargs))
+
+        call.__name__ = method
+        return call
+
+    def __repr__(self) -> str:
+        return f"AsyncRepository({self._name})"
+
+
+class AsyncDataBase:
+    """
+    asyncio facade over DataBase for ingestion running inside an event loop (e.g. ib_insync).
+
+    The DataBase and its connection live on one dedicated thread that works through a FIFO
+    queue, so calls never block the loop and run in the order they were made. A call is
+    queued as soon as it is made and returns an asyncio future: await it for the result, or
+    leave it pending (e.g. persisting bars while the next page is requested) and await
+    flush() later. Queued calls that pile up are run as one transaction (each in its own
+    savepoint, so one failure does not undo the others) and commit once.
+
+        adb = AsyncDataBase(path)
+        ticker_id = await adb.ticker_repo.get_or_create("AAPL", 1, exchange_id, currency="USD", source="ibkr")
+        adb.prices_repo.upsert_many(ticker_id, bars)   # queued, not awaited
+        await adb.flush()
+        await adb.close()
+
+    Keyword arguments are passed to DataBase (concurrent, cold_path, bar_store_path, ...).
+    `max_batch` caps how many queued calls share one commit.
+    """
+
+    def __init__(self, db_path: str | None = None, *, max_batch: int = 256, **kwargs: Any):
+        self.max_batch = max_batch
+        self._jobs: queue.SimpleQueue = queue.SimpleQueue()
+        self._last: Future | None = None
+        self._closed = False
+        self._ready: Future = Future()
+        self._thread = threading.Thread(target=self._work, args=(db_path, kwargs), name="AsyncDataBase", daemon=True)
+        self._thread.start()
+        for name in REPOSITORIES:
+            setattr(self, name, AsyncRepository(self, name))
+
+    # ---------- CALLS ----------
+
+    def run(self, fn: Callable[[DataBase], Any]) -> asyncio.Future:
+        """Queue fn(database) on the database thread; returns an asyncio future for its result."""
+        if self._closed:
+            raise RuntimeError("AsyncDataBase is closed")
+        if self._ready.done() and self._ready.exception() is not None:
+            raise self._ready.exception()
+        future = self._last = Future()
+        self._jobs.put((fn, future))
+        if self._ready.done() and self._ready.exception() is not None:
+            # The thread failed to start after the check above and may have drained the
+            # queue before this call landed in it: fail what is left here
+            self._fail_all(self._ready.exception())
+        return asyncio.wrap_future(future)
+
+    def get_custom(self, query: str, params: Tuple[Any, ...] = ()) -> asyncio.Future:
+        return self.run(lambda db: db.get_custom(query, params))
+
+    async def flush(self) -> None:
+        """Wait until every call queued so far has finished (errors are left on their futures)."""
+        # Calls finish in queue order, so the last one queued finishes last
+        if self._last is not None:
+            await asyncio.gather(asyncio.wrap_future(self._last), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Finish the queued calls, then close the connection and stop the thread."""
+        if self._closed:
+            return
+        await self.flush()
+        self._closed = True
+        self._jobs.put(_STOP)
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+
+    async def __aenter__(self) -> AsyncDataBase:
+        await asyncio.wrap_future(self._ready)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    # ---------- DATABASE THREAD ----------
+
+    def _work(self, db_path: str | None, kwargs: dict) -> None:
+        try:
+            db = DataBase(db_path, **kwargs)
+        except BaseException as e:
+            self._ready.set_exception(e)
+            self._fail_all(e)
+            return
+        self._ready.set_result(None)
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch and batch[-1] is _STOP
+                jobs = batch[:-1] if stop else batch
+                if jobs:
+                    self._run_batch(db, jobs)
+                if stop:
+                    break
+        finally:
+            db.close()
+
+    def _next_batch(self) -> List[Any]:
+        """Block for one queued call, then take whatever else is already waiting."""
+        batch = [self._jobs.get()]
+        while batch[-1] is not _STOP and len(batch) < self.max_batch:
+            try:
+                batch.append(self._jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, db: DataBase, jobs: List[Job]) -> None:
+        if len(jobs) == 1:
+            fn, future = jobs[0]
+            _settle(future, fn, db)
+            return
+        outcomes = []
+        try:
+            with db.transaction():
+                for fn, future in jobs:
+                    try:
+                        with db.transaction():
+                            outcomes.append((future, True, fn(db)))
+                    except Exception as e:
+                        outcomes.append((future, False, e))
+        except Exception as e:
+            # The commit itself failed, so nothing in the batch was kept
+            for _, future in jobs:
+                future.set_exception(e)
+            return
+        # Results are only handed back once the batch is committed
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _fail_all(self, error: BaseException) -> None:
+        """Fail every queued call (each is taken off the queue once, by whichever thread gets it)."""
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not _STOP:
+                job[1].set_exception(error)
+
+def _settle(future: Future, fn: Callable[[DataBase], Any], db: DataBase) -> None:
+    try:
+        future.set_result(fn(db))
+    except Exception as e:
+        future.set_exception(e)
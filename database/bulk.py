@@ -0,0 +1,70 @@
+from __future__ import annotations
+import json
+import sqlite3 as sql
+from typing import Any, Iterable, List, Mapping, Sequence, Tuple
+
+class BulkRepository:
+    """
+    Set-based helpers shared by the reference-data repositories, driven by the
+    TABLE_NAME / ID_COL / COLUMNS metadata of database/repo_template.txt.
+
+    Lists of keys are bound as a single JSON array parameter and expanded with
+    json_each, so a lookup over 50k symbols is one statement with no variable-limit
+    chunking. Writes use executemany and commit once (deferred inside DataBase.transaction()).
+    """
+
+    TABLE_NAME: str
+    ID_COL: str
+    COLUMNS: List[str]
+
+    connection: sql.Connection
+
+    def _select_in(self, keys: Sequence[str], values: Iterable[Any]) -> List[Tuple[Any, ...]]:
+        """Rows (in COLUMNS order) whose key column(s) match any of values (tuples for composite keys)."""
+        values = [list(v) if len(keys) > 1 else v for v in values]
+        if not values:
+            return []
+        cur = self.connection.cursor()
+        cur.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM {self.TABLE_NAME} WHERE {self._match(keys)}",
+            (json.dumps(values),),
+        )
+        return cur.fetchall()
+
+    def _insert_many(self, columns: Sequence[str], rows: Iterable[Sequence[Any]], *, ignore: bool = False) -> int:
+        """executemany INSERT of rows (values in `columns` order); returns number of rows inserted."""
+        cur = self.connection.cursor()
+        cur.executemany(
+            f"INSERT {'OR IGNORE ' if ignore else ''}INTO {self.TABLE_NAME} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+        self._written()
+        return cur.rowcount
+
+    def _delete_in(self, keys: Sequence[str], values: Iterable[Any]) -> int:
+        """Delete rows whose key column(s) match any of values; returns number of rows deleted."""
+        values = [list(v) if len(keys) > 1 else v for v in values]
+        if not values:
+            return 0
+        cur = self.connection.cursor()
+        cur.execute(f"DELETE FROM {self.TABLE_NAME} WHERE {self._match(keys)}", (json.dumps(values),))
+        self._written()
+        return cur.rowcount
+
+    @staticmethod
+    def _match(keys: Sequence[str]) -> str:
+        """WHERE clause matching key column(s) against the JSON array bound as the only parameter."""
+        if len(keys) == 1:
+            return f"{keys[0]} IN (SELECT value FROM json_each(?))"
+        parts = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(keys)))
+        return f"({', '.join(keys)}) IN (SELECT {parts} FROM json_each(?))"
+
+    def _written(self) -> None:
+        self.connection.commit()
+        registry = getattr(self, "registry", None)
+        if registry is not None:
+            registry.invalidate()
+
+def row_values(row: Mapping[str, Any], columns: Sequence[str], defaults: Mapping[str, Any]) -> Tuple[Any, ...]:
+    """Values of a row mapping in column order, falling back to defaults for missing columns."""
+    return tuple(row[column] if column in row else defaults.get(column) for column in columns)
@@ -0,0 +1,441 @@
+from __future__ import annotations
+import re
+import threading
+import sqlite3 as sql
+from pathlib import Path
+from collections import deque
+from time import perf_counter
+from typing import Any, Iterable, Iterator, List, Optional
+from .instrumentation import Instrumentation, TracedCursor
+
+# Statements that can run on a read-only connection
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH|EXPLAIN|VALUES)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+def is_read_only(query: str) -> bool:
+    """True if a statement only reads (a WITH clause must not wrap a write)."""
+    if not _READ_ONLY.match(query):
+        return False
+    return not (query.lstrip()[:4].upper() == "WITH" and _WRITES.search(query))
+
+
+class _Batching:
+    """
+    Unit-of-work support shared by Connection and ConnectionPool.
+    Subclasses provide _batch_depth storage and the raw _begin/_end/_run primitives.
+    """
+
+    def transaction(self) -> _Transaction:
+        """
+        Context manager grouping every write into one transaction: repository commit()
+        calls are deferred, the outermost block commits once on exit and rolls back on error.
+        Nested blocks become SAVEPOINTs, so an inner failure only undoes the inner block.
+        """
+        return _Transaction(self)
+
+    @property
+    def batching(self) -> bool:
+        """True inside transaction(), where commit() is deferred."""
+        return self._batch_depth > 0
+
+
+class _Transaction:
+    def __init__(self, connection: _Batching):
+        self._connection = connection
+        self._savepoint: Optional[str] = None
+
+    def __enter__(self) -> _Transaction:
+        connection = self._connection
+        depth = connection._batch_depth
+        if depth == 0:
+            connection._begin()
+        else:
+            self._savepoint = f"batch_{depth}"
+            connection._run(f"SAVEPOINT {self._savepoint}")
+        connection._batch_depth = depth + 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        connection = self._connection
+        connection._batch_depth -= 1
+        if self._savepoint is None:
+            connection._end(commit=exc_type is None)
+        elif exc_type is None:
+            connection._run(f"RELEASE {self._savepoint}")
+        else:
+            connection._run(f"ROLLBACK TO {self._savepoint}")
+            connection._run(f"RELEASE {self._savepoint}")
+        if exc_type is not None:
+            # Objects cached since the savepoint/transaction began may no longer exist
+            registry = getattr(connection, "registry", None)
+            if registry is not None:
+                registry.invalidate()
+
+
+class Connection(_Batching, sql.Connection):
+    """
+    sqlite3 connection used by DataBase.
+    A subclass (unlike sqlite3.Connection) so per-database state can be attached to it,
+    and so commit() can be deferred inside transaction().
+    """
+    _batch_depth = 0
+    # Set by Instrumentation.attach(); cursors then time every statement
+    instrumentation: Optional[Instrumentation] = None
+
+    def cursor(self, factory: Any = None) -> sql.Cursor:
+        if factory is None:
+            factory = TracedCursor if self.instrumentation is not None else sql.Cursor
+        return super().cursor(factory)
+
+    def execute(self, query: str, params: Any = ()) -> sql.Cursor:
+        if self.instrumentation is None:
+            return super().execute(query, params)
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query: str, seq_of_params: Iterable[Any]) -> sql.Cursor:
+        if self.instrumentation is None:
+            return super().executemany(query, seq_of_params)
+        return self.cursor().executemany(query, seq_of_params)
+
+    def commit(self) -> None:
+        """Commit, unless inside transaction() (the outermost block commits on exit)."""
+        if not self._batch_depth:
+            self._commit()
+
+    def _commit(self) -> None:
+        if self.instrumentation is None or not self.in_transaction:
+            return super().commit()
+        self.instrumentation.start()
+        steps = self.vm_steps[0]
+        started = perf_counter()
+        super().commit()
+        self.instrumentation.record(self, "COMMIT", (), perf_counter() - started, self.vm_steps[0] - steps, 0, explain=False)
+
+    def _run(self, statement: str) -> None:
+        self.execute(statement)
+
+    def _begin(self) -> None:
+        if not self.in_transaction:
+            self.execute("BEGIN")
+
+    def _end(self, commit: bool) -> None:
+        if commit:
+            self._commit()
+        else:
+            super().rollback()
+
+
+def tune(connection: sql.Connection, *, mmap_size: int, cache_size: int) -> None:
+    """Apply the read/write performance pragmas shared by every pooled connection."""
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    connection.execute(f"PRAGMA cache_size = {int(cache_size)}")
+
+
+class PooledCursor:
+    """
+    Cursor handed out by ConnectionPool.
+    Read-only statements run on a pooled reader connection, which goes back to the pool
+    once the result set is consumed; everything else runs on the shared writer.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._cursor: Optional[sql.Cursor] = None
+        self._reader: Optional[sql.Connection] = None
+
+    # ---------- EXECUTE ----------
+
+    def execute(self, query: str, params: Any = ()) -> PooledCursor:
+        self._release()
+        if is_read_only(query) and not self._pool.owns_write():
+            self._reader = self._pool.acquire_reader()
+            self._cursor = self._reader.cursor()
+            try:
+                self._cursor.execute(query, params)
+            except Exception:
+                self._release()
+                raise
+        else:
+            with self._pool.writing():
+                self._cursor = self._pool.writer.cursor()
+                self._cursor.execute(query, params)
+        return self
+
+    def executemany(self, query: str, seq_of_params: Iterable[Any]) -> PooledCursor:
+        self._release()
+        with self._pool.writing():
+            self._cursor = self._pool.writer.cursor()
+            self._cursor.executemany(query, seq_of_params)
+        return self
+
+    def executescript(self, script: str) -> PooledCursor:
+        self._release()
+        with self._pool.writing():
+            self._cursor = self._pool.writer.cursor()
+            self._cursor.executescript(script)
+        return self
+
+    # ---------- FETCH ----------
+
+    def fetchone(self) -> Any:
+        row = self._cursor.fetchone() if self._cursor else None
+        if row is None:
+            self._release()
+        return row
+
+    def fetchmany(self, size: int | None = None) -> List[Any]:
+        if self._cursor is None:
+            return []
+        rows = self._cursor.fetchmany(size or self._cursor.arraysize)
+        if not rows:
+            self._release()
+        return rows
+
+    def fetchall(self) -> List[Any]:
+        rows = self._cursor.fetchall() if self._cursor else []
+        self._release()
+        return rows
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._cursor is None:
+            return iter(())
+        return self._drain()
+
+    def _drain(self) -> Iterator[Any]:
+        yield from self._cursor
+        self._release()
+
+    # ---------- STATE ----------
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount if self._cursor else -1
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self._cursor.lastrowid if self._cursor else None
+
+    @property
+    def description(self) -> Any:
+        return self._cursor.description if self._cursor else None
+
+    def close(self) -> None:
+        self._release()
+
+    def _release(self) -> None:
+        """Hand the reader connection (if any) back to the pool."""
+        if self._reader is not None:
+            if self._cursor is not None:
+                self._cursor.close()
+            self._pool.release_reader(self._reader)
+            self._reader = None
+
+    def __del__(self):
+        self._release()
+
+
+class ConnectionPool(_Batching):
+    """
+    WAL-mode connection manager for one SQLite file, usable wherever repositories
+    expect a sqlite3.Connection.
+
+    - One writer connection, serialized across threads. Inside transaction() a thread
+      holds the write lock for the whole block; outside it every write statement takes
+      the lock and commits on its own, so group writes that must be atomic in transaction().
+    - Up to `readers` read-only connections, shared through a thread-safe pool.
+      Under WAL they read a consistent snapshot while the writer keeps ingesting.
+    A thread inside transaction() reads through the writer, so it sees its own writes.
+    """
+    instrumentation: Optional[Instrumentation] = None
+
+    def __init__(self, path: str, *, readers: int = 4, timeout: float = 30.0, mmap_size: int = 256 * 1024 * 1024, cache_size: int = -64_000):
+        if str(path) == ":memory:":
+            raise ValueError("A connection pool needs a database file, not :memory:")
+        self.path = str(path)
+        self._timeout = timeout
+        self._pragmas = {"mmap_size": mmap_size, "cache_size": cache_size}
+
+        self.writer = sql.connect(self.path, timeout=timeout, check_same_thread=False, factory=Connection)
+        self.writer.execute("PRAGMA journal_mode = WAL")
+        self.writer.execute("PRAGMA synchronous = NORMAL")
+        tune(self.writer, **self._pragmas)
+
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._size = readers
+        self._pool_lock = threading.Lock()
+        self._idle: List[sql.Connection] = []
+        self._waiters: deque = deque()
+        self._all_readers: List[sql.Connection] = []
+        self._closed = False
+
+    # ---------- READERS ----------
+
+    def acquire_reader(self) -> sql.Connection:
+        """
+        Take a reader from the pool, opening one while the pool is below its size.
+        When all are busy, wait; released readers are handed to waiters first come first served.
+        """
+        with self._pool_lock:
+            if self._idle:
+                return self._idle.pop()
+            if len(self._all_readers) >= self._size:
+                waiter = [threading.Event(), None]
+                self._waiters.append(waiter)
+            else:
+                waiter = None
+                self._all_readers.append(None)  # reserve the slot while connecting
+        if waiter is not None:
+            waiter[0].wait()
+            return waiter[1]
+        try:
+            uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+            reader = sql.connect(uri, uri=True, timeout=self._timeout, check_same_thread=False, factory=Connection)
+            tune(reader, **self._pragmas)
+            if self.instrumentation is not None:
+                self.instrumentation.attach(reader)
+        except Exception:
+            with self._pool_lock:
+                self._all_readers.remove(None)
+            raise
+        with self._pool_lock:
+            self._all_readers[self._all_readers.index(None)] = reader
+        return reader
+
+    def release_reader(self, reader: sql.Connection) -> None:
+        """Return a reader to the pool, or straight to the longest waiting thread."""
+        if reader.in_transaction:
+            reader.rollback()
+        with self._pool_lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter[1] = reader
+                waiter[0].set()
+            else:
+                self._idle.append(reader)
+
+    # ---------- WRITER ----------
+
+    def owns_write(self) -> bool:
+        """True if this thread holds the write lock (is inside transaction() or a write statement)."""
+        return getattr(self._local, "writing", False)
+
+    def writing(self) -> _WriteScope:
+        """Context manager that holds the write lock for a statement (and commits it outside transaction())."""
+        return _WriteScope(self)
+
+    def _acquire_write(self) -> None:
+        if not self.owns_write():
+            self._write_lock.acquire()
+            self._local.writing = True
+
+    def _release_write(self) -> None:
+        if self.owns_write():
+            self._local.writing = False
+            self._write_lock.release()
+
+    # ---------- CONNECTION API ----------
+
+    def cursor(self) -> PooledCursor:
+        return PooledCursor(self)
+
+    def execute(self, query: str, params: Any = ()) -> PooledCursor:
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query: str, seq_of_params: Iterable[Any]) -> PooledCursor:
+        return self.cursor().executemany(query, seq_of_params)
+
+    def executescript(self, script: str) -> PooledCursor:
+        return self.cursor().executescript(script)
+
+    def commit(self) -> None:
+        """
+        Commit this thread's write transaction and release the writer (no-op if it has none,
+        as writes outside transaction() commit themselves). Deferred inside transaction().
+        """
+        if self.owns_write() and not self._batch_depth:
+            try:
+                self.writer.commit()
+            finally:
+                self._release_write()
+
+    def rollback(self) -> None:
+        """Roll back this thread's write transaction and release the writer (no-op if it has none)."""
+        if self.owns_write():
+            try:
+                self.writer.rollback()
+            finally:
+                self._release_write()
+
+    # ---------- BATCHING ----------
+
+    @property
+    def _batch_depth(self) -> int:
+        return getattr(self._local, "batch_depth", 0)
+
+    @_batch_depth.setter
+    def _batch_depth(self, depth: int) -> None:
+        self._local.batch_depth = depth
+
+    def _run(self, statement: str) -> None:
+        self.writer.execute(statement)
+
+    def _begin(self) -> None:
+        # The thread keeps the writer for the whole batch, reads included
+        self._acquire_write()
+        if not self.writer.in_transaction:
+            self.writer.execute("BEGIN")
+
+    def _end(self, commit: bool) -> None:
+        try:
+            if commit:
+                self.writer.commit()
+            else:
+                self.writer.rollback()
+        finally:
+            self._release_write()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.owns_write() and self.writer.in_transaction
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for reader in self._all_readers:
+            if reader is not None:
+                reader.close()
+        self.writer.close()
+
+    def __getattr__(self, name: str) -> Any:
+        # Anything else (total_changes, create_function, ...) is a writer attribute
+        if name == "writer":
+            raise AttributeError(name)
+        return getattr(self.writer, name)
+
+
+class _WriteScope:
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._acquired = False
+
+    def __enter__(self) -> None:
+        self._acquired = not self._pool.owns_write()
+        self._pool._acquire_write()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self._acquired:
+            # Inside transaction(): its block commits and releases the writer
+            return
+        # Outside transaction() a write commits on its own, so the lock never outlives the statement
+        writer = self._pool.writer
+        try:
+            if writer.in_transaction:
+                if exc_type is None:
+                    writer.commit()
+                else:
+                    writer.rollback()
+        finally:
+            self._pool._release_write()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+from typing import Any, Tuple, Dict
+from dataclasses import dataclass
+from datetime import time
+import numpy as np
+import pandas as pd
+
+# Regular trading hours (local time) by exchange name. Lunch breaks and holidays are not modelled.
+SESSION_HOURS: Dict[str, Tuple[time, time]] = {
+    "NYSE": (time(9, 30), time(16, 0)),
+    "NASDAQ": (time(9, 30), time(16, 0)),
+    "ARCA": (time(9, 30), time(16, 0)),
+    "AMEX": (time(9, 30), time(16, 0)),
+    "TSX": (time(9, 30), time(16, 0)),
+    "LSE": (time(8, 0), time(16, 30)),
+    "JPX": (time(9, 0), time(15, 0)),
+    "SSE": (time(9, 30), time(15, 0)),
+    "HKEX": (time(9, 30), time(16, 0)),
+    "ASX": (time(10, 0), time(16, 0)),
+}
+
+@dataclass(frozen=True)
+class TradingSession:
+    """
+    Local trading hours of an exchange.
+    A session whose close is not after its open (the default) spans the whole day.
+    Weekdays use Monday = 0.
+    """
+    timezone: str = "UTC"
+    open: time = time(0, 0)
+    close: time = time(0, 0)
+    weekdays: Tuple[int, ...] = (0, 1, 2, 3, 4)
+
+    @property
+    def open_seconds(self) -> int:
+        """Seconds after local midnight the session opens."""
+        return self.open.hour * 3600 + self.open.minute * 60 + self.open.second
+
+    @property
+    def close_seconds(self) -> int:
+        """Seconds after local midnight the session closes (86400 for a full-day session)."""
+        seconds = self.close.hour * 3600 + self.close.minute * 60 + self.close.second
+        return seconds if seconds > self.open_seconds else 86400
+
+def session_for(exchange_name: str | None, timezone: str | None) -> TradingSession:
+    """Return the trading session for an exchange, falling back to a full local day."""
+    hours = SESSION_HOURS.get((exchange_name or "").upper())
+    if hours is None:
+        return TradingSession(timezone or "UTC")
+    return TradingSession(timezone or "UTC", *hours)
+
+def session_intervals(session: TradingSession, start: Any, end: Any) -> np.ndarray:
+    """
+    UTC epoch (open, close) pairs of the sessions overlapping [start, end), clipped to it,
+    as an (n, 2) int64 array. start/end may be epoch seconds; naive datetimes are taken as UTC.
+    """
+    first, last = (pd.Timestamp(t, unit="s") if isinstance(t, (int, np.integer)) else pd.Timestamp(t) for t in (start, end))
+    first = first.tz_localize("UTC") if first.tzinfo is None else first
+    last = last.tz_localize("UTC") if last.tzinfo is None else last
+    if last <= first:
+        return np.empty((0, 2), dtype="int64")
+    # A day either side, so sessions that cross UTC midnight are found
+    days = pd.date_range(first.tz_convert(session.timezone).date() - pd.Timedelta(days=1), last.tz_convert(session.timezone).date() + pd.Timedelta(days=1), freq="D")
+    days = days[np.isin(days.weekday, session.weekdays)]
+    local = {"ambiguous": True, "nonexistent": "shift_forward"}
+    opens = (days + pd.Timedelta(seconds=session.open_seconds)).tz_localize(session.timezone, **local)
+    closes = (days + pd.Timedelta(seconds=session.close_seconds)).tz_localize(session.timezone, **local)
+    spans = np.column_stack([opens.as_unit("s").asi8, closes.as_unit("s").asi8])
+    spans = np.clip(spans, int(first.timestamp()), int(last.timestamp()))
+    return spans[spans[:, 1] > spans[:, 0]]
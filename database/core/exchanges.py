@@ -1,8 +1,10 @@
 from __future__ import annotations
 import sqlite3 as sql
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Iterable, Mapping, Dict
 from dataclasses import dataclass
 from functools import cached_property
+from ..registry import MISSING, registry_for
+from ..bulk import BulkRepository
 
 
 @dataclass
@@ -22,17 +24,23 @@ class Exchange:
     def markets(self):
         """Return all markets for this exchange."""
         from .markets import MarketRepository
-        repo = MarketRepository(self.connection)
+        repo = registry_for(self.connection).repo(MarketRepository)
         return repo.get_by_exchange(self.id)
 
     @cached_property
     def tickers(self):
         """Return all tickers for this exchange."""
-        from instruments.tickers import TickerRepository
-        repo = TickerRepository(self.connection)
+        from ..instruments.tickers import TickerRepository
+        repo = registry_for(self.connection).repo(TickerRepository)
         return repo.get_by_exchange(self.id)
 
-class ExchangeRepository:
+    @cached_property
+    def session(self):
+        """Return the local trading session for this exchange."""
+        from .calendars import session_for
+        return session_for(self.name, self.timezone)
+
+class ExchangeRepository(BulkRepository):
     """
     Data-access layer for the `exchanges` table.
 
@@ -45,32 +53,52 @@ class ExchangeRepository:
         gets:
             get_all() -> List[Tuple[int, str, str]]
             get_at(exchange_id: int) -> Optional[Tuple[int, str, str]]
+            get_many(*, exchange_ids=None, exchange_names=None) -> List[Exchange]
         creates:
             create(exchange_name: str, timezone: str) -> int
             get_or_create(exchange_name: str, *, timezone: Optional[str] = None) -> int
+            create_many(exchanges: Mapping[str, str]) -> int
+            get_or_create_many(exchanges: Mapping[str, str | None]) -> Dict[str, int]
         updates:
             update(exchange_id: int, *, exchange_name: Optional[str] = None, timezone: Optional[str] = None) -> int
         deletes:
             delete(*, exchange_id: Optional[int] = None, exchange_name: Optional[str] = None) -> int
+            delete_many(*, exchange_ids=None, exchange_names=None) -> int
             delete_all() -> int
     """
 
+    TABLE_NAME = "exchanges"
+    ID_COL     = "exchange_id"
+    COLUMNS    = ["exchange_id", "exchange_name", "timezone"]
+
     def __init__(self, connection: sql.Connection):
         self.connection = connection
         # Ensure foreign key constraints are enforced
         self.connection.execute("PRAGMA foreign_keys = ON")
+        self.registry = registry_for(connection)
+
+    def _exchange(self, row: Tuple[int, str, str]) -> Exchange:
+        """Return the shared Exchange object for a row."""
+        return self.registry.remember("exchange", row[0], lambda: Exchange(*row, connection=self.connection))
 
     # ---------- READ ----------
 
     def get_all(self) -> List[Tuple[int, str, str]]:
         """Return all exchanges as a list of (id, name, timezone)."""
+        generation = self.registry.generation
         cur = self.connection.cursor()
         cur.execute("SELECT exchange_id, exchange_name, timezone FROM exchanges")
         rows = cur.fetchall()
-        return [Exchange(*row, connection=self.connection) for row in rows]
+        exchanges = [self._exchange(row) for row in rows]
+        self.registry.mark_complete("exchange", generation)
+        return exchanges
 
     def get_info(self, exchange_id: int | None = None, exchange_name: str | None = None) -> Exchange | None:
         """Return a single exchange row or None if not found."""
+        if exchange_id is not None:
+            cached = self.registry.lookup("exchange", exchange_id)
+            if cached is not MISSING:
+                return cached
         cur = self.connection.cursor()
         try:    
             cur.execute(
@@ -81,9 +109,16 @@ class ExchangeRepository:
             print(f"SQL error: {e}")
             return None
         row = cur.fetchone()
-        return Exchange(*row, connection=self.connection) if row else None
+        return self._exchange(row) if row else None
     
 
+    def get_many(self, *, exchange_ids: Iterable[int] | None = None, exchange_names: Iterable[str] | None = None) -> List[Exchange]:
+        """Return the exchanges matching any of the given ids or names, in one query."""
+        if exchange_ids is None and exchange_names is None:
+            raise ValueError("Provide exchange_ids or exchange_names")
+        rows = self._select_in(["exchange_id"], exchange_ids or []) + self._select_in(["exchange_name"], exchange_names or [])
+        return list({exchange.id: exchange for exchange in map(self._exchange, rows)}.values())
+
     # ---------- CREATE ----------
 
     def create(self, exchange_name: str, timezone: str) -> int:
@@ -96,6 +131,7 @@ class ExchangeRepository:
             (exchange_name, timezone),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return cur.lastrowid
 
     def get_or_create(self, exchange_name: str, *, timezone: Optional[str] = None) -> int:
@@ -122,8 +158,30 @@ class ExchangeRepository:
             (exchange_name, timezone),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return cur.lastrowid
 
+    def create_many(self, exchanges: Mapping[str, str]) -> int:
+        """
+        Insert many exchanges ({exchange_name: timezone}) with one executemany.
+        Returns number of rows inserted.
+        """
+        if not all(exchanges.values()):
+            raise ValueError("timezone must be provided for every exchange")
+        return self._insert_many(["exchange_name", "timezone"], exchanges.items())
+
+    def get_or_create_many(self, exchanges: Mapping[str, str | None]) -> Dict[str, int]:
+        """
+        Return {exchange_name: exchange_id} for many exchanges ({exchange_name: timezone}),
+        creating the missing ones (which need a timezone). One lookup and one insert in total.
+        """
+        ids = {exchange.name: exchange.id for exchange in self.get_many(exchange_names=exchanges)}
+        missing = {name: timezone for name, timezone in exchanges.items() if name not in ids}
+        if missing:
+            self.create_many(missing)
+            ids.update({exchange.name: exchange.id for exchange in self.get_many(exchange_names=missing)})
+        return ids
+
     # ---------- UPDATE ----------
 
     def update(
@@ -153,6 +211,7 @@ class ExchangeRepository:
         cur = self.connection.cursor()
         cur.execute(sql_query, tuple(values))
         self.connection.commit()
+        self.registry.invalidate()
         return cur.rowcount
 
     # ---------- DELETE ----------
@@ -172,8 +231,18 @@ class ExchangeRepository:
             cur.execute("DELETE FROM exchanges WHERE exchange_name = ?", (exchange_name,))
 
         self.connection.commit()
+        self.registry.invalidate()
         return 1
 
+    def delete_many(self, *, exchange_ids: Iterable[int] | None = None, exchange_names: Iterable[str] | None = None) -> int:
+        """
+        Delete exchanges by ids and/or names.
+        Returns number of rows deleted.
+        """
+        if exchange_ids is None and exchange_names is None:
+            raise ValueError("Provide exchange_ids or exchange_names")
+        return self._delete_in(["exchange_id"], exchange_ids or []) + self._delete_in(["exchange_name"], exchange_names or [])
+
     def delete_all(self) -> int:
         """
         Delete ALL exchanges.
@@ -183,4 +252,5 @@ class ExchangeRepository:
         cur = self.connection.cursor()
         cur.execute("DELETE FROM exchanges")
         self.connection.commit()
+        self.registry.invalidate()
         return 1
\ No newline at end of file
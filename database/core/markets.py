@@ -1,9 +1,11 @@
 from __future__ import annotations
 import sqlite3 as sql
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Iterable, Dict
 from dataclasses import dataclass
 from functools import cached_property
 from enum import IntEnum
+from ..registry import MISSING, registry_for
+from ..bulk import BulkRepository
 
 class MarketType(IntEnum):
     EQUITIES = 1
@@ -25,18 +27,18 @@ class Market:
     def exchange(self):
         """Return the exchange for this market."""
         from .exchanges import ExchangeRepository
-        repo = ExchangeRepository(self.connection)
+        repo = registry_for(self.connection).repo(ExchangeRepository)
         return repo.get_info(self.exchange_id)
 
     # Ladder Down Properties
     @cached_property
     def tickers(self):
         """Return all tickers for this market."""
-        from instruments.tickers import TickerRepository
-        repo = TickerRepository(self.connection)
-        return repo.get_by_market(self.id)
+        from ..instruments.tickers import TickerRepository
+        repo = registry_for(self.connection).repo(TickerRepository)
+        return repo.get_by_market(self.id, self.exchange_id)
 
-class MarketRepository:
+class MarketRepository(BulkRepository):
     """
     Data-access layer for the `markets` table.
 
@@ -47,19 +49,31 @@ class MarketRepository:
     
     """
 
+    TABLE_NAME = "markets"
+    ID_COL     = "market_id"
+    COLUMNS    = ["market_id", "exchange_id", "market_name"]
+
     def __init__(self, connection: sql.Connection):
         self.connection = connection
         # Ensure foreign key constraints are enforced
         self.connection.execute("PRAGMA foreign_keys = ON;")
+        self.registry = registry_for(connection)
+
+    def _market(self, row: Tuple[int, int, str]) -> Market:
+        """Return the shared Market object for a row (keyed by market_id and exchange_id)."""
+        return self.registry.remember("market", (row[0], row[1]), lambda: Market(*row, connection=self.connection))
     
     # ---------- READ ----------
 
     def get_all(self) -> List[Market]:
         """Return all markets as a list of Market objects."""
+        generation = self.registry.generation
         cur = self.connection.cursor()
         cur.execute("SELECT market_id, exchange_id, market_name FROM markets")
         rows = cur.fetchall()
-        return [Market(*row, connection=self.connection) for row in rows]
+        markets = [self._market(row) for row in rows]
+        self.registry.mark_complete("market", generation)
+        return markets
     
     # Maybe make this able to fetch based on name too???
     def get_info(self, market_id: int, exchange_id: int) -> Market | None:
@@ -73,6 +87,9 @@ class MarketRepository:
             market_type = MarketType(market_id)
         except ValueError:
             raise ValueError("Invalid market_id")
+        cached = self.registry.lookup("market", (market_type.value, exchange_id))
+        if cached is not MISSING:
+            return cached
         cur = self.connection.cursor()
         try:
             cur.execute(
@@ -83,7 +100,7 @@ class MarketRepository:
             print(f"SQL error: {e}")
             return None
         row = cur.fetchone()
-        return Market(*row, connection=self.connection) if row else None
+        return self._market(row) if row else None
 
     def get_by_exchange(self, exchange_id: int) -> List[Market]:
         """
@@ -92,9 +109,15 @@ class MarketRepository:
         if exchange_id is None:
             raise ValueError("Provide exchange_id")
 
-        cur = self.connection.cursor()
-        cur.execute("SELECT market_id, exchange_id, market_name FROM markets WHERE exchange_id = ?", (exchange_id,))
-        return [Market(*row, connection=self.connection) for row in cur.fetchall()]
+        def load() -> List[Market]:
+            cur = self.connection.cursor()
+            cur.execute("SELECT market_id, exchange_id, market_name FROM markets WHERE exchange_id = ?", (exchange_id,))
+            return [self._market(row) for row in cur.fetchall()]
+        return list(self.registry.relation("exchange_markets", exchange_id, load))
+
+    def get_many(self, markets: Iterable[Tuple[int, int]]) -> List[Market]:
+        """Return the markets matching any of the (market_id, exchange_id) pairs, in one query."""
+        return [self._market(row) for row in self._select_in(["market_id", "exchange_id"], markets)]
 
     # ---------- CREATE ----------
 
@@ -113,6 +136,7 @@ class MarketRepository:
             (market_type.value, exchange_id, market_type.name),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return cur.lastrowid
 
     def get_or_create(self, market_id: int, exchange_id: int) -> int:
@@ -141,8 +165,31 @@ class MarketRepository:
             (market_type.value, exchange_id, market_type.name),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return cur.lastrowid
 
+    def create_many(self, markets: Iterable[Tuple[int, int]]) -> int:
+        """
+        Insert many (market_id, exchange_id) markets with one executemany.
+        Returns number of rows inserted.
+        """
+        try:
+            rows = [(MarketType(market_id).value, exchange_id, MarketType(market_id).name) for market_id, exchange_id in markets]
+        except ValueError:
+            raise ValueError("Invalid market_id")
+        return self._insert_many(["market_id", "exchange_id", "market_name"], rows)
+
+    def get_or_create_many(self, markets: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
+        """
+        Return {(market_id, exchange_id): market_id} for many markets, creating the missing ones.
+        """
+        markets = list(dict.fromkeys((int(market_id), int(exchange_id)) for market_id, exchange_id in markets))
+        found = {(market.id, market.exchange_id) for market in self.get_many(markets)}
+        missing = [market for market in markets if market not in found]
+        if missing:
+            self.create_many(missing)
+        return {market: market[0] for market in markets}
+
     # ---------- UPDATE ----------
 
     def delete(self, market_id: int, exchange_id: int) -> int:
@@ -159,8 +206,16 @@ class MarketRepository:
             (market_id, exchange_id),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return 1
 
+    def delete_many(self, markets: Iterable[Tuple[int, int]]) -> int:
+        """
+        Delete markets by (market_id, exchange_id) pairs.
+        Returns number of rows deleted.
+        """
+        return self._delete_in(["market_id", "exchange_id"], markets)
+
     def delete_all(self) -> int:
         """
         Delete ALL markets.
@@ -170,4 +225,5 @@ class MarketRepository:
         cur = self.connection.cursor()
         cur.execute("DELETE FROM markets")
         self.connection.commit()
+        self.registry.invalidate()
         return 1
\ No newline at end of file
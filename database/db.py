@@ -3,7 +3,16 @@ import sqlite3 as sql
 from .core.exchanges import ExchangeRepository
 from .core.markets import MarketRepository
 from .instruments.tickers import TickerRepository, EquitiesRepository
+from .technical_data.historical_prices import HistoricalPricesRepository, Layout, RetentionPolicy, RetentionReport, price_schema
+from .technical_data.cold_storage import ColdStore
+from .technical_data.memmap_store import MemmapPricesRepository
+from .technical_data.option_chains import OptionChainsRepository, option_schema, repair_option_schema
+from .technical_data.corporate_actions import CorporateActionsRepository, corporate_action_schema
+from .connection import Connection, ConnectionPool
+from .registry import registry_for
+from .instrumentation import Instrumentation
 import os
+from datetime import timedelta
 
 try:
     from dotenv import load_dotenv
@@ -16,27 +25,89 @@ except Exception as e:
     print("Not using environment variables, please configure your .env file.")
 
 class DataBase:
-    def __init__(self, db_path=env_path):
+    """
+    Entry point to the market database: owns the connection and one repository per table.
+
+    With concurrent=True the database runs in WAL mode behind a ConnectionPool: a pool of
+    `readers` read-only connections plus one serialized writer, shared by all repositories
+    and safe to use across threads, so readers keep running while ingestion writes.
+
+    With bar_store_path set, bars live in memory-mapped binary column files under that
+    directory (MemmapPricesRepository) instead of the historical_prices table.
+
+    With cold_path set, bars older than `cold_horizon` can be moved to Parquet files under
+    that directory (tier_prices()); price reads merge them back in transparently.
+
+    With retention set, enforce_retention() downsamples and deletes aged intraday bars by
+    that RetentionPolicy (run it from a scheduler; each run is bounded and resumable).
+    With bar_store_path set it deletes base bars older than policy.raw outright, as the
+    memmap store keeps no rollups to downsample into.
+
+    Splits and dividends are kept by actions_repo; price reads with adjusted=True apply
+    them to the stored bars on the fly.
+
+    With trace=True (or an Instrumentation) every statement is timed and attributed to the
+    repository method that ran it; statements slower than slow_query_ms are reported with
+    their query plan. See db.instrumentation.report() / export().
+
+    Exchange/Market/Ticker objects are cached per database in `registry` (an identity map
+    cleared on every write through the repositories).
+    """
+    def __init__(self, db_path=env_path, *, concurrent: bool = False, readers: int = 4, cold_path: str | None = None, cold_horizon: timedelta = timedelta(days=730), bar_store_path: str | None = None, trace: bool | Instrumentation = False, slow_query_ms: float = 100.0, retention: RetentionPolicy | None = None):
         self.path = db_path
-        self.connection = sql.connect(db_path)
+        self.retention = retention
+        if concurrent:
+            self.connection = ConnectionPool(db_path, readers=readers)
+        else:
+            self.connection = sql.connect(db_path, factory=Connection)
+        self.instrumentation = None
+        if trace:
+            self.instrumentation = trace if isinstance(trace, Instrumentation) else Instrumentation(threshold_ms=slow_query_ms)
+            self.instrumentation.attach(self.connection)
         self.connection.execute("PRAGMA foreign_keys = ON")
-        self.exchange_repo = ExchangeRepository(self.connection)
-        self.market_repo = MarketRepository(self.connection)
-        self.ticker_repo = TickerRepository(self.connection)
-        self.equity_repo = EquitiesRepository(self.connection)
+        # Repositories come from the connection's registry, so the relation properties on
+        # Exchange/Market/Ticker reuse them along with its identity map
+        self.registry = registry_for(self.connection)
+        self.exchange_repo = self.registry.repo(ExchangeRepository)
+        self.market_repo = self.registry.repo(MarketRepository)
+        self.ticker_repo = self.registry.repo(TickerRepository)
+        self.equity_repo = self.registry.repo(EquitiesRepository)
+        if bar_store_path is not None:
+            self.prices_repo = MemmapPricesRepository(self.connection, bar_store_path)
+        else:
+            self.prices_repo = self.registry.repo(HistoricalPricesRepository)
+        self.options_repo = self.registry.repo(OptionChainsRepository)
+        self.actions_repo = self.registry.repo(CorporateActionsRepository)
+        if cold_path is not None:
+            self.prices_repo.attach_cold_store(ColdStore(cold_path, horizon=cold_horizon))
 
     def close(self):
         self.connection.close()
 
+    def transaction(self):
+        """
+        Unit of work across every repository: per-call commits are deferred and the block
+        commits once on exit (rolls back on error). Nested blocks use savepoints.
+
+            with db.transaction():
+                exchange_id = db.exchange_repo.create("NASDAQ", "America/New_York")
+                db.ticker_repo.create("AAPL", 1, exchange_id, currency="USD", source="manual")
+        """
+        return self.connection.transaction()
+
+    batch = transaction
+
     def get_custom(self, query, params=()):
         cur = self.connection.cursor()
         cur.execute(query, params)
         return cur.fetchall()
     
-    def create_db(self):
+    def create_db(self, layout: Layout = "epoch"):
         
         con = self.connection
         cur = con.cursor()
+        # Lets enforce_retention return deleted pages to the OS (only takes effect on a new file)
+        cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
 
         # --- Core Reference Tables ---
         cur.execute('''CREATE TABLE IF NOT EXISTS exchanges (
@@ -54,6 +125,8 @@ class DataBase:
                         FOREIGN KEY (exchange_id) REFERENCES exchanges(exchange_id) ON DELETE CASCADE
                     )''')
         cur.execute('''CREATE INDEX IF NOT EXISTS idx_markets_name ON markets (market_name)''')
+        # Covers MarketRepository.get_by_exchange and the exchanges -> markets cascade
+        cur.execute('''CREATE INDEX IF NOT EXISTS idx_markets_exchange ON markets (exchange_id, market_id, market_name)''')
         
         cur.execute('''CREATE TABLE IF NOT EXISTS tickers (
                         ticker_id INTEGER PRIMARY KEY,
@@ -67,6 +140,10 @@ class DataBase:
                         UNIQUE(symbol, exchange_id),
                         FOREIGN KEY (market_id, exchange_id) REFERENCES markets(market_id, exchange_id) ON DELETE CASCADE
                     )''')
+        # Lookups by symbol alone use the UNIQUE(symbol, exchange_id) index; these serve
+        # get_by_market (and the markets -> tickers cascade) and get_by_exchange
+        cur.execute('''CREATE INDEX IF NOT EXISTS idx_tickers_market ON tickers (market_id, exchange_id)''')
+        cur.execute('''CREATE INDEX IF NOT EXISTS idx_tickers_exchange ON tickers (exchange_id)''')
         
         # --- Market Specific Tables ---
 
@@ -82,6 +159,7 @@ class DataBase:
                         market_cap REAL,
                         FOREIGN KEY (ticker_id) REFERENCES tickers(ticker_id) ON DELETE CASCADE
                     )''')
+        cur.execute('''CREATE INDEX IF NOT EXISTS idx_equities_symbol ON equities (symbol)''')
         
         cur.execute('''CREATE TABLE IF NOT EXISTS bonds (
                         ticker_id INTEGER PRIMARY KEY,
@@ -93,43 +171,20 @@ class DataBase:
                         FOREIGN KEY (ticker_id) REFERENCES tickers(ticker_id) ON DELETE CASCADE
                     )''')
 
-        # --- Equities Tables ---   
-        cur.execute('''CREATE TABLE IF NOT EXISTS historical_prices (
-                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
-                        datetime DATETIME NOT NULL,
-                        open REAL,
-                        high REAL,
-                        low REAL,
-                        close REAL NOT NULL,
-                        volume INTEGER,
-                        PRIMARY KEY (ticker_id, datetime)
-                    )''')
+        # --- Equities Tables ---
+        # historical_prices and its price_rollups (bars pre-aggregated per resolution in seconds),
+        # both maintained by HistoricalPricesRepository. See price_schema for the layouts.
+        for statement in price_schema(layout):
+            cur.execute(statement)
         
-        cur.execute('''CREATE INDEX IF NOT EXISTS idx_prices_ticker_time ON historical_prices (ticker_id, datetime)''')
-        
-        cur.execute('''CREATE TABLE IF NOT EXISTS option_chains (
-                        option_id INTEGER PRIMARY KEY,
-                        ticker_id INTEGER NOT NULL REFERENCES equity_data(ticker_id) ON DELETE CASCADE,
-                        symbol TEXT NOT NULL,
-                        creation_date DATE,
-                        expiration_date DATE NOT NULL,
-                        strike_price REAL NOT NULL,
-                        option_type TEXT NOT NULL,
-                        UNIQUE(ticker_id, expiration_date, strike_price, option_type)
-                    )''')
-        
-        cur.execute('''CREATE TABLE IF NOT EXISTS option_prices (
-                        option_id INTEGER NOT NULL REFERENCES option_chains(option_id) ON DELETE CASCADE,
-                        datetime DATETIME NOT NULL,
-                        bid REAL,
-                        ask REAL,
-                        last_price REAL NOT NULL,
-                        volume INTEGER,
-                        open_interest INTEGER,
-                        PRIMARY KEY (option_id, datetime)
-                    )''')
-        
-        cur.execute('''CREATE INDEX IF NOT EXISTS idx_option_prices_id_time ON option_prices (option_id, datetime)''')
+        # Splits and dividends behind adjusted price reads, see CorporateActionsRepository
+        for statement in corporate_action_schema():
+            cur.execute(statement)
+
+        # option_chains contracts and their option_prices quotes, see option_schema
+        for statement in option_schema():
+            cur.execute(statement)
+        repair_option_schema(con)
 
         # --- Bonds Tables ---
         # TO BE ADDED
@@ -153,15 +208,24 @@ class DataBase:
     def close_db(self):
         self.connection.close()
 
-    # Figure out a persistent schema migration
-    '''
-    def update_schema(self, table, updated_schema):
-        con = self.connection
-        cur = con.cursor()
-        # Drop the existing table
-        cur.execute(f"DROP TABLE IF EXISTS {table}")
-        # Create the new table with the updated schema
-        cur.execute(updated_schema)
-        con.commit()
-        con.close()
-    '''
\ No newline at end of file
+    def tier_prices(self, horizon: timedelta | None = None) -> int:
+        """
+        Move bars older than `horizon` (default: cold_horizon) to the Parquet cold tier.
+        Returns number of bars moved.
+        """
+        return self.prices_repo.tier_to_cold(horizon)
+
+    def enforce_retention(self, policy: RetentionPolicy | None = None, *, max_chunks: int | None = None) -> RetentionReport:
+        """
+        Downsample and delete intraday bars older than the policy (default: `retention`,
+        else RetentionPolicy()) allows, in bounded chunks. Resumes an interrupted run.
+        """
+        return self.prices_repo.enforce_retention(policy or self.retention, max_chunks=max_chunks)
+
+    def migrate_price_layout(self, batch_size: int = 50_000, vacuum: bool = True) -> int:
+        """
+        Convert historical_prices (and its rollups) from the legacy DATETIME text layout
+        to INTEGER epoch timestamps in a WITHOUT ROWID table, in resumable batches.
+        Returns number of rows copied.
+        """
+        return self.prices_repo.migrate_to_epoch(batch_size, vacuum=vacuum)
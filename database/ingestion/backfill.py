@@ -0,0 +1,205 @@
+from __future__ import annotations
+import asyncio
+import math
+from dataclasses import dataclass, field
+from itertools import chain, zip_longest
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Tuple
+import pandas as pd
+from ..async_db import AsyncDataBase
+from .pacing import Pacing, PacingLimiter
+
+# barSizeSetting -> (bar width in seconds, longest durationStr IB serves for it in seconds),
+# from the TWS API table of valid duration / bar size combinations
+BAR_SIZES: Dict[str, Tuple[int, int]] = {
+    "1 secs": (1, 1800),
+    "5 secs": (5, 3600),
+    "10 secs": (10, 14400),
+    "15 secs": (15, 14400),
+    "30 secs": (30, 28800),
+    "1 min": (60, 86400),
+    "2 mins": (120, 2 * 86400),
+    "3 mins": (180, 7 * 86400),
+    "5 mins": (300, 7 * 86400),
+    "10 mins": (600, 7 * 86400),
+    "15 mins": (900, 7 * 86400),
+    "20 mins": (1200, 7 * 86400),
+    "30 mins": (1800, 30 * 86400),
+    "1 hour": (3600, 30 * 86400),
+    "2 hours": (7200, 30 * 86400),
+    "3 hours": (10800, 30 * 86400),
+    "4 hours": (14400, 30 * 86400),
+    "8 hours": (28800, 30 * 86400),
+    "1 day": (86400, 365 * 86400),
+}
+
+# Error codes IB reports for requests refused by pacing (162 only with "pacing violation" in the text)
+PACING_CODES = (162, 420)
+
+def duration_str(seconds: int) -> str:
+    """Shortest durationStr covering `seconds` ("S" up to a day, whole days beyond, "1 Y" for a year)."""
+    if seconds <= 86400:
+        return f"{max(int(seconds), 1)} S"
+    days = math.ceil(seconds / 86400)
+    return "1 Y" if days == 365 else f"{days} D"
+
+def end_date_time(epoch: int) -> str:
+    """endDateTime for a UTC epoch ('YYYYMMDD-HH:MM:SS', the UTC form TWS accepts)."""
+    return pd.Timestamp(epoch, unit="s").strftime("%Y%m%d-%H:%M:%S")
+
+def chunk_range(start: int, end: int, longest: int) -> List[Tuple[int, int]]:
+    """Split [start, end) into request windows of at most `longest` seconds, newest first."""
+    chunks = []
+    while end > start:
+        chunks.append((max(start, end - longest), end))
+        end -= longest
+    return chunks
+
+def is_pacing_error(error: BaseException) -> bool:
+    """Whether an ib_insync RequestError is a pacing violation."""
+    code = getattr(error, "code", None)
+    message = str(getattr(error, "message", error)).lower()
+    return code in PACING_CODES and (code != 162 or "pacing" in message)
+
+def is_no_data(error: BaseException) -> bool:
+    """Whether an ib_insync RequestError only says the window holds no bars."""
+    return getattr(error, "code", None) == 162 and "no data" in str(getattr(error, "message", error)).lower()
+
+
+@dataclass
+class BackfillReport:
+    """What one HistoricalBackfill.run() did."""
+    requests: int = 0
+    bars: int = 0
+    retries: int = 0
+    pacing_violations: int = 0
+    failed: List[Tuple[int, pd.Timestamp, pd.Timestamp, str]] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class _Request:
+    ticker_id: int
+    contract: Any
+    start: int
+    end: int
+
+
+class HistoricalBackfill:
+    """
+    Pacing-aware historical bar backfill from Interactive Brokers (ib_insync's async API)
+    into the price repository of an AsyncDataBase.
+
+        backfill = HistoricalBackfill(ib, adb, bar_size="5 mins")
+        report = await backfill.run({ticker_id: Stock("SPY", "SMART", "USD"), ...}, "2024-01-01")
+
+    For every ticker only the ranges missing_ranges() reports are requested, each split
+    into the longest durationStr IB serves for the bar size. Requests from all tickers are
+    interleaved and issued by `pacing.in_flight` workers through a PacingLimiter, so a
+    universe backfill runs at the broker's limit without tripping it. A pacing violation
+    or timeout is retried after `pacing.identical_gap` seconds (doubling per attempt,
+    every request held back on a violation). Bars are queued on the database as they
+    arrive, with the requested window recorded as covered, so a stopped backfill resumes
+    where it left off.
+
+    While it runs, ib.RaiseRequestErrors is set so failed requests raise instead of
+    returning an empty list.
+    """
+
+    def __init__(self, ib: Any, db: AsyncDataBase, *, bar_size: str = "5 mins", what_to_show: str = "TRADES", use_rth: bool = True, pacing: Pacing = Pacing(), max_attempts: int = 5, timeout: float = 120.0):
+        if bar_size not in BAR_SIZES:
+            raise ValueError(f"Unsupported bar size '{bar_size}'")
+        self.ib = ib
+        self.db = db
+        self.bar_size = bar_size
+        self.resolution, self.longest = BAR_SIZES[bar_size]
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self.pacing = pacing
+        self.limiter = PacingLimiter(pacing)
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    async def run(self, contracts: Mapping[int, Any] | Iterable[Tuple[int, Any]], start_date: Any, end_date: Any = None) -> BackfillReport:
+        """Backfill [start_date, end_date) (default: now) for ticker_id -> contract pairs."""
+        pairs = list(contracts.items() if isinstance(contracts, Mapping) else contracts)
+        end_date = end_date if end_date is not None else pd.Timestamp.now(tz="UTC")
+        gaps = await asyncio.gather(*[self.db.prices_repo.missing_ranges(ticker_id, self.resolution, start_date, end_date) for ticker_id, _ in pairs])
+        per_ticker = [
+            [_Request(ticker_id, contract, *chunk) for first, last in ranges for chunk in chunk_range(int(first.timestamp()), int(last.timestamp()), self.longest)]
+            for (ticker_id, contract), ranges in zip(pairs, gaps)
+        ]
+        queue: asyncio.Queue = asyncio.Queue()
+        for request in chain.from_iterable(zip_longest(*per_ticker)):
+            if request is not None:
+                queue.put_nowait(request)
+
+        report = BackfillReport()
+        writes: List[Tuple[_Request, asyncio.Future]] = []
+        raise_errors = getattr(self.ib, "RaiseRequestErrors", False)
+        self.ib.RaiseRequestErrors = True
+        try:
+            workers = [asyncio.create_task(self._work(queue, report, writes)) for _ in range(min(self.pacing.in_flight, queue.qsize()))]
+            await asyncio.gather(*workers)
+        finally:
+            self.ib.RaiseRequestErrors = raise_errors
+        await asyncio.gather(*(write for _, write in writes), return_exceptions=True)
+        for request, write in writes:
+            if write.exception() is None:
+                report.bars += write.result()
+            else:
+                _fail(report, request, write.exception())
+        return report
+
+    async def _work(self, queue: asyncio.Queue, report: BackfillReport, writes: List[Tuple[_Request, asyncio.Future]]) -> None:
+        while not queue.empty():
+            request = queue.get_nowait()
+            try:
+                bars = await self._fetch(request, report)
+            except Exception as e:
+                _fail(report, request, e)
+                continue
+            # Queued, not awaited: the next request goes out while the bars are written
+            writes.append((request, self.db.prices_repo.create_many(request.ticker_id, bars, resolution=self.resolution, covered=(request.start, request.end))))
+
+    async def _fetch(self, request: _Request, report: BackfillReport) -> List[Any]:
+        """Request one window, retrying pacing violations and timeouts with backoff."""
+        key = _contract_key(request.contract)
+        error: Exception | None = None
+        for attempt in range(self.max_attempts):
+            if error is not None:
+                # Identical requests must be at least identical_gap apart anyway
+                delay = self.pacing.identical_gap * 2 ** (attempt - 1)
+                if is_pacing_error(error):
+                    self.limiter.backoff(delay)
+                report.retries += 1
+                await asyncio.sleep(delay)
+            async with self.limiter.slot(key):
+                report.requests += 1
+                try:
+                    return await asyncio.wait_for(self.ib.reqHistoricalDataAsync(
+                        request.contract,
+                        endDateTime=end_date_time(request.end),
+                        durationStr=duration_str(request.end - request.start),
+                        barSizeSetting=self.bar_size,
+                        whatToShow=self.what_to_show,
+                        useRTH=self.use_rth,
+                        formatDate=2,
+                        timeout=0,
+                    ), self.timeout)
+                except asyncio.TimeoutError as e:
+                    error = e
+                except Exception as e:
+                    if is_no_data(e):
+                        return []
+                    if not is_pacing_error(e):
+                        raise
+                    report.pacing_violations += 1
+                    error = e
+        raise error
+
+def _fail(report: BackfillReport, request: _Request, error: BaseException) -> None:
+    start, end = (pd.Timestamp(t, unit="s", tz="UTC") for t in (request.start, request.end))
+    report.failed.append((request.ticker_id, start, end, repr(error)))
+
+def _contract_key(contract: Any) -> Hashable:
+    """Per-contract pacing key: the IB conId when the contract is qualified."""
+    return getattr(contract, "conId", 0) or repr(contract)
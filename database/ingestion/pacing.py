@@ -0,0 +1,115 @@
+from __future__ import annotations
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, Deque, Dict, Hashable
+
+
+@dataclass(frozen=True)
+class Pacing:
+    """
+    Interactive Brokers historical data pacing limits (TWS API documentation).
+
+        requests      -> requests allowed in any `window` seconds (60 per 10 minutes)
+        per_contract  -> requests for one contract allowed in any `contract_window` seconds (5 per 2 s)
+        identical_gap -> seconds before an identical request may be repeated
+        in_flight     -> simultaneous open historical data requests
+    """
+    requests: int = 60
+    window: float = 600.0
+    per_contract: int = 5
+    contract_window: float = 2.0
+    identical_gap: float = 15.0
+    in_flight: int = 50
+
+
+class TokenBucket:
+    """
+    Token bucket for a hard "at most `capacity` in any `window` seconds" limit.
+
+    A bucket refilled continuously at capacity / window would let a full burst through at
+    the end of one window and most of another right after it, so here each token comes
+    back exactly `window` seconds after it was taken. A full bucket still lets `capacity`
+    requests go at once, and the steady rate is capacity / window.
+    """
+
+    def __init__(self, capacity: int, window: float, *, clock: Callable[[], float] = monotonic):
+        self.capacity = capacity
+        self.window = window
+        self.clock = clock
+        self._spent: Deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    def wait_time(self) -> float:
+        """Seconds until a token is free (0 if one is free now)."""
+        now = self.clock()
+        while self._spent and self._spent[0] + self.window <= now:
+            self._spent.popleft()
+        if len(self._spent) < self.capacity:
+            return 0.0
+        return self._spent[0] + self.window - now
+
+    async def acquire(self) -> None:
+        """Wait for a token and take it (waiters are served in arrival order)."""
+        async with self._lock:
+            while (delay := self.wait_time()) > 0:
+                await asyncio.sleep(delay)
+            self._spent.append(self.clock())
+
+    def penalize(self, seconds: float) -> None:
+        """Hold every token for `seconds` more (after the broker reports a pacing violation)."""
+        until = self.clock() + seconds - self.window
+        self._spent = deque(max(spent, until) for spent in self._spent)
+        while len(self._spent) < self.capacity:
+            self._spent.appendleft(until)
+
+
+class PacingLimiter:
+    """
+    Admission control for historical data requests: a global TokenBucket, one TokenBucket
+    per contract, and a cap on requests in flight.
+
+        async with limiter.slot(contract_key):
+            bars = await ib.reqHistoricalDataAsync(...)
+    """
+
+    def __init__(self, pacing: Pacing = Pacing(), *, clock: Callable[[], float] = monotonic):
+        self.pacing = pacing
+        self.clock = clock
+        self.bucket = TokenBucket(pacing.requests, pacing.window, clock=clock)
+        self._contracts: Dict[Hashable, TokenBucket] = {}
+        self._in_flight = asyncio.Semaphore(pacing.in_flight)
+
+    def slot(self, contract: Hashable) -> _Slot:
+        """Context manager holding one in-flight request for a contract."""
+        return _Slot(self, contract)
+
+    def contract_bucket(self, contract: Hashable) -> TokenBucket:
+        bucket = self._contracts.get(contract)
+        if bucket is None:
+            bucket = self._contracts[contract] = TokenBucket(self.pacing.per_contract, self.pacing.contract_window, clock=self.clock)
+        return bucket
+
+    def backoff(self, seconds: float) -> None:
+        """Stop issuing requests for `seconds` (every bucket is held that long)."""
+        self.bucket.penalize(seconds)
+
+
+class _Slot:
+    def __init__(self, limiter: PacingLimiter, contract: Hashable):
+        self._limiter = limiter
+        self._contract = contract
+
+    async def __aenter__(self) -> None:
+        limiter = self._limiter
+        await limiter._in_flight.acquire()
+        try:
+            await limiter.contract_bucket(self._contract).acquire()
+            await limiter.bucket.acquire()
+        except BaseException:
+            limiter._in_flight.release()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._limiter._in_flight.release()
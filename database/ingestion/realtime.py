@@ -0,0 +1,311 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Literal, Mapping, Tuple
+import numpy as np
+from ..async_db import AsyncDataBase
+from ..db import DataBase
+from ..technical_data.historical_prices import _epoch
+from .backfill import BAR_SIZES, _contract_key, duration_str
+from .pacing import Pacing, PacingLimiter
+
+# Width of the bars reqRealTimeBars streams (the only size IB serves)
+REALTIME_BAR_SECONDS = 5
+
+Source = Literal["realtime", "keep_up_to_date"]
+
+# (epoch, open, high, low, close, volume)
+Bar = Tuple[int, float, float, float, float, float]
+
+async def watchlist(db: AsyncDataBase, contract: Callable[[Any], Any], *, ticker_ids: Iterable[int] | None = None, symbols: Iterable[str] | None = None, exchange_id: int | None = None) -> Dict[int, Any]:
+    """ticker_id -> contract for tickers from the `tickers` table, contract(ticker) building each (e.g. a Stock)."""
+    tickers = await db.ticker_repo.get_many(ticker_ids=ticker_ids, symbols=symbols, exchange_id=exchange_id)
+    return {ticker.id: contract(ticker) for ticker in tickers}
+
+
+class BarAggregator:
+    """
+    Folds IB's 5-second real-time bars into bars of `resolution` seconds (epoch-aligned
+    buckets, like the rollups). A bucket is complete once its last 5-second bar arrives,
+    or when a bar of a later bucket does.
+    """
+
+    def __init__(self, resolution: int):
+        self.resolution = resolution
+        self._open: Dict[int, List[float]] = {}
+
+    def add(self, ticker_id: int, epoch: int, open: float, high: float, low: float, close: float, volume: float) -> List[Bar]:
+        """Add one 5-second bar; returns the bars it completed."""
+        start = epoch - epoch % self.resolution
+        done: List[Bar] = []
+        bar = self._open.get(ticker_id)
+        if bar is not None and bar[0] > start:
+            # Late bar of a bucket already written
+            return done
+        if bar is not None and bar[0] < start:
+            done.append(tuple(bar))
+            bar = None
+        if bar is None:
+            bar = self._open[ticker_id] = [start, open, high, low, close, max(volume, 0.0)]
+        else:
+            bar[2] = max(bar[2], high)
+            bar[3] = min(bar[3], low)
+            bar[4] = close
+            bar[5] += max(volume, 0.0)
+        if epoch + REALTIME_BAR_SECONDS >= start + self.resolution:
+            done.append(tuple(bar))
+            del self._open[ticker_id]
+        return done
+
+    def discard(self, ticker_id: int | None = None) -> None:
+        """Drop the incomplete bucket of a ticker (of every ticker without one)."""
+        if ticker_id is None:
+            self._open.clear()
+        else:
+            self._open.pop(ticker_id, None)
+
+
+@dataclass
+class StreamReport:
+    """What a RealTimeBarStream has done so far."""
+    subscribed: int = 0
+    received: int = 0
+    written: int = 0
+    flushes: int = 0
+    write_errors: int = 0
+    stalls: int = 0
+    dropped: int = 0
+    peak_buffered: int = 0
+    failed: List[Tuple[int, str]] = field(default_factory=list)
+
+
+class RealTimeBarStream:
+    """
+    Live bar ingestion from Interactive Brokers (ib_insync) into the price repository of
+    an AsyncDataBase.
+
+        async with RealTimeBarStream(ib, adb, bar_size="5 mins") as stream:
+            await stream.subscribe(await watchlist(adb, lambda t: Stock(t.symbol, "SMART", t.currency)))
+            await shutdown.wait()
+
+    source="realtime" subscribes reqRealTimeBars and folds the 5-second bars into bar_size
+    bars; source="keep_up_to_date" subscribes reqHistoricalData(keepUpToDate=True) for
+    bar_size directly (these requests count against historical pacing, so they go through
+    a PacingLimiter). Only completed bars are kept.
+
+    Event handlers only append to an in-memory buffer; a flusher task writes it every
+    `flush_interval` seconds (sooner once `flush_size` bars are waiting) as one
+    transaction, upserting each ticker's bars and recording them in the coverage index.
+    One write is in flight at a time, so while the database is busy bars pile up and go
+    out in the next, larger, transaction; a failed write is put back at the head of the
+    buffer and retried. `high_water` bounds the buffer: once it holds that many bars,
+    intake pauses until the flusher catches up. New subscriptions wait, and bars arriving
+    meanwhile are dropped (counted in report.dropped) and not recorded as covered, so
+    missing_ranges() hands them to the next backfill.
+
+    stop() (or leaving the context) cancels the subscriptions and flushes what is
+    buffered. Bars of a bucket still forming are discarded rather than written half
+    built; a backfill fills them in.
+    """
+
+    def __init__(self, ib: Any, db: AsyncDataBase, *, source: Source = "realtime", bar_size: str = "5 mins", what_to_show: str = "TRADES", use_rth: bool = True, flush_interval: float = 1.0, flush_size: int = 10_000, high_water: int = 500_000, pacing: Pacing = Pacing()):
+        if bar_size not in BAR_SIZES:
+            raise ValueError(f"Unsupported bar size '{bar_size}'")
+        if source not in ("realtime", "keep_up_to_date"):
+            raise ValueError(f"Unknown source '{source}'")
+        self.resolution = BAR_SIZES[bar_size][0]
+        if source == "realtime" and (self.resolution % REALTIME_BAR_SECONDS or self.resolution >= 86400):
+            raise ValueError(f"Real-time bars cannot be folded into '{bar_size}' bars")
+        self.ib = ib
+        self.db = db
+        self.source = source
+        self.bar_size = bar_size
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.high_water = high_water
+        self.limiter = PacingLimiter(pacing)
+        self.report = StreamReport()
+        self.aggregator = BarAggregator(self.resolution)
+        self._buffer: Dict[int, List[Bar]] = {}
+        self._buffered = 0
+        self._last: Dict[int, int] = {}
+        self._subscriptions: Dict[int, Tuple[Any, Callable[..., None]]] = {}
+        self._wake = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._write_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self._stopping = False
+
+    @property
+    def buffered(self) -> int:
+        """Bars waiting to be written."""
+        return self._buffered
+
+    # ---------- SUBSCRIPTIONS ----------
+
+    async def subscribe(self, contracts: Mapping[int, Any] | Iterable[Tuple[int, Any]]) -> None:
+        """Start streaming ticker_id -> contract pairs (starts the flusher if needed)."""
+        self.start()
+        for ticker_id, contract in (contracts.items() if isinstance(contracts, Mapping) else contracts):
+            if ticker_id in self._subscriptions:
+                continue
+            if not self._room.is_set():
+                self.report.stalls += 1
+                await self._room.wait()
+            try:
+                if self.source == "realtime":
+                    bars = self.ib.reqRealTimeBars(contract, REALTIME_BAR_SECONDS, self.what_to_show, self.use_rth)
+                    handler = partial(self._on_realtime_bars, ticker_id)
+                else:
+                    async with self.limiter.slot(_contract_key(contract)):
+                        bars = await self.ib.reqHistoricalDataAsync(
+                            contract,
+                            endDateTime="",
+                            durationStr=duration_str(self.resolution * 3),
+                            barSizeSetting=self.bar_size,
+                            whatToShow=self.what_to_show,
+                            useRTH=self.use_rth,
+                            formatDate=2,
+                            keepUpToDate=True,
+                        )
+                    # The last bar is still forming; the rest are complete
+                    for bar in list(bars)[:-1]:
+                        self._on_bar(ticker_id, bar)
+                    handler = partial(self._on_historical_bars, ticker_id)
+            except Exception as e:
+                self.report.failed.append((ticker_id, repr(e)))
+                continue
+            bars.updateEvent += handler
+            self._subscriptions[ticker_id] = (bars, handler)
+            self.report.subscribed += 1
+
+    def unsubscribe(self, ticker_id: int) -> None:
+        """Stop streaming a ticker (its buffered bars are still written)."""
+        subscription = self._subscriptions.pop(ticker_id, None)
+        if subscription is None:
+            return
+        bars, handler = subscription
+        bars.updateEvent -= handler
+        if self.source == "realtime":
+            self.ib.cancelRealTimeBars(bars)
+        else:
+            self.ib.cancelHistoricalData(bars)
+        self.aggregator.discard(ticker_id)
+
+    # ---------- EVENTS ----------
+
+    def _on_realtime_bars(self, ticker_id: int, bars: Any, has_new_bar: bool) -> None:
+        if not has_new_bar:
+            return
+        bar = bars[-1]
+        self.report.received += 1
+        # ib_insync names the open of a RealTimeBar `open_`
+        for done in self.aggregator.add(ticker_id, _epoch(bar.time), bar.open_ if hasattr(bar, "open_") else bar.open, bar.high, bar.low, bar.close, bar.volume):
+            self._push(ticker_id, done)
+
+    def _on_historical_bars(self, ticker_id: int, bars: Any, has_new_bar: bool) -> None:
+        # Updates of the forming bar are skipped; a new bar completes the one before it
+        if has_new_bar and len(bars) > 1:
+            self._on_bar(ticker_id, bars[-2])
+
+    def _on_bar(self, ticker_id: int, bar: Any) -> None:
+        self.report.received += 1
+        self._push(ticker_id, (_epoch(bar.date), bar.open, bar.high, bar.low, bar.close, bar.volume))
+
+    def _push(self, ticker_id: int, bar: Bar) -> None:
+        if bar[0] <= self._last.get(ticker_id, -1):
+            return
+        if self._buffered >= self.high_water:
+            # Bars are only taken again once the flusher has swapped the full buffer out, so
+            # no single write spans this bar and its gap stays out of the coverage index
+            self.report.dropped += 1
+            self._wake.set()
+            return
+        self._last[ticker_id] = bar[0]
+        self._buffer.setdefault(ticker_id, []).append(bar)
+        self._buffered += 1
+        self.report.peak_buffered = max(self.report.peak_buffered, self._buffered)
+        if self._buffered >= self.flush_size:
+            self._wake.set()
+        if self._buffered >= self.high_water:
+            self._room.clear()
+
+    # ---------- FLUSHING ----------
+
+    def start(self) -> None:
+        """Start the flusher task."""
+        if self._flusher is None:
+            self._stopping = False
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def flush(self) -> int:
+        """Write everything buffered now as one transaction. Returns number of bars written."""
+        async with self._write_lock:
+            if not self._buffered:
+                return 0
+            batch, self._buffer, self._buffered = self._buffer, {}, 0
+            try:
+                written = await self.db.run(partial(_write_bars, batch, self.resolution))
+            except Exception:
+                self.report.write_errors += 1
+                for ticker_id, bars in batch.items():
+                    self._buffer[ticker_id] = bars + self._buffer.get(ticker_id, [])
+                    self._buffered += len(bars)
+                raise
+            finally:
+                if self._buffered < self.high_water:
+                    self._room.set()
+            self.report.written += written
+            self.report.flushes += 1
+            return written
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Kept in the buffer; the next round tries again
+                await asyncio.sleep(self.flush_interval)
+
+    async def stop(self) -> None:
+        """Cancel every subscription, stop the flusher and write what is buffered."""
+        for ticker_id in list(self._subscriptions):
+            self.unsubscribe(ticker_id)
+        self.aggregator.discard()
+        if self._flusher is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+
+    async def __aenter__(self) -> RealTimeBarStream:
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.stop()
+
+def _write_bars(batch: Dict[int, List[Bar]], resolution: int, db: DataBase) -> int:
+    """Upsert buffered bars of every ticker in one transaction (runs on the database thread)."""
+    with db.transaction():
+        for ticker_id, bars in batch.items():
+            array = np.array(bars, dtype="float64")
+            db.prices_repo.upsert_many(ticker_id, {
+                "datetime": array[:, 0].astype("int64"),
+                "open": array[:, 1],
+                "high": array[:, 2],
+                "low": array[:, 3],
+                "close": array[:, 4],
+                "volume": array[:, 5],
+            }, resolution=resolution)
+    return sum(len(bars) for bars in batch.values())
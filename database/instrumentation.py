@@ -0,0 +1,324 @@
+from __future__ import annotations
+import json
+import re
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from time import perf_counter
+import sqlite3 as sql
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS = (50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 500e-3, 1.0, 2.5)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Files whose frames are skipped when looking for the caller of a statement
+_INTERNAL = ("connection.py", "instrumentation.py", "bulk.py")
+
+
+@dataclass
+class QueryStats:
+    """Aggregated timings of one statement (normalised SQL text)."""
+    sql: str
+    calls: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    vm_steps: int = 0
+    histogram: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    callers: Counter = field(default_factory=Counter)
+
+    def add(self, seconds: float, rows: int, steps: int, caller: str) -> None:
+        self.calls += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.vm_steps += steps
+        self.histogram[bisect_left(BUCKETS, seconds)] += 1
+        self.callers[caller] += 1
+
+    def percentile(self, q: float) -> float:
+        """Latency percentile (0-100) estimated from the histogram: the upper bound of its bucket."""
+        target = q / 100 * self.calls
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max_seconds
+        return self.max_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sql": self.sql,
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": self.seconds * 1e3,
+            "mean_ms": self.seconds / self.calls * 1e3 if self.calls else 0.0,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p95_ms": self.percentile(95) * 1e3,
+            "max_ms": self.max_seconds * 1e3,
+            "vm_steps": self.vm_steps,
+            "histogram": dict(zip([f"<={bound * 1e3:g}ms" for bound in BUCKETS] + ["slower"], self.histogram)),
+            "callers": dict(self.callers.most_common()),
+        }
+
+
+@dataclass
+class SlowQuery:
+    """One statement that took longer than the threshold, with its query plan."""
+    sql: str
+    params: Any
+    seconds: float
+    rows: int
+    caller: str
+    plan: List[str]
+    statements: List[str]
+
+    def __str__(self) -> str:
+        lines = [f"Slow query ({self.seconds * 1e3:.1f} ms, {self.rows} rows) from {self.caller}:", f"    {self.sql}"]
+        lines += [f"    -> {statement}" for statement in self.statements if statement != self.sql]
+        lines += [f"    PLAN {step}" for step in self.plan]
+        return "\n".join(lines)
+
+
+class Instrumentation:
+    """
+    Opt-in SQL instrumentation for DataBase connections (DataBase(path, trace=True)).
+
+    Every statement run through a repository cursor is timed from execute() until its
+    rows are fetched, and recorded per normalised SQL text with its row count, the calling
+    repository method and a latency histogram. sqlite3 hooks add what cursors cannot see:
+    set_trace_callback lists the statements SQLite actually ran (COMMITs, trigger bodies,
+    each row of an executemany) and set_progress_handler counts virtual machine steps, a
+    measure of work independent of cache state. Statements slower than `threshold_ms` are
+    passed with their EXPLAIN QUERY PLAN to `on_slow` (print by default) and kept in `slow`.
+    """
+
+    def __init__(self, *, threshold_ms: float = 100.0, progress_steps: int = 1000, on_slow: Optional[Callable[[SlowQuery], None]] = print, keep_slow: int = 100):
+        self.threshold = threshold_ms / 1e3
+        self.progress_steps = progress_steps
+        self.on_slow = on_slow
+        self.stats: Dict[str, QueryStats] = {}
+        self.slow: Deque[SlowQuery] = deque(maxlen=keep_slow)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---------- HOOKS ----------
+
+    def attach(self, connection: Any) -> None:
+        """Instrument a Connection, or the writer and every reader of a ConnectionPool."""
+        if hasattr(connection, "acquire_reader"):
+            connection.instrumentation = self
+            for c in [connection.writer, *connection._all_readers]:
+                if c is not None:
+                    self.attach(c)
+            return
+        steps = [0]
+
+        def progress() -> int:
+            steps[0] += 1
+            return 0
+
+        connection.instrumentation = self
+        connection.vm_steps = steps
+        connection.set_trace_callback(self._trace)
+        connection.set_progress_handler(progress, self.progress_steps)
+
+    def detach(self, connection: Any) -> None:
+        if hasattr(connection, "acquire_reader"):
+            connection.instrumentation = None
+            for c in [connection.writer, *connection._all_readers]:
+                if c is not None:
+                    self.detach(c)
+            return
+        connection.instrumentation = None
+        connection.set_trace_callback(None)
+        connection.set_progress_handler(None, 0)
+
+    def _trace(self, statement: str) -> None:
+        traced = getattr(self._local, "traced", None)
+        if traced is not None and len(traced) < 20:
+            traced.append(statement)
+
+    # ---------- RECORDING ----------
+
+    def start(self) -> None:
+        """Start collecting the statements SQLite runs for the statement about to execute."""
+        self._local.traced = []
+
+    def record(self, connection: Any, query: str, params: Any, seconds: float, steps: int, rows: int, explain: bool = True, caller: str | None = None) -> None:
+        """Add one execution of a statement (steps in progress handler calls)."""
+        steps *= self.progress_steps
+        traced = getattr(self._local, "traced", None) or []
+        self._local.traced = None
+        caller = caller or _caller()
+        key = _WHITESPACE.sub(" ", query).strip()
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = QueryStats(key)
+            stats.add(seconds, rows, steps, caller)
+        if seconds >= self.threshold:
+            slow = SlowQuery(key, params, seconds, rows, caller, self._plan(connection, query, params) if explain else [], traced)
+            self.slow.append(slow)
+            if self.on_slow is not None:
+                self.on_slow(slow)
+
+    def _plan(self, connection: Any, query: str, params: Any) -> List[str]:
+        if _WHITESPACE.sub(" ", query).strip().upper() in ("BEGIN", "COMMIT", "ROLLBACK") or query.lstrip().upper().startswith(("PRAGMA", "EXPLAIN", "SAVEPOINT", "RELEASE")):
+            return []
+        try:
+            rows = sql.Connection.execute(connection, f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        except sql.Error as e:
+            return [f"(no plan: {e})"]
+        return [row[-1] for row in rows]
+
+    # ---------- REPORT ----------
+
+    def summary(self, top: int | None = None, *, by: str = "seconds") -> List[Dict[str, Any]]:
+        """Per-statement statistics, most expensive first (by "seconds", "calls", "rows" or "max_seconds")."""
+        with self._lock:
+            stats = sorted(self.stats.values(), key=lambda s: getattr(s, by), reverse=True)
+        return [s.to_dict() for s in stats[:top]]
+
+    def report(self, top: int = 20) -> str:
+        """Plain-text table of the most expensive statements."""
+        lines = [f"{'total ms':>10} {'calls':>7} {'mean ms':>9} {'p95 ms':>8} {'max ms':>8} {'rows':>9}  statement (top caller)"]
+        for s in self.summary(top):
+            caller = next(iter(s["callers"]), "")
+            text = s["sql"] if len(s["sql"]) <= 90 else s["sql"][:87] + "..."
+            lines.append(f"{s['total_ms']:>10.1f} {s['calls']:>7} {s['mean_ms']:>9.3f} {s['p95_ms']:>8.2f} {s['max_ms']:>8.2f} {s['rows']:>9}  {text} ({caller})")
+        return "\n".join(lines)
+
+    def export(self, path: str) -> None:
+        """Write the summary and the slow query log as JSON."""
+        slow = [{"sql": q.sql, "ms": q.seconds * 1e3, "rows": q.rows, "caller": q.caller, "plan": q.plan} for q in list(self.slow)]
+        with open(path, "w") as f:
+            json.dump({"statements": self.summary(), "slow": slow}, f, indent=2, default=str)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats.clear()
+            self.slow.clear()
+
+
+class TracedCursor(sql.Cursor):
+    """
+    Cursor of an instrumented Connection. Time spent inside execute() and the fetch calls
+    is added up per statement (time between fetches is the caller's), and the statement is
+    recorded once its rows are consumed or the cursor moves on.
+    """
+
+    # [query, params, seconds, vm step batches, rows, explain, caller] of the statement in progress
+    _pending: Optional[List[Any]] = None
+
+    def execute(self, query: str, params: Any = ()) -> TracedCursor:
+        self._begin(query, params, True)
+        try:
+            self._timed(super().execute, query, params)
+        finally:
+            if self.description is None:
+                self._finish()
+        return self
+
+    def executemany(self, query: str, seq_of_params: Any) -> TracedCursor:
+        # The parameters are consumed, so there is nothing to explain with
+        self._begin(query, None, False)
+        try:
+            self._timed(super().executemany, query, seq_of_params)
+        finally:
+            self._finish()
+        return self
+
+    def executescript(self, script: str) -> TracedCursor:
+        self._begin(script, None, False)
+        try:
+            self._timed(super().executescript, script)
+        finally:
+            self._finish()
+        return self
+
+    def fetchone(self) -> Any:
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size: int | None = None) -> List[Any]:
+        rows = self._timed(super().fetchmany, size or self.arraysize)
+        self._count(len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self) -> List[Any]:
+        rows = self._timed(super().fetchall)
+        self._count(len(rows))
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def _begin(self, query: str, params: Any, explain: bool) -> None:
+        self._finish()
+        self.connection.instrumentation.start()
+        self._pending = [query, params, 0.0, 0, 0, explain, _caller()]
+
+    def _timed(self, call: Callable[..., Any], *args: Any) -> Any:
+        pending = self._pending
+        if pending is None:
+            return call(*args)
+        steps = self.connection.vm_steps[0]
+        started = perf_counter()
+        try:
+            return call(*args)
+        finally:
+            pending[2] += perf_counter() - started
+            pending[3] += self.connection.vm_steps[0] - steps
+
+    def _count(self, n: int) -> None:
+        if self._pending is not None:
+            self._pending[4] += n
+
+    def _finish(self) -> None:
+        pending = self._pending
+        if pending is None:
+            return
+        self._pending = None
+        query, params, seconds, steps, rows, explain, caller = pending
+        if self.description is None:
+            rows = max(self.rowcount, 0)
+        instrumentation = self.connection.instrumentation
+        if instrumentation is not None:
+            instrumentation.record(self.connection, query, params, seconds, steps, rows, explain, caller)
+
+def _caller() -> str:
+    """The repository method (or other function) that issued the current statement."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        # Private helpers, lambdas and comprehensions report the method that called them
+        public = not code.co_name.startswith(("_", "<")) or code.co_name.startswith("__")
+        if public and not code.co_filename.endswith(_INTERNAL):
+            owner = frame.f_locals.get("self")
+            if owner is not None:
+                return f"{type(owner).__name__}.{code.co_name}"
+            return f"{frame.f_globals.get('__name__', '?')}.{code.co_name}"
+        frame = frame.f_back
+    return "?"
@@ -1,8 +1,21 @@
 from __future__ import annotations
 import sqlite3 as sql
-from typing import Optional, List, Tuple, Any
+from typing import Optional, List, Tuple, Any, Iterable, Literal, Mapping, Dict
 from dataclasses import dataclass
 from functools import cached_property
+from ..registry import MISSING, registry_for
+from ..bulk import BulkRepository, row_values
+from .universe import TickerUniverse
+
+Relation = Literal["market", "exchange", "equity"]
+
+def _relations(include: Iterable[Relation]) -> Tuple[Relation, ...]:
+    """Validate an eager-load include list, returned as a sorted tuple (usable as a cache key)."""
+    include = tuple(sorted(set(include)))
+    unknown = [name for name in include if name not in ("market", "exchange", "equity")]
+    if unknown:
+        raise ValueError(f"Unknown relation(s) to include: {unknown}")
+    return include
 
 @dataclass
 class Ticker:
@@ -20,14 +33,14 @@ class Ticker:
     def market(self):
         """Return the market for this ticker."""
         from database.core.markets import MarketRepository
-        repo = MarketRepository(self.connection)
+        repo = registry_for(self.connection).repo(MarketRepository)
         return repo.get_info(self.market_id, self.exchange_id)
 
     @cached_property
     def exchange(self):
         """Return the exchange for this ticker."""
         from database.core.exchanges import ExchangeRepository
-        repo = ExchangeRepository(self.connection)
+        repo = registry_for(self.connection).repo(ExchangeRepository)
         return repo.get_info(self.exchange_id)
 
     @cached_property
@@ -36,13 +49,13 @@ class Ticker:
         if self.market_id != 1:
             print("Ticker is not an equity based on market_id.")
             return None
-        repo = EquitiesRepository(self.connection)
+        repo = registry_for(self.connection).repo(EquitiesRepository)
         return repo.get_info(ticker_id=self.id, symbol=self.symbol)
 
     # NEED BOND INFO LATER
     
 # This is the primary table for all instruments
-class TickerRepository:
+class TickerRepository(BulkRepository):
     """
     Data-access layer for the `tickers` table.
 
@@ -60,19 +73,40 @@ class TickerRepository:
         FOREIGN KEY (exchange_id) REFERENCES exchanges(exchange_id) ON DELETE CASCADE
     """
 
+    TABLE_NAME = "tickers"
+    ID_COL     = "ticker_id"
+    COLUMNS    = ["ticker_id", "symbol", "market_id", "exchange_id", "currency", "full_name", "description", "source"]
+
     def __init__(self, connection: sql.Connection):
         self.connection = connection
         # Ensure foreign key constraints are enforced
         self.connection.execute("PRAGMA foreign_keys = ON")
+        self.registry = registry_for(connection)
+
+    def _ticker(self, row: Tuple[Any, ...]) -> Ticker:
+        """Return the shared Ticker object for a row."""
+        return self.registry.remember("ticker", row[0], lambda: Ticker(*row, connection=self.connection))
     
     # ---------- READ ----------
 
-    def get_all(self) -> List[Ticker]:
-        """Return all tickers as a list of Ticker objects."""
+    def get_all(self, *, include: Iterable[Relation] = ()) -> List[Ticker]:
+        """
+        Return all tickers as a list of Ticker objects.
+        include: related objects to load in the same query ("market", "exchange", "equity").
+        """
+        generation = self.registry.generation
+        tickers = self._select("", (), include)
+        self.registry.mark_complete("ticker", generation)
+        return tickers
+
+    def load_universe(self) -> TickerUniverse:
+        """
+        Load the whole tickers table in one query into a column-oriented TickerUniverse
+        (compact, picklable, vectorized filters) for universes too large for Ticker objects.
+        """
         cur = self.connection.cursor()
-        cur.execute("SELECT ticker_id, symbol, market_id, exchange_id, currency, full_name, description, source FROM tickers")
-        rows = cur.fetchall()
-        return [Ticker(*row, connection=self.connection) for row in rows]
+        cur.execute("SELECT ticker_id, symbol, market_id, exchange_id, currency, full_name, description, source FROM tickers ORDER BY ticker_id")
+        return TickerUniverse.from_rows(cur.fetchall())
 
     # Can reduce the size of this (NEED TO)
     def get_info(self, *, symbol: str | None = None, ticker_id: int | None = None) -> Ticker | None:
@@ -81,6 +115,10 @@ class TickerRepository:
         """
         if symbol is None and ticker_id is None:
             raise ValueError("Must provide symbol or ticker_id")
+        if ticker_id is not None:
+            cached = self.registry.lookup("ticker", ticker_id)
+            if cached is not None and cached is not MISSING:
+                return cached
         cur = self.connection.cursor()
         if ticker_id is not None:
             try:
@@ -90,7 +128,7 @@ class TickerRepository:
                 )
                 row = cur.fetchone()
                 if row:
-                    return Ticker(*row, connection=self.connection)
+                    return self._ticker(row)
             except sql.Error as e:
                 print(f"Error fetching ticker by ticker_id: {e}")
                 pass
@@ -103,33 +141,88 @@ class TickerRepository:
                 )
                 row = cur.fetchone()
                 if row:
-                    return Ticker(*row, connection=self.connection)
+                    return self._ticker(row)
             except sql.Error as e:
                 print(f"Error fetching ticker by symbol: {e}")
                 pass
 
         return None
     
-    def get_by_market(self, market_id: int) -> List[Ticker]:
-        """Return all tickers for a given market_id."""
-        cur = self.connection.cursor()
-        cur.execute(
-            "SELECT ticker_id, symbol, market_id, exchange_id, currency, full_name, description, source FROM tickers WHERE market_id = ?",
-            (market_id,),
-        )
-        rows = cur.fetchall()
-        return [Ticker(*row, connection=self.connection) for row in rows]
+    def get_by_market(self, market_id: int, exchange_id: int | None = None, *, include: Iterable[Relation] = ()) -> List[Ticker]:
+        """Return all tickers for a given market_id (optionally only those on one exchange)."""
+        include = _relations(include)
+        def load() -> List[Ticker]:
+            if exchange_id is None:
+                return self._select("WHERE t.market_id = ?", (market_id,), include)
+            return self._select("WHERE t.market_id = ? AND t.exchange_id = ?", (market_id, exchange_id), include)
+        return list(self.registry.relation("market_tickers", (market_id, exchange_id, include), load))
     
-    def get_by_exchange(self, exchange_id: int) -> List[Ticker]:
+    def get_by_exchange(self, exchange_id: int, *, include: Iterable[Relation] = ()) -> List[Ticker]:
         """Return all tickers for a given exchange_id."""
+        include = _relations(include)
+        def load() -> List[Ticker]:
+            return self._select("WHERE t.exchange_id = ?", (exchange_id,), include)
+        return list(self.registry.relation("exchange_tickers", (exchange_id, include), load))
+
+    def _select(self, where: str, params: Tuple[Any, ...], include: Iterable[Relation]) -> List[Ticker]:
+        """
+        Run one SELECT over tickers, LEFT JOINing the requested relations, and return shared
+        Ticker objects with those relations already set (no query when they are accessed).
+        """
+        from ..core.markets import Market
+        from ..core.exchanges import Exchange
+
+        include = _relations(include)
+        columns = ["t.ticker_id", "t.symbol", "t.market_id", "t.exchange_id", "t.currency", "t.full_name", "t.description", "t.source"]
+        joins = []
+        if "market" in include:
+            columns += ["m.market_id", "m.exchange_id", "m.market_name"]
+            joins.append("LEFT JOIN markets m ON m.market_id = t.market_id AND m.exchange_id = t.exchange_id")
+        if "exchange" in include:
+            columns += ["x.exchange_id", "x.exchange_name", "x.timezone"]
+            joins.append("LEFT JOIN exchanges x ON x.exchange_id = t.exchange_id")
+        if "equity" in include:
+            columns += ["q.ticker_id", "q.symbol", "q.sector", "q.industry", "q.dividend_yield", "q.pe_ratio", "q.eps", "q.beta", "q.market_cap"]
+            joins.append("LEFT JOIN equities q ON q.ticker_id = t.ticker_id")
+
         cur = self.connection.cursor()
-        cur.execute(
-            "SELECT ticker_id, symbol, market_id, exchange_id, currency, full_name, description, source FROM tickers WHERE exchange_id = ?",
-            (exchange_id,),
-        )
-        rows = cur.fetchall()
-        return [Ticker(*row, connection=self.connection) for row in rows]
+        cur.execute(f"SELECT {', '.join(columns)} FROM tickers t {' '.join(joins)} {where}", params)
+        remember = self.registry.remember
+        tickers = []
+        for row in cur.fetchall():
+            ticker = self._ticker(row[:8])
+            at = 8
+            # Fill the cached_property slots directly, as if the property had already run
+            if "market" in include:
+                market = row[at:at + 3]
+                at += 3
+                ticker.__dict__["market"] = remember("market", (market[0], market[1]), lambda: Market(*market, connection=self.connection)) if market[0] is not None else None
+            if "exchange" in include:
+                exchange = row[at:at + 3]
+                at += 3
+                ticker.__dict__["exchange"] = remember("exchange", exchange[0], lambda: Exchange(*exchange, connection=self.connection)) if exchange[0] is not None else None
+            if "equity" in include:
+                equity = row[at:at + 9]
+                at += 9
+                ticker.__dict__["equity_info"] = remember("equity", equity[0], lambda: Equity(*equity)) if equity[0] is not None else None
+            tickers.append(ticker)
+        return tickers
     
+    def get_many(self, *, ticker_ids: Iterable[int] | None = None, symbols: Iterable[str] | None = None, exchange_id: int | None = None) -> List[Ticker]:
+        """
+        Return the tickers matching any of the given ids or symbols, in one query each.
+        exchange_id restricts symbol matches to one exchange (symbols are unique per exchange).
+        """
+        if ticker_ids is None and symbols is None:
+            raise ValueError("Provide ticker_ids or symbols")
+        rows = self._select_in(["ticker_id"], ticker_ids or [])
+        if symbols is not None:
+            if exchange_id is None:
+                rows += self._select_in(["symbol"], symbols)
+            else:
+                rows += self._select_in(["symbol", "exchange_id"], ((symbol, exchange_id) for symbol in symbols))
+        return list({ticker.id: ticker for ticker in map(self._ticker, rows)}.values())
+
     # ---------- CREATE ----------
 
     def create(self, symbol: str, market_id: int, exchange_id: int, *, currency: str, full_name: str | None = None, description: str | None = None, source: str) -> int:
@@ -142,6 +235,7 @@ class TickerRepository:
             (symbol, market_id, exchange_id, currency, full_name, description, source),
         )
         self.connection.commit()
+        self.registry.invalidate()
 
         # NEEDS TO BE BASED ON WHAT MARKET ID IS
 
@@ -167,8 +261,43 @@ class TickerRepository:
             (symbol, market_id, exchange_id, currency, full_name or "", description or "", source),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return cur.lastrowid
 
+    def create_many(self, tickers: Iterable[Mapping[str, Any]], *, ignore_existing: bool = False, **defaults: Any) -> int:
+        """
+        Insert many tickers with one executemany.
+        Each ticker is a mapping of column -> value; missing columns come from defaults,
+        e.g. create_many([{"symbol": "AAPL"}, {"symbol": "MSFT"}], market_id=1, exchange_id=1, currency="USD", source="vendor").
+        ignore_existing skips tickers whose (symbol, exchange_id) already exists.
+        Returns number of rows inserted.
+        """
+        columns = self.COLUMNS[1:]
+        rows = [row_values(ticker, columns, defaults) for ticker in tickers]
+        return self._insert_many(columns, rows, ignore=ignore_existing)
+
+    def get_or_create_many(self, symbols: Iterable[str | Mapping[str, Any]], market_id: int, exchange_id: int, *, currency: str, source: str, **defaults: Any) -> Dict[str, int]:
+        """
+        Return {symbol: ticker_id} for many symbols on one market/exchange, creating the
+        missing ones in one executemany. Entries may be plain symbols or mappings with a
+        "symbol" plus per-ticker columns (full_name, description, currency, ...).
+        """
+        tickers = {}
+        for entry in symbols:
+            ticker = {"symbol": entry} if isinstance(entry, str) else dict(entry)
+            tickers[ticker["symbol"]] = ticker
+        ids = self._symbol_ids(tickers, market_id, exchange_id)
+        missing = [ticker for symbol, ticker in tickers.items() if symbol not in ids]
+        if missing:
+            defaults = {"full_name": "", "description": "", **defaults}
+            self.create_many(missing, market_id=market_id, exchange_id=exchange_id, currency=currency, source=source, **defaults)
+            ids.update(self._symbol_ids([ticker["symbol"] for ticker in missing], market_id, exchange_id))
+        return ids
+
+    def _symbol_ids(self, symbols: Iterable[str], market_id: int, exchange_id: int) -> Dict[str, int]:
+        """{symbol: ticker_id} for the symbols that exist on this market/exchange (one query)."""
+        return {ticker.symbol: ticker.id for ticker in self.get_many(symbols=symbols, exchange_id=exchange_id) if ticker.market_id == market_id}
+
     # ---------- UPDATE ----------
 
     def update(self, ticker_id: str, *, symbol: str | None = None, market_id: int | None = None, exchange_id: int | None = None, currency: str | None = None, full_name: str | None = None, description: str | None = None, source: str | None = None) -> int:
@@ -208,6 +337,7 @@ class TickerRepository:
             tuple(values),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return cur.rowcount
 
     # ---------- DELETE ----------
@@ -225,8 +355,18 @@ class TickerRepository:
         elif symbol is not None:
             cur.execute("DELETE FROM tickers WHERE symbol = ?", (symbol,))
         self.connection.commit()
+        self.registry.invalidate()
         return cur.rowcount
 
+    def delete_many(self, *, ticker_ids: Iterable[int] | None = None, symbols: Iterable[str] | None = None) -> int:
+        """
+        Delete tickers by ids and/or symbols.
+        Returns number of rows deleted.
+        """
+        if ticker_ids is None and symbols is None:
+            raise ValueError("Must provide ticker_ids or symbols")
+        return self._delete_in(["ticker_id"], ticker_ids or []) + self._delete_in(["symbol"], symbols or [])
+
     def delete_all(self) -> int:
         """
         Delete ALL tickers.
@@ -235,6 +375,7 @@ class TickerRepository:
         cur = self.connection.cursor()
         cur.execute("DELETE FROM tickers")
         self.connection.commit()
+        self.registry.invalidate()
         return cur.rowcount
 
 
@@ -253,7 +394,7 @@ class Equity:
     beta: float
     market_cap: float
 
-class EquitiesRepository:
+class EquitiesRepository(BulkRepository):
     """
     Data-access layer for equities-related tables.
 
@@ -270,10 +411,19 @@ class EquitiesRepository:
         FOREIGN KEY (ticker_id) REFERENCES tickers(ticker_id) ON DELETE CASCADE
     """
 
+    TABLE_NAME = "equities"
+    ID_COL     = "ticker_id"
+    COLUMNS    = ["ticker_id", "symbol", "sector", "industry", "dividend_yield", "pe_ratio", "eps", "beta", "market_cap"]
+
     def __init__(self, connection: sql.Connection):
         self.connection = connection
         # Ensure foreign key constraints are enforced
         self.connection.execute("PRAGMA foreign_keys = ON")
+        self.registry = registry_for(connection)
+
+    def _equity(self, row: Tuple[Any, ...]) -> Equity:
+        """Return the shared Equity object for a row."""
+        return self.registry.remember("equity", row[0], lambda: Equity(*row))
     
     # ---------- READ ----------
 
@@ -281,17 +431,24 @@ class EquitiesRepository:
         """
         Return all rows as a list of Equity objects.
         """
+        generation = self.registry.generation
         cur = self.connection.cursor()
         cur.execute(
             "SELECT ticker_id, symbol, sector, industry, dividend_yield, pe_ratio, eps, beta, market_cap FROM equities"
         )
         rows = cur.fetchall()
-        return [Equity(*row) for row in rows]
+        equities = [self._equity(row) for row in rows]
+        self.registry.mark_complete("equity", generation)
+        return equities
 
     def get_info(self, *, ticker_id: int | None = None, symbol: str | None = None) -> Optional[Equity]:
         """
         Return a single row by primary key or None if not found.
         """
+        if ticker_id is not None:
+            cached = self.registry.lookup("equity", ticker_id)
+            if cached is not MISSING:
+                return cached
         cur = self.connection.cursor()
         if ticker_id is not None:
             try:
@@ -300,7 +457,7 @@ class EquitiesRepository:
                     (ticker_id,),
                 )
                 row = cur.fetchone()
-                return Equity(*row) if row else None
+                return self._equity(row) if row else None
             except sql.Error as e:
                 print(f"Error fetching equity by ticker_id: {e}")
                 pass
@@ -311,13 +468,20 @@ class EquitiesRepository:
                     (symbol,),
                 )
                 row = cur.fetchone()
-                return Equity(*row) if row else None
+                return self._equity(row) if row else None
             except sql.Error as e:
                 print(f"Error fetching equity by symbol: {e}")
                 pass
 
         return None
 
+    def get_many(self, *, ticker_ids: Iterable[int] | None = None, symbols: Iterable[str] | None = None) -> List[Equity]:
+        """Return the equities matching any of the given ticker ids or symbols, in one query each."""
+        if ticker_ids is None and symbols is None:
+            raise ValueError("Must provide ticker_ids or symbols")
+        rows = self._select_in(["ticker_id"], ticker_ids or []) + self._select_in(["symbol"], symbols or [])
+        return list({equity.ticker_id: equity for equity in map(self._equity, rows)}.values())
+
     # ---------- CREATE ----------
 
     def create(self, ticker_id: int, symbol: str, *, sector: str | None = None, industry: str | None = None, dividend_yield: float | None = None, pe_ratio: float | None = None, eps: float | None = None, beta: float | None = None, market_cap: float | None = None) -> int:
@@ -330,6 +494,7 @@ class EquitiesRepository:
             (ticker_id, symbol, sector, industry, dividend_yield, pe_ratio, eps, beta, market_cap),
         )
         self.connection.commit()
+        self.registry.invalidate()
         return cur.lastrowid
 
     def get_or_create(self, ticker_id: int, symbol: str, *, sector: str | None = None, industry: str | None = None, dividend_yield: float | None = None, pe_ratio: float | None = None, eps: float | None = None, beta: float | None = None, market_cap: float | None = None) -> int:
@@ -356,10 +521,31 @@ class EquitiesRepository:
                 (ticker_id, symbol, sector, industry, dividend_yield, pe_ratio, eps, beta, market_cap),
             )
             self.connection.commit()
+            self.registry.invalidate()
             return cur.lastrowid
         
         raise ValueError("Must provide ticker_id and symbol to create a new equity")
     
+    def create_many(self, equities: Iterable[Mapping[str, Any]], *, ignore_existing: bool = False) -> int:
+        """
+        Insert many equities (mappings with ticker_id, symbol and any other columns) with one executemany.
+        Returns number of rows inserted.
+        """
+        rows = [row_values(equity, self.COLUMNS, {}) for equity in equities]
+        if any(ticker_id is None or symbol is None for ticker_id, symbol, *_ in rows):
+            raise ValueError("Must provide ticker_id and symbol to create a new equity")
+        return self._insert_many(self.COLUMNS, rows, ignore=ignore_existing)
+
+    def get_or_create_many(self, equities: Iterable[Mapping[str, Any]]) -> Dict[str, int]:
+        """
+        Return {symbol: ticker_id} for many equities, creating the ones whose ticker_id
+        has no row yet.
+        """
+        equities = list(equities)
+        existing = {equity.ticker_id for equity in self.get_many(ticker_ids=[equity["ticker_id"] for equity in equities])}
+        self.create_many([equity for equity in equities if equity["ticker_id"] not in existing])
+        return {equity["symbol"]: equity["ticker_id"] for equity in equities}
+
     # ---------- UPDATE ----------
 
     def update(self, ticker_id: int, *, symbol: str | None = None, sector: str | None = None, industry: str | None = None, dividend_yield: float | None = None, pe_ratio: float | None = None, eps: float | None = None, beta: float | None = None, market_cap: float | None = None) -> int:
@@ -402,6 +588,7 @@ class EquitiesRepository:
         )
 
         self.connection.commit()
+        self.registry.invalidate()
         return cur.rowcount
 
     # ---------- DELETE ----------
@@ -420,8 +607,18 @@ class EquitiesRepository:
             raise ValueError("Must provide ticker_id or symbol")
 
         self.connection.commit()
+        self.registry.invalidate()
         return cur.rowcount
 
+    def delete_many(self, *, ticker_ids: Iterable[int] | None = None, symbols: Iterable[str] | None = None) -> int:
+        """
+        Delete equities by ticker ids and/or symbols.
+        Returns number of rows deleted.
+        """
+        if ticker_ids is None and symbols is None:
+            raise ValueError("Must provide ticker_ids or symbols")
+        return self._delete_in(["ticker_id"], ticker_ids or []) + self._delete_in(["symbol"], symbols or [])
+
     def delete_all(self) -> int:
         """
         Delete ALL rows from this table.
@@ -430,6 +627,7 @@ class EquitiesRepository:
         cur = self.connection.cursor()
         cur.execute("DELETE FROM equities")
         self.connection.commit()
+        self.registry.invalidate()
         return cur.rowcount
 
 # TODO: Implement Bonds Repository later once equities checks out
@@ -0,0 +1,217 @@
+from __future__ import annotations
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+def _encode(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Dictionary-encode a low-cardinality text column into (uint16 codes, categories)."""
+    categories, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.astype(np.uint16), categories.astype(object)
+
+def _mask(column: np.ndarray, value: Any) -> np.ndarray:
+    """Boolean mask for column == value (or column in value for a list/tuple/set/array)."""
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray)):
+        return np.isin(column, list(value))
+    return column == value
+
+
+class TickerRow:
+    """
+    Lightweight view of one row of a TickerUniverse.
+    Holds only the universe and a position, so millions can be created cheaply.
+    """
+    __slots__ = ("_universe", "_i")
+
+    def __init__(self, universe: TickerUniverse, i: int):
+        self._universe = universe
+        self._i = i
+
+    @property
+    def id(self) -> int:
+        return int(self._universe.ids[self._i])
+
+    @property
+    def symbol(self) -> str:
+        return str(self._universe.symbols[self._i])
+
+    @property
+    def market_id(self) -> int:
+        return int(self._universe.market_ids[self._i])
+
+    @property
+    def exchange_id(self) -> int:
+        return int(self._universe.exchange_ids[self._i])
+
+    @property
+    def currency(self) -> str:
+        return self._universe.currency_names[self._universe.currency_codes[self._i]]
+
+    @property
+    def full_name(self) -> str | None:
+        return self._universe.full_names[self._i]
+
+    @property
+    def description(self) -> str | None:
+        return self._universe.descriptions[self._i]
+
+    @property
+    def source(self) -> str:
+        return self._universe.source_names[self._universe.source_codes[self._i]]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TickerRow) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"TickerRow(id={self.id}, symbol={self.symbol!r}, market_id={self.market_id}, exchange_id={self.exchange_id}, currency={self.currency!r})"
+
+
+class TickerUniverse:
+    """
+    Column-oriented, in-memory copy of the `tickers` table for very large universes.
+
+    Columns are NumPy arrays sorted by ticker_id: integer ids, fixed-width symbols,
+    dictionary-encoded currency/source (uint16 codes + names) and object arrays for the
+    free-text full_name/description. No connection is held, so a universe can be pickled
+    or sent to worker processes. Rows are exposed as __slots__ TickerRow views; filters are
+    vectorized and return a new universe sharing nothing with the database.
+    """
+    __slots__ = ("ids", "symbols", "market_ids", "exchange_ids", "currency_codes", "currency_names", "full_names", "descriptions", "source_codes", "source_names")
+
+    def __init__(self, ids: np.ndarray, symbols: np.ndarray, market_ids: np.ndarray, exchange_ids: np.ndarray, currency_codes: np.ndarray, currency_names: np.ndarray, full_names: np.ndarray, descriptions: np.ndarray, source_codes: np.ndarray, source_names: np.ndarray):
+        self.ids = ids
+        self.symbols = symbols
+        self.market_ids = market_ids
+        self.exchange_ids = exchange_ids
+        self.currency_codes = currency_codes
+        self.currency_names = currency_names
+        self.full_names = full_names
+        self.descriptions = descriptions
+        self.source_codes = source_codes
+        self.source_names = source_names
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[Any, ...]]) -> TickerUniverse:
+        """Build a universe from (ticker_id, symbol, market_id, exchange_id, currency, full_name, description, source) rows."""
+        rows = sorted(rows, key=lambda row: row[0])
+        if not rows:
+            empty = np.array([], dtype=object)
+            return cls(np.array([], dtype=np.int64), np.array([], dtype=str), np.array([], dtype=np.int32), np.array([], dtype=np.int32), np.array([], dtype=np.uint16), empty, empty, empty, np.array([], dtype=np.uint16), empty)
+        ids, symbols, market_ids, exchange_ids, currencies, full_names, descriptions, sources = zip(*rows)
+        currency_codes, currency_names = _encode(currencies)
+        source_codes, source_names = _encode(sources)
+        return cls(
+            np.array(ids, dtype=np.int64),
+            np.array(symbols, dtype=str),
+            np.array(market_ids, dtype=np.int32),
+            np.array(exchange_ids, dtype=np.int32),
+            currency_codes,
+            currency_names,
+            np.array(full_names, dtype=object),
+            np.array(descriptions, dtype=object),
+            source_codes,
+            source_names,
+        )
+
+    # ---------- ROWS ----------
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[TickerRow]:
+        return (TickerRow(self, i) for i in range(len(self.ids)))
+
+    def __getitem__(self, i: int) -> TickerRow:
+        if i < 0:
+            i += len(self.ids)
+        if not 0 <= i < len(self.ids):
+            raise IndexError("TickerUniverse index out of range")
+        return TickerRow(self, i)
+
+    def get(self, ticker_id: int) -> TickerRow | None:
+        """Row for a ticker_id (binary search on the sorted ids), or None."""
+        i = int(np.searchsorted(self.ids, ticker_id))
+        return TickerRow(self, i) if i < len(self.ids) and self.ids[i] == ticker_id else None
+
+    def lookup(self, symbol: str) -> List[TickerRow]:
+        """All rows with this symbol (a symbol is only unique per exchange)."""
+        return [TickerRow(self, int(i)) for i in np.flatnonzero(self.symbols == symbol)]
+
+    # ---------- FILTER ----------
+
+    def filter(self, *, market_id: int | Iterable[int] | None = None, exchange_id: int | Iterable[int] | None = None, currency: str | Iterable[str] | None = None) -> TickerUniverse:
+        """
+        Vectorized filter; each argument is a value or a collection of accepted values.
+        Returns a new universe with the matching rows.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        if market_id is not None:
+            mask &= _mask(self.market_ids, market_id)
+        if exchange_id is not None:
+            mask &= _mask(self.exchange_ids, exchange_id)
+        if currency is not None:
+            wanted = [currency] if isinstance(currency, str) else list(currency)
+            codes = np.flatnonzero(np.isin(self.currency_names, wanted))
+            mask &= np.isin(self.currency_codes, codes)
+        return self.take(mask)
+
+    def take(self, selector: np.ndarray) -> TickerUniverse:
+        """Subset by boolean mask or positions; category tables are shared, not copied."""
+        return TickerUniverse(
+            self.ids[selector],
+            self.symbols[selector],
+            self.market_ids[selector],
+            self.exchange_ids[selector],
+            self.currency_codes[selector],
+            self.currency_names,
+            self.full_names[selector],
+            self.descriptions[selector],
+            self.source_codes[selector],
+            self.source_names,
+        )
+
+    # ---------- CONVERT ----------
+
+    def to_pandas(self) -> pd.DataFrame:
+        """DataFrame indexed by ticker_id; currency and source become Categoricals without re-encoding."""
+        return pd.DataFrame(
+            {
+                "symbol": self.symbols,
+                "market_id": self.market_ids,
+                "exchange_id": self.exchange_ids,
+                "currency": pd.Categorical.from_codes(self.currency_codes.astype(np.int32), categories=self.currency_names),
+                "full_name": self.full_names,
+                "description": self.descriptions,
+                "source": pd.Categorical.from_codes(self.source_codes.astype(np.int32), categories=self.source_names),
+            },
+            index=pd.Index(self.ids, name="ticker_id"),
+        )
+
+    def to_arrow(self) -> Any:
+        """pyarrow Table with dictionary-encoded currency/source columns (requires pyarrow)."""
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("Please install pyarrow to convert a TickerUniverse to Arrow.")
+        return pa.table({
+            "ticker_id": self.ids,
+            "symbol": pa.array(self.symbols.tolist(), type=pa.string()),
+            "market_id": self.market_ids,
+            "exchange_id": self.exchange_ids,
+            "currency": pa.DictionaryArray.from_arrays(self.currency_codes, pa.array(self.currency_names.tolist(), type=pa.string())),
+            "full_name": pa.array(self.full_names.tolist(), type=pa.string()),
+            "description": pa.array(self.descriptions.tolist(), type=pa.string()),
+            "source": pa.DictionaryArray.from_arrays(self.source_codes, pa.array(self.source_names.tolist(), type=pa.string())),
+        })
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        return f"TickerUniverse({len(self)} tickers)"
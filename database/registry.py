@@ -0,0 +1,123 @@
+from __future__ import annotations
+import sqlite3 as sql
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Type, TypeVar
+
+R = TypeVar("R")
+
+# Sentinel for "not in the identity map" (None is a valid cached answer for complete kinds)
+MISSING = object()
+
+
+class Registry:
+    """
+    Shared repositories and identity map for one database connection.
+
+    - repo(cls) returns one repository instance per class, so relation properties on
+      Exchange/Market/Ticker stop building a repository (and running PRAGMAs) per call.
+    - The identity map keeps one object per (kind, key), e.g. ("ticker", 42), so walking
+      relations hands back the same Ticker/Market/Exchange instance and only queries on a miss.
+    - Relation lists (e.g. the tickers of a market) are cached the same way.
+    Any write through a repository calls invalidate(), which drops every cached object.
+
+    Every method is guarded by one lock, so a registry can be shared by the threads of a
+    ConnectionPool. Loaders run outside it; what they load is only cached if no
+    invalidate() happened meanwhile (see `generation`).
+    """
+
+    def __init__(self, connection: sql.Connection):
+        self.connection = connection
+        self._repos: Dict[type, Any] = {}
+        self._objects: Dict[Tuple[str, Hashable], Any] = {}
+        self._relations: Dict[Tuple[str, Hashable], List[Any]] = {}
+        self._complete: Set[str] = set()
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    # ---------- REPOSITORIES ----------
+
+    def repo(self, cls: Type[R]) -> R:
+        """Return the shared repository of this class, creating it on first use."""
+        with self._lock:
+            repo = self._repos.get(cls)
+            if repo is None:
+                repo = self._repos[cls] = cls(self.connection)
+            return repo
+
+    # ---------- IDENTITY MAP ----------
+
+    @property
+    def generation(self) -> int:
+        """Number of invalidate() calls so far; read it before loading rows to mark_complete()."""
+        return self._generation
+
+    def lookup(self, kind: str, key: Hashable) -> Any:
+        """
+        Return the cached object for (kind, key).
+        None if the kind is fully loaded and the key is absent, MISSING if the database must be asked.
+        """
+        with self._lock:
+            obj = self._objects.get((kind, key), MISSING)
+            if obj is MISSING and kind in self._complete:
+                return None
+            return obj
+
+    def remember(self, kind: str, key: Hashable, factory: Callable[[], R]) -> R:
+        """Return the cached object for (kind, key), building and caching it with factory() on a miss."""
+        with self._lock:
+            obj = self._objects.get((kind, key), MISSING)
+            if obj is MISSING:
+                obj = self._objects[(kind, key)] = factory()
+            return obj
+
+    def mark_complete(self, kind: str, generation: int) -> None:
+        """
+        Record that every row of this kind is in the map (after a get_all that started at
+        `generation`). Ignored if the map was invalidated since.
+        """
+        with self._lock:
+            if generation == self._generation:
+                self._complete.add(kind)
+
+    def relation(self, name: str, key: Hashable, loader: Callable[[], List[Any]]) -> List[Any]:
+        """Return a cached relation list (e.g. ("market_tickers", (1, 2))), loading it on a miss."""
+        with self._lock:
+            rows = self._relations.get((name, key))
+            if rows is not None:
+                return rows
+            generation = self._generation
+        rows = loader()
+        with self._lock:
+            if generation == self._generation:
+                # Another thread may have loaded it first; everyone shares one list
+                rows = self._relations.setdefault((name, key), rows)
+        return rows
+
+    def cached_relation(self, name: str, key: Hashable) -> Optional[List[Any]]:
+        """Return a cached relation list, or None if it is not loaded (never loads it)."""
+        with self._lock:
+            return self._relations.get((name, key))
+
+    def invalidate(self) -> None:
+        """Forget every cached object and relation (called after any write)."""
+        with self._lock:
+            self._objects.clear()
+            self._relations.clear()
+            self._complete.clear()
+            self._generation += 1
+
+
+def registry_for(connection: sql.Connection) -> Registry:
+    """
+    Return the registry shared by everything using this connection.
+    It is attached to the connection as `connection.registry` (DataBase connections and pools
+    allow this); a plain sqlite3.Connection cannot hold it, so each caller gets its own.
+    """
+    registry = getattr(connection, "registry", None)
+    if registry is None:
+        registry = Registry(connection)
+        try:
+            connection.registry = registry
+        except AttributeError:
+            pass
+    return registry
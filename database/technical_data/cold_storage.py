@@ -0,0 +1,165 @@
+from __future__ import annotations
+import os
+import shutil
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import numpy as np
+
+# Partition key for base bars; rollups use their resolution in seconds
+RAW = "raw"
+
+# Columns stored in every partition (same as historical_prices.BAR_DTYPE)
+_STORED = np.dtype([("datetime", "int64"), ("open", "float64"), ("high", "float64"), ("low", "float64"), ("close", "float64"), ("volume", "float64")])
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Please install pyarrow to use the Parquet cold storage tier.")
+    return pa, pq
+
+def merge_bars(cold: np.ndarray, hot: np.ndarray) -> np.ndarray:
+    """
+    Merge two epoch-stamped structured arrays into one sorted by datetime.
+    Where both hold a bar for the same datetime the hot one wins.
+    """
+    if not len(cold):
+        return hot
+    if not len(hot):
+        return cold
+    merged = np.concatenate([cold, hot])
+    merged = merged[np.argsort(merged["datetime"], kind="stable")]
+    last = np.append(merged["datetime"][1:] != merged["datetime"][:-1], True)
+    return merged[last]
+
+
+class ColdStore:
+    """
+    Parquet cold tier for historical bars, partitioned hive-style as
+
+        <root>/ticker_id=<id>/resolution=<raw|300|3600|86400>/year=<YYYY>/bars.parquet
+
+    Each file holds one ticker/resolution/year sorted by datetime (timestamp[s, UTC]),
+    compressed with zstd. Reads only open the year partitions overlapping the request
+    and push the datetime range down to the Parquet row-group statistics.
+    `horizon` is the default age beyond which bars move here from SQLite.
+    """
+
+    def __init__(self, root: str | os.PathLike, *, horizon: timedelta = timedelta(days=730), compression: str = "zstd"):
+        self.root = Path(root)
+        self.horizon = horizon
+        self.compression = compression
+
+    def _partition(self, ticker_id: int, resolution: int | str, year: int) -> Path:
+        return self.root / f"ticker_id={int(ticker_id)}" / f"resolution={resolution}" / f"year={int(year)}" / "bars.parquet"
+
+    def _years(self, ticker_id: int, resolution: int | str) -> List[int]:
+        """Years that have a partition for this ticker and resolution."""
+        folder = self.root / f"ticker_id={int(ticker_id)}" / f"resolution={resolution}"
+        if not folder.is_dir():
+            return []
+        return sorted(int(entry.name[5:]) for entry in folder.iterdir() if entry.name.startswith("year=") and (entry / "bars.parquet").exists())
+
+    # ---------- READ ----------
+
+    def read(self, ticker_id: int, resolution: int | str, start: int, end: int | None, dtype: np.dtype) -> np.ndarray:
+        """Bars of one ticker/resolution with start <= datetime <= end (epoch seconds) as a structured array of dtype."""
+        years = [year for year in self._years(ticker_id, resolution) if year >= _year(start) and (end is None or year <= _year(end))]
+        if not years:
+            return np.empty(0, dtype=dtype)
+        parts = [self._read_partition(self._partition(ticker_id, resolution, year), dtype, start, end) for year in years]
+        return np.concatenate(parts)
+
+    def _read_partition(self, path: Path, dtype: np.dtype, start: int | None = None, end: int | None = None) -> np.ndarray:
+        pa, pq = _pyarrow()
+        filters = []
+        if start is not None:
+            filters.append(("datetime", ">=", pa.scalar(start, type=pa.timestamp("s", tz="UTC"))))
+        if end is not None:
+            filters.append(("datetime", "<=", pa.scalar(end, type=pa.timestamp("s", tz="UTC"))))
+        table = pq.read_table(path, columns=list(dtype.names), filters=filters or None)
+        out = np.empty(table.num_rows, dtype=dtype)
+        # Parquet may hand timestamp[s] back in a finer unit, so cast to seconds first
+        out["datetime"] = table.column("datetime").cast(pa.timestamp("s", tz="UTC")).cast(pa.int64()).to_numpy()
+        for name in dtype.names[1:]:
+            out[name] = table.column(name).to_numpy()
+        return out
+
+    def tickers(self) -> List[int]:
+        """Ticker ids with any cold data."""
+        if not self.root.is_dir():
+            return []
+        return sorted(int(entry.name[10:]) for entry in self.root.iterdir() if entry.name.startswith("ticker_id="))
+
+    # ---------- WRITE ----------
+
+    def write(self, ticker_id: int, resolution: int | str, bars: np.ndarray) -> int:
+        """
+        Merge epoch-stamped bars into their year partitions (incoming bars replace stored
+        ones with the same datetime). Files are replaced atomically.
+        Returns number of bars written.
+        """
+        for year, part in _by_year(bars):
+            path = self._partition(ticker_id, resolution, year)
+            if path.exists():
+                part = merge_bars(self._read_partition(path, _STORED), part.astype(_STORED))
+            self._write_partition(path, part)
+        return len(bars)
+
+    def _write_partition(self, path: Path, bars: np.ndarray) -> None:
+        pa, pq = _pyarrow()
+        columns = {"datetime": pa.array(bars["datetime"], type=pa.int64()).cast(pa.timestamp("s", tz="UTC"))}
+        columns.update({name: pa.array(bars[name]) for name in bars.dtype.names[1:]})
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".parquet.tmp")
+        pq.write_table(pa.table(columns), tmp, compression=self.compression)
+        os.replace(tmp, path)
+
+    # ---------- DELETE ----------
+
+    def delete_range(self, ticker_id: int, start: int, end: int) -> int:
+        """Remove bars with start <= datetime <= end from every resolution of a ticker. Returns base bars removed."""
+        removed = 0
+        for resolution, path in self._partitions(ticker_id):
+            year = int(path.parent.name[5:])
+            if year < _year(start) or year > _year(end):
+                continue
+            bars = self._read_partition(path, _STORED)
+            keep = (bars["datetime"] < start) | (bars["datetime"] > end)
+            if resolution == RAW:
+                removed += int((~keep).sum())
+            if keep.all():
+                continue
+            if keep.any():
+                self._write_partition(path, bars[keep])
+            else:
+                path.unlink()
+        return removed
+
+    def drop(self, ticker_id: int | None = None) -> None:
+        """Remove all cold data of a ticker (or of every ticker)."""
+        target = self.root if ticker_id is None else self.root / f"ticker_id={int(ticker_id)}"
+        if target.is_dir():
+            shutil.rmtree(target)
+
+    def _partitions(self, ticker_id: int) -> Iterator[Tuple[str, Path]]:
+        folder = self.root / f"ticker_id={int(ticker_id)}"
+        if not folder.is_dir():
+            return
+        for resolution in folder.iterdir():
+            for path in resolution.glob("year=*/bars.parquet"):
+                yield resolution.name[11:], path
+
+def _year(epoch: int) -> int:
+    return int(np.datetime64(int(epoch), "s").astype("datetime64[Y]").astype(int)) + 1970
+
+def _by_year(bars: np.ndarray) -> Iterator[Tuple[int, np.ndarray]]:
+    """Split epoch-stamped bars (sorted by datetime) into per-year slices."""
+    if not len(bars):
+        return
+    years = bars["datetime"].astype("datetime64[s]").astype("datetime64[Y]").astype(int) + 1970
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(years)) + 1, [len(bars)]])
+    for start, end in zip(starts[:-1], starts[1:]):
+        yield int(years[start]), bars[start:end]
@@ -0,0 +1,229 @@
+from __future__ import annotations
+import sqlite3 as sql
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+from ..bulk import BulkRepository
+from ..registry import registry_for
+from .historical_prices import _epoch
+
+def corporate_action_schema() -> List[str]:
+    """DDL for the corporate_actions table."""
+    return [
+        '''CREATE TABLE IF NOT EXISTS corporate_actions (
+                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+                        ex_date DATE NOT NULL,
+                        action TEXT NOT NULL,
+                        value REAL NOT NULL,
+                        factor REAL,
+                        PRIMARY KEY (ticker_id, ex_date, action)
+                    ) WITHOUT ROWID''',
+    ]
+
+def action_rows(actions: Any) -> List[Tuple[str, str, float]]:
+    """
+    Normalise corporate actions into (ex_date 'YYYY-MM-DD', action, value) rows.
+
+    Accepts:
+        - yfinance's Ticker.actions frame (a date index with "Dividends" and "Stock Splits"
+          columns, zero meaning no action). Yahoo reports dividends in today's shares, so
+          each is scaled back by the splits that followed it to the cash paid per share
+          at the time
+        - a DataFrame or iterable of (ex_date, action, value) rows / mappings
+    """
+    if isinstance(actions, pd.DataFrame) and "Stock Splits" in actions.columns:
+        dates = pd.DatetimeIndex(actions.index).strftime("%Y-%m-%d").to_numpy()
+        splits = actions["Stock Splits"].fillna(0).to_numpy(dtype="float64")
+        dividends = actions["Dividends"].fillna(0).to_numpy(dtype="float64") if "Dividends" in actions.columns else np.zeros(len(dates))
+        ratio = np.where(splits > 0, splits, 1.0)
+        # Product of the split ratios strictly after each row (rows are in date order)
+        later = np.cumprod(ratio[::-1])[::-1] / ratio
+        rows = [(date, "split", float(value)) for date, value in zip(dates[splits > 0], splits[splits > 0])]
+        rows += [(date, "dividend", float(value)) for date, value in zip(dates[dividends > 0], (dividends * later)[dividends > 0])]
+        return rows
+    if isinstance(actions, pd.DataFrame):
+        actions = actions[["ex_date", "action", "value"]].itertuples(index=False)
+    rows = []
+    for row in actions:
+        ex_date, action, value = (row["ex_date"], row["action"], row["value"]) if isinstance(row, dict) else row
+        if action not in ("split", "dividend"):
+            raise ValueError(f"Unknown corporate action '{action}'")
+        rows.append((pd.Timestamp(ex_date).strftime("%Y-%m-%d"), action, float(value)))
+    return rows
+
+
+@dataclass
+class CorporateAction:
+    """
+    Data class representing one split or cash dividend of a ticker.
+    """
+
+    ticker_id: int
+    ex_date: str
+    action: str
+    value: float
+    factor: Optional[float]
+
+
+class AdjustmentFactors(NamedTuple):
+    """
+    Cumulative backward adjustment of a ticker: a bar stamped t is multiplied by the
+    factors of every action with an ex-date after t, price[k] / volume[k] with
+    k = searchsorted(ex, t, side="right").
+    """
+    ex: np.ndarray      # ex-dates as UTC epoch seconds (midnight), ascending, int64
+    price: np.ndarray   # len(ex) + 1 cumulative price factors (last entry 1.0), float64
+    volume: np.ndarray  # len(ex) + 1 cumulative volume factors (split ratios), float64
+
+    def at(self, stamps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(price, volume) factors for epoch timestamps."""
+        k = np.searchsorted(self.ex, stamps, side="right")
+        return self.price[k], self.volume[k]
+
+    def apply(self, bars: np.ndarray) -> np.ndarray:
+        """Adjusted copy of an epoch-stamped bar array (BAR_DTYPE or CLOSE_DTYPE)."""
+        if not len(self.ex) or not len(bars):
+            return bars
+        price, volume = self.at(bars["datetime"])
+        out = bars.copy()
+        for name in ("open", "high", "low", "close"):
+            if name in out.dtype.names:
+                out[name] *= price
+        if "volume" in out.dtype.names:
+            out["volume"] *= volume
+        return out
+
+
+class CorporateActionsRepository(BulkRepository):
+    """
+    Data-access layer for the `corporate_actions` table.
+
+    Schema:
+        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+        ex_date DATE NOT NULL,                      -- 'YYYY-MM-DD'
+        action TEXT NOT NULL,                       -- 'split' or 'dividend'
+        value REAL NOT NULL,                        -- new shares per old share, or cash per share
+        factor REAL,                                -- price factor for bars before ex_date (NULL: not known yet)
+        PRIMARY KEY (ticker_id, ex_date, action)
+
+    Bars are stored as traded and never rewritten; adjusted reads multiply them by the
+    ticker's cumulative AdjustmentFactors. A split's factor is 1 / value; a dividend's is
+    1 - value / close, with close the last daily close before the ex-date. That close
+    comes from the price repository the first time the factor is needed and the factor
+    is then kept in the row, so later reads (and retention deleting the raw bars) do not
+    change it. The cumulative series is cached per ticker in the registry and dropped on
+    any write through a repository.
+
+    Function Returns:
+        gets:
+            get_actions(ticker_id: int, start=None, end=None) -> List[CorporateAction]
+            adjustment_factors(ticker_id: int, closes_before=None) -> AdjustmentFactors
+        creates:
+            upsert_many(ticker_id: int, actions) -> int
+        deletes:
+            delete(ticker_id: int) -> int
+            delete_all() -> int
+    """
+
+    TABLE_NAME = "corporate_actions"
+    ID_COL     = "ticker_id"
+    COLUMNS    = ["ticker_id", "ex_date", "action", "value", "factor"]
+
+    def __init__(self, connection: sql.Connection):
+        self.connection = connection
+        # Ensure foreign key constraints are enforced
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.registry = registry_for(connection)
+
+    # ---------- READ ----------
+
+    def get_actions(self, ticker_id: int, start: Any = None, end: Any = None) -> List[CorporateAction]:
+        """Actions of a ticker (optionally with ex-dates in [start, end]) in ex-date order."""
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM corporate_actions WHERE ticker_id = ?"
+        params: Tuple[Any, ...] = (ticker_id,)
+        if start is not None:
+            query += " AND ex_date >= ?"
+            params += (pd.Timestamp(start).strftime("%Y-%m-%d"),)
+        if end is not None:
+            query += " AND ex_date <= ?"
+            params += (pd.Timestamp(end).strftime("%Y-%m-%d"),)
+        cur = self.connection.cursor()
+        cur.execute(query + " ORDER BY ex_date, action", params)
+        return [CorporateAction(*row) for row in cur.fetchall()]
+
+    def adjustment_factors(self, ticker_id: int, closes_before: Callable[[np.ndarray], np.ndarray] | None = None) -> AdjustmentFactors:
+        """
+        Cumulative adjustment factors of a ticker. Dividends without a stored factor are
+        resolved with closes_before(ex_epochs) -> last close before each ex-date (NaN if
+        unknown) and stored; until their close is known they count as 1.0 and the series
+        is not cached.
+        """
+        cached = self.registry.cached_relation("adjustment_factors", ticker_id)
+        if cached is not None:
+            return cached
+        actions = self.get_actions(ticker_id)
+        pending = [a for a in actions if a.factor is None and a.action == "dividend"]
+        if pending and closes_before is not None:
+            self._resolve(pending, closes_before)
+        ex = np.array([_epoch(a.ex_date) for a in actions], dtype="int64")
+        factors = [1.0 if a.factor is None else a.factor for a in actions]
+        ratios = [a.value if a.action == "split" else 1.0 for a in actions]
+        series = AdjustmentFactors(ex, _cumulative(factors), _cumulative(ratios))
+        if all(a.factor is not None for a in actions):
+            self.registry.relation("adjustment_factors", ticker_id, lambda: series)
+        return series
+
+    def _resolve(self, pending: List[CorporateAction], closes_before: Callable[[np.ndarray], np.ndarray]) -> None:
+        """Compute and store the factors of dividends whose prior close is known."""
+        closes = np.asarray(closes_before(np.array([_epoch(a.ex_date) for a in pending], dtype="int64")), dtype="float64")
+        rows = []
+        for action, close in zip(pending, closes.tolist()):
+            if close == close and close > action.value:
+                action.factor = 1.0 - action.value / close
+                rows.append((action.factor, action.ticker_id, action.ex_date, action.action))
+        if rows:
+            cur = self.connection.cursor()
+            cur.executemany("UPDATE corporate_actions SET factor = ? WHERE ticker_id = ? AND ex_date = ? AND action = ?", rows)
+            # Only fills in derived values, so cached objects stay valid
+            self.connection.commit()
+
+    # ---------- CREATE ----------
+
+    def upsert_many(self, ticker_id: int, actions: Any) -> int:
+        """
+        Insert or update the corporate actions of a ticker (see action_rows for the accepted
+        inputs). Split factors are stored right away; a dividend whose value changed gets
+        its factor computed again. Returns number of rows written.
+        """
+        rows = action_rows(actions)
+        if not rows:
+            return 0
+        cur = self.connection.cursor()
+        cur.executemany(
+            '''INSERT INTO corporate_actions (ticker_id, ex_date, action, value, factor) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (ticker_id, ex_date, action) DO UPDATE SET
+                   factor = CASE WHEN action = 'split' OR value = excluded.value THEN coalesce(excluded.factor, factor) END,
+                   value = excluded.value''',
+            [(ticker_id, ex_date, action, value, 1.0 / value if action == "split" else None) for ex_date, action, value in rows],
+        )
+        self._written()
+        return len(rows)
+
+    # ---------- DELETE ----------
+
+    def delete(self, ticker_id: int) -> int:
+        """Delete every action of a ticker. Returns number of rows deleted."""
+        return self._delete_in(["ticker_id"], [ticker_id])
+
+    def delete_all(self) -> int:
+        """Delete ALL corporate actions. Returns number of rows deleted."""
+        cur = self.connection.cursor()
+        cur.execute("DELETE FROM corporate_actions")
+        self._written()
+        return cur.rowcount
+
+def _cumulative(factors: Iterable[float]) -> np.ndarray:
+    """Products of the factors from each position to the end, with a trailing 1.0."""
+    factors = np.asarray(list(factors), dtype="float64")
+    return np.append(np.cumprod(factors[::-1])[::-1], 1.0)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+import sqlite3 as sql
+from typing import List, Tuple
+import numpy as np
+from ..core.calendars import TradingSession, session_intervals
+
+# Neighbouring intervals further apart than this are never merged (bounds the lookup)
+MERGE_WINDOW = 7 * 86400
+
+def coverage_schema() -> List[str]:
+    """DDL for the price_coverage table."""
+    return [
+        '''CREATE TABLE IF NOT EXISTS price_coverage (
+                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+                        resolution INTEGER NOT NULL,
+                        start_time INTEGER NOT NULL,
+                        end_time INTEGER NOT NULL,
+                        PRIMARY KEY (ticker_id, resolution, start_time)
+                    ) WITHOUT ROWID''',
+    ]
+
+def infer_resolution(stamps: np.ndarray) -> int | None:
+    """Bar width in seconds of epoch-stamped bars: the smallest step between them (None if unknown)."""
+    steps = np.diff(np.unique(stamps))
+    return int(steps.min()) if len(steps) else None
+
+def subtract(spans: np.ndarray, covered: np.ndarray) -> np.ndarray:
+    """Parts of the sorted, disjoint (n, 2) spans not inside any of the sorted, disjoint covered spans."""
+    gaps = []
+    j = 0
+    for start, end in spans.tolist():
+        while j < len(covered) and covered[j, 1] <= start:
+            j += 1
+        k = j
+        while start < end and k < len(covered) and covered[k, 0] < end:
+            if covered[k, 0] > start:
+                gaps.append((start, int(covered[k, 0])))
+            start = max(start, int(covered[k, 1]))
+            k += 1
+        if start < end:
+            gaps.append((start, end))
+    return np.array(gaps, dtype="int64").reshape(-1, 2)
+
+
+class PriceCoverage:
+    """
+    Index of the time intervals a ticker's bars were ingested for, per bar resolution.
+
+    Schema:
+        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+        resolution INTEGER NOT NULL,                -- bar width in seconds
+        start_time INTEGER NOT NULL,                -- UTC epoch seconds
+        end_time INTEGER NOT NULL,                  -- UTC epoch seconds, exclusive
+        PRIMARY KEY (ticker_id, resolution, start_time)
+
+    Intervals of one ticker and resolution are kept disjoint: a new interval absorbs the
+    ones it overlaps and neighbours separated from it only by closed market time, so a
+    daily backfill grows one interval instead of one per session. Writes run on the
+    caller's transaction (the price repository commits them with the bars).
+    """
+
+    def __init__(self, connection: sql.Connection):
+        self.connection = connection
+
+    def add(self, ticker_id: int, resolution: int, start: int, end: int, session: TradingSession) -> None:
+        """Record [start, end) as covered at resolution, merging it with its neighbours."""
+        if end <= start:
+            return
+        cur = self.connection.cursor()
+        cur.execute(
+            "SELECT start_time, end_time FROM price_coverage WHERE ticker_id = ? AND resolution = ? AND start_time <= ? AND end_time >= ? ORDER BY start_time",
+            (ticker_id, resolution, end + MERGE_WINDOW, start - MERGE_WINDOW),
+        )
+        near = cur.fetchall()
+        merged = [start, end]
+        absorbed = []
+        while True:
+            # Overlapping neighbours have an empty gap, so they merge too
+            joins = [(first, last) for first, last in near if first not in absorbed and not len(
+                session_intervals(session, last, merged[0]) if last <= merged[0] else session_intervals(session, merged[1], first)
+            )]
+            if not joins:
+                break
+            for first, last in joins:
+                merged = [min(merged[0], first), max(merged[1], last)]
+                absorbed.append(first)
+        if absorbed:
+            cur.executemany(
+                "DELETE FROM price_coverage WHERE ticker_id = ? AND resolution = ? AND start_time = ?",
+                [(ticker_id, resolution, first) for first in absorbed],
+            )
+        cur.execute("INSERT INTO price_coverage (ticker_id, resolution, start_time, end_time) VALUES (?, ?, ?, ?)", (ticker_id, resolution, *merged))
+
+    def remove(self, ticker_id: int | None = None, start: int | None = None, end: int | None = None) -> None:
+        """Forget coverage of [start, end) for a ticker (all of it without a range; every ticker without one)."""
+        cur = self.connection.cursor()
+        if ticker_id is None:
+            cur.execute("DELETE FROM price_coverage")
+            return
+        if start is None:
+            cur.execute("DELETE FROM price_coverage WHERE ticker_id = ?", (ticker_id,))
+            return
+        cur.execute(
+            "SELECT resolution, start_time, end_time FROM price_coverage WHERE ticker_id = ? AND start_time < ? AND end_time > ?",
+            (ticker_id, end, start),
+        )
+        cut = cur.fetchall()
+        cur.executemany(
+            "DELETE FROM price_coverage WHERE ticker_id = ? AND resolution = ? AND start_time = ?",
+            [(ticker_id, resolution, first) for resolution, first, _ in cut],
+        )
+        kept = [(ticker_id, resolution, first, start) for resolution, first, _ in cut if first < start]
+        kept += [(ticker_id, resolution, end, last) for resolution, _, last in cut if last > end]
+        cur.executemany("INSERT INTO price_coverage (ticker_id, resolution, start_time, end_time) VALUES (?, ?, ?, ?)", kept)
+
+    def intervals(self, ticker_id: int, resolution: int, start: int, end: int, *, finer: bool = True) -> np.ndarray:
+        """
+        Sorted, disjoint (n, 2) covered spans overlapping [start, end) at resolution
+        (and, with finer=True, at any finer resolution, whose rollups serve it too).
+        """
+        cur = self.connection.cursor()
+        cur.execute(
+            f"SELECT start_time, end_time FROM price_coverage WHERE ticker_id = ? AND resolution {'<=' if finer else '='} ? AND start_time < ? AND end_time > ?",
+            (ticker_id, resolution, end, start),
+        )
+        spans = sorted(cur.fetchall())
+        merged: List[List[int]] = []
+        for first, last in spans:
+            if merged and first <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        return np.array(merged, dtype="int64").reshape(-1, 2)
+
+    def missing(self, ticker_id: int, resolution: int, start: int, end: int, session: TradingSession, *, floor: int | None = None) -> List[Tuple[int, int]]:
+        """
+        [start, end) spans of open sessions with no coverage at resolution (or finer),
+        gaps separated only by closed market time joined into one request. Coverage
+        before floor (bars compacted away by retention) does not count.
+        """
+        sessions = session_intervals(session, start, end)
+        covered = self.intervals(ticker_id, resolution, start, end)
+        if floor is not None:
+            covered = np.clip(covered, floor, None)
+            covered = covered[covered[:, 1] > covered[:, 0]]
+        gaps = subtract(sessions, covered)
+        joined: List[Tuple[int, int]] = []
+        for first, last in gaps.tolist():
+            if joined and not len(session_intervals(session, joined[-1][1], first)):
+                joined[-1] = (joined[-1][0], last)
+            else:
+                joined.append((first, last))
+        return joined
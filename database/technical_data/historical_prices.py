@@ -1,9 +1,20 @@
 from __future__ import annotations
 import sqlite3 as sql
-from typing import Optional, List, Tuple, Any, Literal
-from datetime import datetime
+from typing import Optional, List, Tuple, Any, Literal, Iterable, Mapping, Dict, TYPE_CHECKING
+from datetime import datetime, timedelta
 from dataclasses import dataclass
 from functools import cached_property
+from itertools import repeat
+import json
+import numpy as np
+import pandas as pd
+from ..core.calendars import TradingSession, session_for
+from ..registry import registry_for
+from .cold_storage import ColdStore, RAW, merge_bars
+from .coverage import PriceCoverage, coverage_schema, infer_resolution
+
+if TYPE_CHECKING:
+    from .corporate_actions import AdjustmentFactors
 
 # TODO: Fix up repository with data classes and better methods for fetching
 
@@ -13,6 +24,14 @@ periods = {
         "1 Day"
     }
 
+# Rollup resolution (bucket width in seconds) for each period, finest first.
+# Each level is aggregated from the one before it, the first from historical_prices.
+resolutions = {
+        "5 Minutes": 300,
+        "1 Hour": 3600,
+        "1 Day": 86400,
+    }
+
 @dataclass
 class HistoricalPrices:
     ticker_id: int
@@ -24,14 +43,205 @@ class HistoricalPrices:
     volume: int
     connection: sql.Connection
 
-    
 
+BAR_FIELDS = ("datetime", "open", "high", "low", "close", "volume")
+
+# Columnar read layouts: datetime is int64 UTC epoch seconds, prices/volume float64 (NULL -> NaN)
+BAR_DTYPE = np.dtype([("datetime", "int64"), ("open", "float64"), ("high", "float64"), ("low", "float64"), ("close", "float64"), ("volume", "float64")])
+CLOSE_DTYPE = np.dtype([("datetime", "int64"), ("close", "float64")])
+
+Output = Literal["rows", "numpy", "pandas"]
+
+# price_retention levels: base bars (deleted with their 5-minute rollups) and hourly rollups
+BASE, HOURLY = 0, 3600
+
+# The retention level whose watermark bounds the source of each rollup resolution
+ROLLUP_SOURCE = {300: BASE, 3600: BASE, 86400: HOURLY}
+
+# Storage layouts of historical_prices.datetime: legacy DATETIME text, or int64 UTC epoch seconds
+Layout = Literal["text", "epoch"]
+
+def price_schema(layout: Layout, *, prices: str = "historical_prices", rollups: str = "price_rollups") -> List[str]:
+    """
+    DDL for the price and rollup tables in a storage layout.
+    "epoch" clusters both tables on their primary key (WITHOUT ROWID) with INTEGER
+    epoch timestamps and needs no secondary index; "text" is the legacy layout.
+    """
+    if layout == "epoch":
+        time_type, clustered = "INTEGER", " WITHOUT ROWID"
+    else:
+        time_type, clustered = "DATETIME", ""
+    statements = [
+        f'''CREATE TABLE IF NOT EXISTS {prices} (
+                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+                        datetime {time_type} NOT NULL,
+                        open REAL,
+                        high REAL,
+                        low REAL,
+                        close REAL NOT NULL,
+                        volume INTEGER,
+                        PRIMARY KEY (ticker_id, datetime)
+                    ){clustered}''',
+        f'''CREATE TABLE IF NOT EXISTS {rollups} (
+                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+                        resolution INTEGER NOT NULL,
+                        datetime {time_type} NOT NULL,
+                        open REAL,
+                        high REAL,
+                        low REAL,
+                        close REAL NOT NULL,
+                        volume INTEGER,
+                        PRIMARY KEY (ticker_id, resolution, datetime)
+                    ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS price_retention (
+                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+                        level INTEGER NOT NULL,
+                        compacted_before INTEGER NOT NULL,
+                        PRIMARY KEY (ticker_id, level)
+                    ) WITHOUT ROWID''',
+        *coverage_schema(),
+    ]
+    if layout == "text":
+        statements.append(f"CREATE INDEX IF NOT EXISTS idx_prices_ticker_time ON {prices} (ticker_id, datetime)")
+    return statements
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    How long intraday bars stay in SQLite (see HistoricalPricesRepository.enforce_retention).
+
+        raw          -> base bars and 5-minute rollups; older days keep hourly and daily rollups
+        hourly       -> hourly rollups; older days keep daily rollups only (None: keep forever)
+        chunk_size   -> bars deleted per transaction (rounded up to whole UTC days)
+        vacuum_pages -> free pages returned to the OS after each chunk (incremental auto_vacuum)
+    """
+    raw: timedelta = timedelta(days=90)
+    hourly: timedelta | None = timedelta(days=730)
+    chunk_size: int = 50_000
+    vacuum_pages: int = 1_000
+
+    def __post_init__(self):
+        if self.hourly is not None and self.hourly < self.raw:
+            raise ValueError("Hourly bars must be kept at least as long as base bars")
+
+
+@dataclass
+class RetentionReport:
+    """Rows removed (and file pages released) by one enforce_retention() run."""
+    bars: int = 0
+    five_minute: int = 0
+    hourly: int = 0
+    vacuumed_pages: int = 0
+    complete: bool = True
+
+
+def layout_of(connection: sql.Connection, table: str = "historical_prices") -> Layout | None:
+    """Detect the storage layout of a price table from its declared datetime type (None if missing)."""
+    cur = connection.cursor()
+    cur.execute(f"PRAGMA table_info({table})")
+    for _, name, declared, *_ in cur.fetchall():
+        if name == "datetime":
+            return "epoch" if declared.upper() == "INTEGER" else "text"
+    return None
+
+def bar_arrays(bars: pd.DataFrame | Mapping[str, Any] | np.ndarray | Iterable[Any]) -> Dict[str, np.ndarray]:
+    """
+    Normalise a batch of OHLCV bars into a dict of column arrays.
+
+    Accepts:
+        - a DataFrame with a datetime/date column (or a DatetimeIndex) and
+          open/high/low/close/volume columns (any capitalisation, e.g. yfinance output)
+        - a mapping of column name -> array, or a NumPy structured array
+        - an iterable of (datetime, open, high, low, close, volume) tuples or of
+          bar objects with .date/.open/.high/.low/.close/.volume (ib_insync BarData)
+
+    Integer datetimes are epoch seconds. Returns datetime as UTC datetime64[s] (naive
+    inputs are taken as UTC),
+    open/high/low/close/volume as float64. Rows without a close are dropped.
+    """
+    if isinstance(bars, pd.DataFrame):
+        frame = bars.rename(columns=lambda c: str(c).lower())
+        if "datetime" not in frame.columns:
+            frame = frame.rename(columns={"date": "datetime"})
+        if "datetime" not in frame.columns:
+            frame = frame.reset_index(names="datetime")
+        columns = {name: frame[name] if name in frame.columns else None for name in BAR_FIELDS}
+    elif isinstance(bars, np.ndarray) and bars.dtype.names:
+        columns = {name: bars[name] if name in bars.dtype.names else None for name in BAR_FIELDS}
+    elif isinstance(bars, Mapping):
+        columns = {name: np.asarray(bars[name]) if name in bars else None for name in BAR_FIELDS}
+    else:
+        rows = list(bars)
+        if rows and not isinstance(rows[0], (tuple, list)):
+            rows = [(b.date, b.open, b.high, b.low, b.close, b.volume) for b in rows]
+        columns = dict(zip(BAR_FIELDS, zip(*rows))) if rows else {name: () for name in BAR_FIELDS}
+
+    if columns["datetime"] is None or columns["close"] is None:
+        raise ValueError("Bars must provide at least datetime and close")
+
+    stamps = pd.Index(columns["datetime"])
+    if pd.api.types.is_integer_dtype(stamps):
+        # Epoch seconds (e.g. BAR_DTYPE arrays read back with output="numpy")
+        stamps = pd.to_datetime(stamps, unit="s", utc=True)
+    elif stamps.dtype == object or pd.api.types.is_string_dtype(stamps):
+        stamps = pd.to_datetime(stamps, utc=True, format="mixed")
+    else:
+        stamps = pd.to_datetime(stamps, utc=True)
+    out = {"datetime": stamps.tz_convert(None).to_numpy().astype("datetime64[s]")}
+    n = len(out["datetime"])
+    for name in BAR_FIELDS[1:]:
+        values = columns[name]
+        out[name] = np.full(n, np.nan) if values is None else np.asarray(values, dtype="float64")
+        if len(out[name]) != n:
+            raise ValueError(f"Column '{name}' has {len(out[name])} values, expected {n}")
+
+    keep = ~np.isnan(out["close"])
+    if not keep.all():
+        out = {name: values[keep] for name, values in out.items()}
+    return out
+
+def _epoch(value: Any) -> int:
+    """UTC epoch seconds for a datetime, date string or Timestamp (naive values are taken as UTC)."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_convert("UTC").tz_localize(None)
+    return int(stamp.value // 1_000_000_000)
+
+def datetime_text(epoch: int) -> str:
+    """Format UTC epoch seconds as stored in DATETIME columns ('YYYY-MM-DD HH:MM:SS')."""
+    return np.datetime_as_string(np.datetime64(int(epoch), "s"), unit="s").replace("T", " ")
+
+def _db_datetimes(stamps: np.ndarray) -> List[str]:
+    """Format datetime64 values the way sqlite3 adapts datetime objects ('YYYY-MM-DD HH:MM:SS')."""
+    text = np.datetime_as_string(stamps.astype("datetime64[s]"), unit="s")
+    return [t.replace("T", " ") for t in text.tolist()]
+
+def _nullable(values: np.ndarray, cast=float) -> List[Any]:
+    """Convert a float array to a list, mapping NaN to None (NULL)."""
+    mask = np.isnan(values)
+    if not mask.any():
+        return values.astype("int64").tolist() if cast is int else values.tolist()
+    return [None if missing else cast(v) for v, missing in zip(values.tolist(), mask.tolist())]
+
+# How far back a dividend looks for the close it is adjusted against
+CLOSE_LOOKBACK = 14 * 86400
+
+def _last_close_before(days: np.ndarray, ex: np.ndarray, window: int = CLOSE_LOOKBACK) -> np.ndarray:
+    """Close of the last of `days` (sorted by datetime) in [epoch - window, epoch) for each epoch of ex, NaN if none."""
+    closes = np.full(len(ex), np.nan)
+    at = np.searchsorted(days["datetime"], ex, side="left") - 1
+    found = at >= 0
+    found[found] = days["datetime"][at[found]] >= ex[found] - window
+    closes[found] = days["close"][at[found]]
+    return closes
 
 
 # Need to include option to fetch different periods, (5 min, 1 hour, 1 day)
 class HistoricalPricesRepository:
     """
-    Data-access layer for the `historical_prices` table.
+    Data-access layer for the `historical_prices` table and its `price_rollups`.
 
     Schema:
         ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
@@ -41,12 +251,79 @@ class HistoricalPricesRepository:
         low REAL,
         close REAL NOT NULL,
         volume INTEGER,
+
+    In the "epoch" layout (the default for new databases) datetime is INTEGER UTC epoch
+    seconds in a WITHOUT ROWID table clustered on (ticker_id, datetime); the legacy
+    "text" layout keeps DATETIME text. The layout is detected from the schema, and
+    datetime arguments may be datetimes, strings or epochs in either layout.
+
+    With a ColdStore attached (DataBase(cold_path=...)), tier_to_cold() moves bars older
+    than the store's horizon into Parquet partitions; fetch_raw/fetch_rollup/get_close_prices
+    (and so resample/get_info) merge them back in transparently, hot rows winning on overlap.
+
+    Rollups (one row per ticker, resolution and bucket start, kept in step with every write):
+        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+        resolution INTEGER NOT NULL,
+        datetime DATETIME NOT NULL,
+        open REAL, high REAL, low REAL, close REAL NOT NULL, volume INTEGER,
+        PRIMARY KEY (ticker_id, resolution, datetime)
+
+    Bars are stored as traded. Reads with adjusted=True multiply them on the fly by the
+    ticker's cumulative split/dividend factors (see CorporateActionsRepository), so a new
+    corporate action never means refetching history.
+
+    Every bulk write also records the interval it covered in price_coverage (see
+    PriceCoverage), so missing_ranges() can tell a backfill which open sessions still
+    have no bars at a resolution instead of it refetching whole windows.
+
+    enforce_retention() downsamples aged bars into the hourly/daily rollups and deletes them
+    (see RetentionPolicy); how far each ticker was compacted is kept in:
+        price_retention:
+            ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+            level INTEGER NOT NULL,                 -- 0: base bars and 5-minute rollups, 3600: hourly rollups
+            compacted_before INTEGER NOT NULL,      -- UTC epoch seconds, a midnight
+            PRIMARY KEY (ticker_id, level)
     """
     
+    CHUNK_SIZE = 50_000
+
     def __init__(self, connection: sql.Connection):
         self.connection = connection
         # Ensure foreign key constraints are enforced
         self.connection.execute("PRAGMA foreign_keys = ON")
+        self._layout: Layout | None = None
+        self.cold: ColdStore | None = None
+        self.coverage = PriceCoverage(connection)
+
+    @property
+    def layout(self) -> Layout:
+        """Storage layout of historical_prices, detected from the schema on first use."""
+        if self._layout is None:
+            self._layout = layout_of(self.connection) or "text"
+        return self._layout
+
+    def detect_layout(self) -> Layout:
+        """Forget the cached layout (e.g. after a migration) and detect it again."""
+        self._layout = None
+        return self.layout
+
+    def _param(self, value: Any) -> Any:
+        """Bind a datetime argument in the stored representation (text is passed through as before)."""
+        return _epoch(value) if self.layout == "epoch" else value
+
+    def _stored(self, epoch: int) -> Any:
+        """Epoch seconds in the stored representation of datetime."""
+        return epoch if self.layout == "epoch" else datetime_text(epoch)
+
+    def _stamps(self, stamps: np.ndarray) -> List[Any]:
+        """Stored representation of datetime64[s] values for bulk writes."""
+        if self.layout == "epoch":
+            return stamps.astype("datetime64[s]").astype("int64").tolist()
+        return _db_datetimes(stamps)
+
+    def _epoch_sql(self, column: str = "datetime") -> str:
+        """SQL expression for a datetime column as integer epoch seconds."""
+        return column if self.layout == "epoch" else f"CAST(strftime('%s', {column}) AS INTEGER)"
     
     # ---------- READ ----------
 
@@ -58,144 +335,251 @@ class HistoricalPricesRepository:
         cur.execute("SELECT * FROM historical_prices")
         return cur.fetchall()
     
-    def fetch_daily(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None) -> List[Tuple[Any, ...]]:
+    def fetch_daily(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
         """
         Return all columns for a given ticker_id and datetime range with daily period.
         If end_date is None, return all data from start_date onwards.
+        See `_read` for the `output` modes.
         """
-        cur = self.connection.cursor()
-        if end_date:
-            cur.execute(
-                "SELECT * FROM historical_prices WHERE ticker_id = ? AND datetime BETWEEN ? AND ? ORDER BY datetime",
-                (ticker_id, start_date, end_date)
-            )
-        else:
-            cur.execute(
-                "SELECT * FROM historical_prices WHERE ticker_id = ? AND datetime >= ? ORDER BY datetime",
-                (ticker_id, start_date)
-            )
-        return cur.fetchall()
+        return self.fetch_rollup(ticker_id, resolutions["1 Day"], start_date, end_date, output=output, adjusted=adjusted)
 
-    def fetch_hourly(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None) -> List[Tuple[Any, ...]]:
+    def fetch_hourly(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
         """
         Return all columns for a given ticker_id and datetime range with hourly period.
         If end_date is None, return all data from start_date onwards.
+        See `_read` for the `output` modes.
         """
-        cur = self.connection.cursor()
-        if end_date:
-            cur.execute(
-                """
-                SELECT ticker_id, 
-                       strftime('%Y-%m-%d %H:00:00', datetime) AS hour,
-                       FIRST_VALUE(open) OVER (PARTITION BY strftime('%Y-%m-%d %H', datetime) ORDER BY datetime) AS open,
-                       MAX(high) AS high,
-                       MIN(low) AS low,
-                       LAST_VALUE(close) OVER (PARTITION BY strftime('%Y-%m-%d %H', datetime) ORDER BY datetime ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS close,
-                       SUM(volume) AS volume
-                FROM historical_prices
-                WHERE ticker_id = ? AND datetime BETWEEN ? AND ?
-                GROUP BY hour
-                ORDER BY hour
-                """,
-                (ticker_id, start_date, end_date)
-            )
-        else:
-            cur.execute(
-                """
-                SELECT ticker_id, 
-                       strftime('%Y-%m-%d %H:00:00', datetime) AS hour,
-                       FIRST_VALUE(open) OVER (PARTITION BY strftime('%Y-%m-%d %H', datetime) ORDER BY datetime) AS open,
-                       MAX(high) AS high,
-                       MIN(low) AS low,
-                       LAST_VALUE(close) OVER (PARTITION BY strftime('%Y-%m-%d %H', datetime) ORDER BY datetime ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS close,
-                       SUM(volume) AS volume
-                FROM historical_prices
-                WHERE ticker_id = ? AND datetime >= ?
-                GROUP BY hour
-                ORDER BY hour
-                """,
-                (ticker_id, start_date)
-            )
-        return cur.fetchall()
+        return self.fetch_rollup(ticker_id, resolutions["1 Hour"], start_date, end_date, output=output, adjusted=adjusted)
 
-    def fetch_five_minute(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None) -> List[Tuple[Any, ...]]:
+    def fetch_five_minute(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
         """
         Return all columns for a given ticker_id and datetime range with 5-minute period.
         If end_date is None, return all data from start_date onwards.
+        See `_read` for the `output` modes.
         """
-        cur = self.connection.cursor()
-        if end_date:
-            cur.execute(
-                """
-                SELECT ticker_id, 
-                       strftime('%Y-%m-%d %H:%M:00', datetime, '-' || (strftime('%M', datetime) % 5) || ' minutes') AS five_minute,
-                       FIRST_VALUE(open) OVER (PARTITION BY strftime('%Y-%m-%d %H:%M', datetime, '-' || (strftime('%M', datetime) % 5) || ' minutes') ORDER BY datetime) AS open,
-                       MAX(high) AS high,
-                       MIN(low) AS low,
-                       LAST_VALUE(close) OVER (PARTITION BY strftime('%Y-%m-%d %H:%M', datetime, '-' || (strftime('%M', datetime) % 5) || ' minutes') ORDER BY datetime ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS close,
-                       SUM(volume) AS volume
-                FROM historical_prices
-                WHERE ticker_id = ? AND datetime BETWEEN ? AND ?
-                GROUP BY five_minute
-                ORDER BY five_minute
-                """,
-                (ticker_id, start_date, end_date)
-            )
-        else:
-            cur.execute(
-                """
-                SELECT ticker_id, 
-                       strftime('%Y-%m-%d %H:%M:00', datetime, '-' || (strftime('%M', datetime) % 5) || ' minutes') AS five_minute,
-                       FIRST_VALUE(open) OVER (PARTITION BY strftime('%Y-%m-%d %H:%M', datetime, '-' || (strftime('%M', datetime) % 5) || ' minutes') ORDER BY datetime) AS open,
-                       MAX(high) AS high,
-                       MIN(low) AS low,
-                       LAST_VALUE(close) OVER (PARTITION BY strftime('%Y-%m-%d %H:%M', datetime, '-' || (strftime('%M', datetime) % 5) || ' minutes') ORDER BY datetime ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS close,
-                       SUM(volume) AS volume
-                FROM historical_prices
-                WHERE ticker_id = ? AND datetime >= ?
-                GROUP BY five_minute
-                ORDER BY five_minute
-                """,
-                (ticker_id, start_date)
-            )
-        return cur.fetchall()
+        return self.fetch_rollup(ticker_id, resolutions["5 Minutes"], start_date, end_date, output=output, adjusted=adjusted)
 
-    def get_info(self, ticker_id: int, period: Literal["5 Minutes", "1 Hour", "1 Day"], start_date: datetime, end_date: datetime | None = None) -> List[Tuple[Any, ...]]:
+    def fetch_rollup(self, ticker_id: int, resolution: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
+        """
+        Return (ticker_id, datetime, open, high, low, close, volume) bars of the given
+        rollup resolution (seconds) as a primary-key range read on `price_rollups`.
+        Bars are stamped with their UTC bucket start.
+        """
+        if resolution not in resolutions.values():
+            raise ValueError("Invalid resolution")
+        where, params = self._range(ticker_id, start_date, end_date)
+        return self._read_tiered(
+            f"""
+            SELECT ticker_id, datetime, open, high, low, close, volume
+            FROM price_rollups
+            WHERE resolution = ? AND {where}
+            ORDER BY datetime
+            """,
+            (resolution, *params), output, (ticker_id, resolution, start_date, end_date), adjusted=adjusted,
+        )
+
+    def get_info(self, ticker_id: int, period: Literal["5 Minutes", "1 Hour", "1 Day"], start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
         """
         Return all columns for a given ticker_id and datetime range with a specified period.
         If end_date is None, return all data from start_date onwards.
+        See `_read` for the `output` modes.
         """
         if period not in periods:
             raise ValueError("Period required")
 
         match period:
             case "1 Day":
-                return self.fetch_daily(ticker_id, start_date, end_date)
+                return self.fetch_daily(ticker_id, start_date, end_date, output=output, adjusted=adjusted)
             case "1 Hour":
-                return self.fetch_hourly(ticker_id, start_date, end_date)
+                return self.fetch_hourly(ticker_id, start_date, end_date, output=output, adjusted=adjusted)
             case "5 Minutes":
-                return self.fetch_five_minute(ticker_id, start_date, end_date)
+                return self.fetch_five_minute(ticker_id, start_date, end_date, output=output, adjusted=adjusted)
             case _:
                 raise ValueError("Invalid period")
 
+    def fetch_raw(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
+        """
+        Return the stored base bars for a given ticker_id and datetime range, as written.
+        If end_date is None, return all data from start_date onwards.
+        See `_read` for the `output` modes.
+        """
+        where, params = self._range(ticker_id, start_date, end_date)
+        return self._read_tiered(
+            f"SELECT * FROM historical_prices WHERE {where} ORDER BY datetime",
+            params, output, (ticker_id, RAW, start_date, end_date), adjusted=adjusted,
+        )
+
+    def resample(self, ticker_id: int, interval: str, start_date: datetime, end_date: datetime | None = None, *, session_only: bool = False, output: Output = "numpy", adjusted: bool = False) -> Any:
+        """
+        Return bars for any interval ("1m", "15m", "30m", "4h", "1d", "1w", "1mo", ...)
+        built with the vectorized resampler, bucketed on the ticker's exchange session.
+        Reads the coarsest rollup that lines up with the requested buckets, else raw bars.
+        If end_date is None, return all data from start_date onwards.
+        """
+        from .resample import resample
+        session = self.get_session(ticker_id)
+        resolution = self._resample_source(interval, session, start_date, end_date, session_only)
+        if resolution is None:
+            bars = self.fetch_raw(ticker_id, start_date, end_date, output="numpy", adjusted=adjusted)
+        else:
+            bars = self.fetch_rollup(ticker_id, resolution, start_date, end_date, output="numpy", adjusted=adjusted)
+        return self._columnar(resample(bars, interval, session, session_only=session_only), output, ticker_id)
+
+    def get_session(self, ticker_id: int) -> TradingSession:
+        """Return the trading session of the exchange a ticker is listed on."""
+        cur = self.connection.cursor()
+        cur.execute(
+            """
+            SELECT e.exchange_name, e.timezone
+            FROM tickers AS t JOIN exchanges AS e ON e.exchange_id = t.exchange_id
+            WHERE t.ticker_id = ?
+            """,
+            (ticker_id,),
+        )
+        row = cur.fetchone()
+        return session_for(*row) if row else session_for(None, None)
+
+    @staticmethod
+    def _resample_source(interval: str, session: TradingSession, start_date: datetime, end_date: datetime | None, session_only: bool) -> int | None:
+        """
+        Coarsest rollup resolution whose buckets nest inside the requested ones,
+        given the session's UTC offsets over the range, or None to use raw bars.
+        """
+        from .resample import parse_interval, local_offsets
+        _, width, kind = parse_interval(interval)
+        span = width if kind == "intraday" else 86400
+        ends = np.array([_epoch(start_date), _epoch(end_date if end_date is not None else pd.Timestamp.now(tz="UTC"))])
+        offsets = local_offsets(ends, session.timezone)
+        edges = [offsets + session.open_seconds] if kind == "intraday" else [offsets]
+        if session_only:
+            edges += [offsets + session.open_seconds, offsets + session.close_seconds]
+        for resolution in sorted(resolutions.values(), reverse=True):
+            if span % resolution == 0 and all(np.all(edge % resolution == 0) for edge in edges):
+                return resolution
+        return None
+
     # Use fetch info and cut to get close prices rather than all info
-    def get_close_prices(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None) -> List[Tuple[str, float]]:
+    def get_close_prices(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
         """
         Return list of (datetime, close) tuples for a given ticker_id and date range.
         If end_date is None, return all data from start_date onwards.
+        See `_read` for the `output` modes.
         """
-        cur = self.connection.cursor()
+        where, params = self._range(ticker_id, start_date, end_date)
+        return self._read_tiered(
+            f"SELECT datetime, close FROM historical_prices WHERE {where} ORDER BY datetime",
+            params, output, (ticker_id, RAW, start_date, end_date), dtype=CLOSE_DTYPE, adjusted=adjusted,
+        )
+
+    def _range(self, ticker_id: int, start_date: datetime, end_date: datetime | None) -> Tuple[str, Tuple[Any, ...]]:
+        """WHERE clause and params for a ticker's datetime range (open-ended if end_date is None)."""
         if end_date:
-            cur.execute(
-                "SELECT datetime, close FROM historical_prices WHERE ticker_id = ? AND datetime BETWEEN ? AND ? ORDER BY datetime",
-                (ticker_id, start_date, end_date)
-            )
-        else:
-            cur.execute(
-                "SELECT datetime, close FROM historical_prices WHERE ticker_id = ? AND datetime >= ? ORDER BY datetime",
-                (ticker_id, start_date)
+            return "ticker_id = ? AND datetime BETWEEN ? AND ?", (ticker_id, self._param(start_date), self._param(end_date))
+        return "ticker_id = ? AND datetime >= ?", (ticker_id, self._param(start_date))
+
+    def _read(self, query: str, params: Tuple[Any, ...], output: Output, *, dtype: np.dtype = BAR_DTYPE) -> Any:
+        """
+        Run a price query in the requested output mode:
+            "rows"   -> list of tuples exactly as stored (datetime text or epoch, per layout)
+            "numpy"  -> structured array of `dtype`, datetime as int64 UTC epoch seconds
+            "pandas" -> DataFrame of the remaining float64 columns on a UTC DatetimeIndex
+
+        Columnar modes select the epoch in SQL and stream the cursor straight into
+        np.fromiter, so no intermediate list of rows or parsed timestamps is built.
+        """
+        cur = self.connection.cursor()
+        if output == "rows":
+            cur.execute(query, params)
+            return cur.fetchall()
+        if output not in ("numpy", "pandas"):
+            raise ValueError("output must be 'rows', 'numpy' or 'pandas'")
+
+        columns = ", ".join(dtype.names[1:])
+        cur.execute(
+            f"SELECT {self._epoch_sql()}, {columns} FROM ({query}) ORDER BY datetime",
+            params,
+        )
+        return self._columnar(np.fromiter(cur, dtype=dtype), output)
+
+    def _read_tiered(self, query: str, params: Tuple[Any, ...], output: Output, partition: Tuple[int, int | str, datetime, datetime | None], *, dtype: np.dtype = BAR_DTYPE, adjusted: bool = False) -> Any:
+        """
+        `_read`, merged with the cold tier's bars for partition (ticker_id, resolution, start, end)
+        when a ColdStore is attached and holds any in the range, and adjusted for the ticker's
+        corporate actions if asked.
+        """
+        if adjusted:
+            bars = self._read_tiered(query, params, "numpy", partition, dtype=dtype)
+            return self._adjusted(bars, partition[0], output, dtype)
+        if self.cold is None:
+            return self._read(query, params, output, dtype=dtype)
+        ticker_id, resolution, start_date, end_date = partition
+        cold = self.cold.read(ticker_id, resolution, _epoch(start_date), _epoch(end_date) if end_date else None, dtype)
+        if not len(cold):
+            return self._read(query, params, output, dtype=dtype)
+        hot = self._read(query, params, "numpy", dtype=dtype)
+        return self._columnar(merge_bars(cold, hot), output, ticker_id if dtype is BAR_DTYPE else None)
+
+    def _columnar(self, array: np.ndarray, output: Output, ticker_id: int | None = None) -> Any:
+        """
+        Return an epoch-stamped structured array in the requested output mode
+        ("rows" tuples start with ticker_id when one is given).
+        """
+        if output == "numpy":
+            return array
+        if output == "pandas":
+            index = pd.DatetimeIndex(pd.to_datetime(array["datetime"], unit="s", utc=True), name="datetime")
+            return pd.DataFrame({name: array[name] for name in array.dtype.names[1:]}, index=index)
+        if output == "rows":
+            stamps = self._stamps(array["datetime"].astype("datetime64[s]"))
+            columns = [array[name].tolist() for name in array.dtype.names[1:]]
+            if ticker_id is None:
+                return list(zip(stamps, *columns))
+            return list(zip(repeat(ticker_id), stamps, *columns))
+        raise ValueError("output must be 'rows', 'numpy' or 'pandas'")
+
+    # ---------- ADJUSTMENT ----------
+
+    def adjustment_factors(self, ticker_id: int) -> AdjustmentFactors:
+        """
+        Cumulative split/dividend factors of a ticker (see CorporateActionsRepository),
+        with dividend factors taken from the daily closes before each ex-date.
+        """
+        from .corporate_actions import CorporateActionsRepository
+        actions = registry_for(self.connection).repo(CorporateActionsRepository)
+        return actions.adjustment_factors(ticker_id, lambda ex: self._closes_before(ticker_id, ex))
+
+    def _adjusted(self, bars: np.ndarray, ticker_id: int, output: Output, dtype: np.dtype) -> Any:
+        """Bars multiplied by the ticker's adjustment factors, in the requested output mode."""
+        return self._columnar(self.adjustment_factors(ticker_id).apply(bars), output, ticker_id if dtype is BAR_DTYPE else None)
+
+    def _closes_before(self, ticker_id: int, ex: np.ndarray) -> np.ndarray:
+        """
+        Last daily close in the two weeks before each ex-date epoch (NaN if there is none),
+        for every ex-date in one query; the cold tier fills in the ones moved out of it.
+        """
+        resolution = resolutions["1 Day"]
+        bounds = [[self._stored(epoch - CLOSE_LOOKBACK), self._stored(epoch - 1)] for epoch in ex.tolist()]
+        cur = self.connection.cursor()
+        cur.execute(
+            """
+            SELECT json_each.key, r.close
+            FROM json_each(?)
+            JOIN price_rollups r ON r.ticker_id = ? AND r.resolution = ? AND r.datetime = (
+                SELECT MAX(datetime) FROM price_rollups
+                WHERE ticker_id = ? AND resolution = ?
+                  AND datetime BETWEEN json_extract(json_each.value, '$[0]') AND json_extract(json_each.value, '$[1]')
             )
-        return cur.fetchall()
+            """,
+            (json.dumps(bounds), ticker_id, resolution, ticker_id, resolution),
+        )
+        closes = np.full(len(ex), np.nan)
+        for i, close in cur.fetchall():
+            closes[i] = np.nan if close is None else close
+        missing = np.isnan(closes)
+        if self.cold is not None and missing.any():
+            cold = self.cold.read(ticker_id, resolution, int(ex[missing].min()) - CLOSE_LOOKBACK, int(ex[missing].max()) - 1, BAR_DTYPE)
+            closes[missing] = _last_close_before(cold, ex[missing])
+        return closes
 
     # ---------- CREATE ----------
 
@@ -208,9 +592,96 @@ class HistoricalPricesRepository:
         cur = self.connection.cursor()
         cur.execute(
             "INSERT INTO historical_prices (ticker_id, datetime, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (ticker_id, datetime, open, high, low, close, volume)
+            (ticker_id, self._param(datetime), open, high, low, close, volume)
         )
-        return cur.lastrowid
+        rowid = cur.lastrowid
+        self.refresh_rollups(ticker_id, datetime, datetime)
+        return rowid
+
+    def create_many(self, ticker_id: int, bars: Any, *, chunk_size: int | None = None, resolution: int | None = None, covered: Tuple[datetime, datetime] | None = None) -> int:
+        """
+        Bulk insert bars for a ticker, skipping any (ticker_id, datetime) that already exists.
+        `bars` is anything accepted by `bar_arrays` (DataFrame, arrays, iterator of bars).
+        Writes go through executemany, one transaction per chunk.
+        The write is recorded in the coverage index, see `_cover`.
+        Returns number of rows inserted.
+        """
+        arrays = bar_arrays(bars)
+        inserted = 0
+        for rows, stamps in self._bar_chunks(ticker_id, arrays, chunk_size):
+            cur = self.connection.cursor()
+            cur.executemany(
+                """
+                INSERT INTO historical_prices (ticker_id, datetime, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ticker_id, datetime) DO NOTHING
+                """,
+                rows,
+            )
+            inserted += cur.rowcount
+            self.refresh_rollups(ticker_id, min(stamps), max(stamps))
+            self.connection.commit()
+        self._cover(ticker_id, arrays["datetime"], resolution, covered)
+        return inserted
+
+    def upsert_many(self, ticker_id: int, bars: Any, *, chunk_size: int | None = None, resolution: int | None = None, covered: Tuple[datetime, datetime] | None = None) -> Tuple[int, int]:
+        """
+        Bulk insert bars for a ticker, overwriting existing (ticker_id, datetime) rows.
+        `bars` is anything accepted by `bar_arrays` (DataFrame, arrays, iterator of bars).
+        Writes go through executemany, one transaction per chunk.
+        The write is recorded in the coverage index, see `_cover`.
+        Returns (inserted, updated) row counts.
+        """
+        arrays = bar_arrays(bars)
+        inserted = updated = 0
+        for rows, stamps in self._bar_chunks(ticker_id, arrays, chunk_size):
+            cur = self.connection.cursor()
+            # Keys of the chunk already stored: one primary key probe each, not a range scan
+            cur.execute(
+                "SELECT COUNT(*) FROM historical_prices WHERE ticker_id = ? AND datetime IN (SELECT value FROM json_each(?))",
+                (ticker_id, json.dumps(stamps)),
+            )
+            existing = cur.fetchone()[0]
+            cur.executemany(
+                """
+                INSERT INTO historical_prices (ticker_id, datetime, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ticker_id, datetime) DO UPDATE SET
+                    open = excluded.open,
+                    high = excluded.high,
+                    low = excluded.low,
+                    close = excluded.close,
+                    volume = excluded.volume
+                """,
+                rows,
+            )
+            added = len(set(stamps)) - existing
+            inserted += added
+            updated += cur.rowcount - added
+            self.refresh_rollups(ticker_id, min(stamps), max(stamps))
+            self.connection.commit()
+        self._cover(ticker_id, arrays["datetime"], resolution, covered)
+        return inserted, updated
+
+    def _bar_chunks(self, ticker_id: int, arrays: Dict[str, np.ndarray], chunk_size: int | None):
+        """Yield (rows, stored datetimes) per chunk of bars normalised by `bar_arrays`."""
+        if ticker_id is None:
+            raise ValueError("ticker_id must be provided")
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        n = len(arrays["datetime"])
+        for start in range(0, n, chunk_size):
+            part = {name: values[start:start + chunk_size] for name, values in arrays.items()}
+            stamps = self._stamps(part["datetime"])
+            rows = zip(
+                repeat(ticker_id),
+                stamps,
+                _nullable(part["open"]),
+                _nullable(part["high"]),
+                _nullable(part["low"]),
+                part["close"].tolist(),
+                _nullable(part["volume"], int),
+            )
+            yield rows, stamps
 
     # Wonder how i can implement this for historical prices?
     '''
@@ -245,10 +716,13 @@ class HistoricalPricesRepository:
             SET open = ?, high = ?, low = ?, close = ?, volume = ?
             WHERE ticker_id = ? AND datetime = ?
             """,
-            (open, high, low, close, volume, ticker_id, datetime)
+            (open, high, low, close, volume, ticker_id, self._param(datetime))
         )
+        updated = cur.rowcount
+        if updated:
+            self.refresh_rollups(ticker_id, datetime, datetime)
         self.connection.commit()
-        return cur.rowcount
+        return updated
 
     # ---------- DELETE ----------
 
@@ -262,8 +736,14 @@ class HistoricalPricesRepository:
             "DELETE FROM historical_prices WHERE ticker_id = ?",
             (ticker_id,)
         )
+        deleted = cur.rowcount
+        cur.execute("DELETE FROM price_rollups WHERE ticker_id = ?", (ticker_id,))
+        self._forget_compaction(cur, ticker_id)
+        self._uncover(ticker_id)
         self.connection.commit()
-        return cur.rowcount
+        if self.cold is not None:
+            self.cold.drop(ticker_id)
+        return deleted
     
     def delete_days(self, ticker_id: int, start_date: datetime, end_date: datetime) -> int:
         """
@@ -273,10 +753,15 @@ class HistoricalPricesRepository:
         cur = self.connection.cursor()
         cur.execute(
             "DELETE FROM historical_prices WHERE ticker_id = ? AND datetime BETWEEN ? AND ?",
-            (ticker_id, start_date, end_date)
+            (ticker_id, self._param(start_date), self._param(end_date))
         )
+        deleted = cur.rowcount
+        self.refresh_rollups(ticker_id, start_date, end_date)
+        self._uncover(ticker_id, _epoch(start_date), _epoch(end_date) + 1)
         self.connection.commit()
-        return cur.rowcount
+        if self.cold is not None:
+            deleted += self.cold.delete_range(ticker_id, _epoch(start_date), _epoch(end_date))
+        return deleted
 
     def delete_all(self) -> int:
         """
@@ -285,5 +770,444 @@ class HistoricalPricesRepository:
         """
         cur = self.connection.cursor()
         cur.execute("DELETE FROM historical_prices")
+        deleted = cur.rowcount
+        cur.execute("DELETE FROM price_rollups")
+        self._forget_compaction(cur)
+        self._uncover()
+        self.connection.commit()
+        if self.cold is not None:
+            self.cold.drop()
+        return deleted
+
+    # ---------- ROLLUPS ----------
+
+    def refresh_rollups(self, ticker_id: int, start_date: datetime, end_date: datetime) -> None:
+        """
+        Recompute every rollup bucket overlapping [start_date, end_date] for a ticker.
+        Called by every write so `price_rollups` always matches `historical_prices`;
+        only the touched buckets are re-aggregated, each level from the one below it.
+        Buckets whose source was deleted by enforce_retention are left as they are.
+        Does not commit, the calling write does.
+        """
+        first, last = _epoch(start_date), _epoch(end_date)
+        compacted = self._compacted(ticker_id)
+        cur = self.connection.cursor()
+        source, source_filter = "historical_prices", ""
+        stored = (lambda epoch: epoch) if self.layout == "epoch" else datetime_text
+        for resolution in sorted(resolutions.values()):
+            # Watermarks are whole UTC days, so this stays on a bucket boundary
+            lower = max(first // resolution * resolution, compacted.get(ROLLUP_SOURCE[resolution], 0))
+            upper = last // resolution * resolution + resolution - 1
+            if lower <= upper:
+                self._aggregate(cur, ticker_id, resolution, stored(lower), stored(upper), source, source_filter)
+            source, source_filter = "price_rollups", f"resolution = {resolution} AND "
+
+    def _aggregate(self, cur: sql.Cursor, ticker_id: int, resolution: int, bucket_start: Any, bucket_end: Any, source: str, source_filter: str) -> None:
+        """Replace a ticker's rollup buckets of one resolution in a range with aggregates of `source`."""
+        bucket = f"{self._epoch_sql()} / {resolution} * {resolution}"
+        if self.layout == "text":
+            bucket = f"datetime({bucket}, 'unixepoch')"
+        cur.execute(
+            "DELETE FROM price_rollups WHERE resolution = ? AND ticker_id = ? AND datetime BETWEEN ? AND ?",
+            (resolution, ticker_id, bucket_start, bucket_end),
+        )
+        cur.execute(
+            f"""
+            INSERT INTO price_rollups (ticker_id, resolution, datetime, open, high, low, close, volume)
+            SELECT g.ticker_id, {resolution}, g.bucket, o.open, g.high, g.low, c.close, g.volume
+            FROM (
+                SELECT ticker_id,
+                       {bucket} AS bucket,
+                       MIN(datetime) AS first_dt,
+                       MAX(datetime) AS last_dt,
+                       MAX(high) AS high,
+                       MIN(low) AS low,
+                       SUM(volume) AS volume
+                FROM {source}
+                WHERE {source_filter}ticker_id = ? AND datetime BETWEEN ? AND ?
+                GROUP BY bucket
+            ) AS g
+            JOIN {source} AS o ON {source_filter.replace("resolution", "o.resolution")}o.ticker_id = g.ticker_id AND o.datetime = g.first_dt
+            JOIN {source} AS c ON {source_filter.replace("resolution", "c.resolution")}c.ticker_id = g.ticker_id AND c.datetime = g.last_dt
+            """,
+            (ticker_id, bucket_start, bucket_end),
+        )
+
+    def rebuild_rollups(self, ticker_id: int | None = None) -> None:
+        """
+        Rebuild all rollups from scratch for one ticker, or for every ticker if None.
+        Only needed once for databases populated before rollups existed.
+        """
+        cur = self.connection.cursor()
+        if ticker_id is None:
+            cur.execute("SELECT ticker_id, MIN(datetime), MAX(datetime) FROM historical_prices GROUP BY ticker_id")
+        else:
+            cur.execute(
+                "SELECT ticker_id, MIN(datetime), MAX(datetime) FROM historical_prices WHERE ticker_id = ? GROUP BY ticker_id",
+                (ticker_id,),
+            )
+        for tid, first, last in cur.fetchall():
+            self.refresh_rollups(tid, first, last)
+            self.connection.commit()
+
+    # ---------- COLD STORAGE ----------
+
+    def attach_cold_store(self, store: ColdStore | None) -> None:
+        """Attach (or detach with None) the Parquet cold tier merged into reads."""
+        self.cold = store
+
+    def tier_to_cold(self, horizon: timedelta | None = None, *, ticker_id: int | None = None) -> int:
+        """
+        Move bars older than `horizon` (default: the store's) from SQLite into the cold tier,
+        base bars and every rollup resolution alike, then delete them from SQLite.
+
+        The cutoff is rounded down to a UTC midnight so no rollup bucket is split between
+        tiers. Each ticker is exported before its rows are deleted and committed on its own;
+        if interrupted, the bars left in both tiers are deduplicated on read (hot wins).
+        Bars later written into an already tiered range stay hot and override the cold ones,
+        but rollups for those buckets only see the hot bars.
+        Returns number of base bars moved.
+        """
+        store = self.cold
+        if store is None:
+            raise ValueError("No cold store attached")
+        horizon = store.horizon if horizon is None else horizon
+        now = _epoch(pd.Timestamp.now(tz="UTC"))
+        cutoff = (now - int(horizon.total_seconds())) // 86400 * 86400
+        bound = cutoff if self.layout == "epoch" else datetime_text(cutoff)
+
+        cur = self.connection.cursor()
+        if ticker_id is None:
+            cur.execute("SELECT DISTINCT ticker_id FROM historical_prices WHERE datetime < ?", (bound,))
+        else:
+            cur.execute("SELECT DISTINCT ticker_id FROM historical_prices WHERE ticker_id = ? AND datetime < ?", (ticker_id, bound))
+        moved = 0
+        for (tid,) in cur.fetchall():
+            raw = self._read("SELECT * FROM historical_prices WHERE ticker_id = ? AND datetime < ? ORDER BY datetime", (tid, bound), "numpy")
+            store.write(tid, RAW, raw)
+            for resolution in resolutions.values():
+                rollups = self._read(
+                    "SELECT ticker_id, datetime, open, high, low, close, volume FROM price_rollups WHERE resolution = ? AND ticker_id = ? AND datetime < ? ORDER BY datetime",
+                    (resolution, tid, bound), "numpy",
+                )
+                store.write(tid, resolution, rollups)
+            cur.execute("DELETE FROM historical_prices WHERE ticker_id = ? AND datetime < ?", (tid, bound))
+            cur.execute("DELETE FROM price_rollups WHERE ticker_id = ? AND datetime < ?", (tid, bound))
+            self.connection.commit()
+            moved += len(raw)
+        return moved
+
+    # ---------- COVERAGE ----------
+
+    def missing_ranges(self, ticker_id: int, resolution: int, start_date: datetime, end_date: datetime | None = None) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        UTC [start, end) ranges of open sessions of the ticker's exchange in [start_date,
+        end_date) (default: now) with no bars stored at `resolution` seconds or finer.
+        Gaps separated only by closed market time are returned as one range, so each is
+        one vendor request. Ranges compacted by retention count as missing at the
+        resolutions whose bars it deleted.
+        """
+        end_date = end_date if end_date is not None else pd.Timestamp.now(tz="UTC")
+        floor = None
+        if resolution < resolutions["1 Day"]:
+            floor = self._compacted(ticker_id).get(BASE if resolution < resolutions["1 Hour"] else HOURLY)
+        try:
+            gaps = self.coverage.missing(ticker_id, resolution, _epoch(start_date), _epoch(end_date), self.get_session(ticker_id), floor=floor)
+        except sql.OperationalError:
+            # Databases created before price_coverage existed (run create_db to add it)
+            gaps = [(_epoch(start_date), _epoch(end_date))]
+        return [(pd.Timestamp(first, unit="s", tz="UTC"), pd.Timestamp(last, unit="s", tz="UTC")) for first, last in gaps]
+
+    def _cover(self, ticker_id: int, stamps: np.ndarray, resolution: int | None, covered: Tuple[datetime, datetime] | None) -> None:
+        """
+        Record a write in the coverage index: the `covered` [start, end) window the bars were
+        requested for, else first bar to last bar + resolution. The resolution defaults
+        to the smallest step between the bars; a write it cannot be told for is not recorded.
+        """
+        stamps = stamps.astype("datetime64[s]").astype("int64")
+        resolution = resolution or infer_resolution(stamps)
+        if resolution is None:
+            return
+        if covered is not None:
+            start, end = _epoch(covered[0]), _epoch(covered[1])
+        elif len(stamps):
+            start, end = int(stamps.min()), int(stamps.max()) + resolution
+        else:
+            return
+        try:
+            self.coverage.add(ticker_id, resolution, start, end, self.get_session(ticker_id))
+        except sql.OperationalError:
+            return
+        self.connection.commit()
+
+    def _uncover(self, ticker_id: int | None = None, start: int | None = None, end: int | None = None) -> None:
+        """Drop deleted bars from the coverage index (on the caller's transaction)."""
+        try:
+            self.coverage.remove(ticker_id, start, end)
+        except sql.OperationalError:
+            pass
+
+    # ---------- RETENTION ----------
+
+    RETENTION_JOB = "price_retention"
+
+    def enforce_retention(self, policy: RetentionPolicy | None = None, *, now: datetime | None = None, max_chunks: int | None = None) -> RetentionReport:
+        """
+        Downsample and delete aged intraday bars so the database stays bounded in size.
+
+        Per ticker, in chunks of about policy.chunk_size bars (whole UTC days), base bars older
+        than policy.raw are re-aggregated into the hourly and daily rollups and then deleted
+        with their 5-minute rollups; hourly rollups older than policy.hourly are re-aggregated
+        into daily ones and deleted the same way. Each chunk commits on its own and moves the
+        ticker's watermark in `price_retention` (rollups are never rebuilt from below it), then
+        returns up to policy.vacuum_pages free pages to the OS with PRAGMA incremental_vacuum.
+
+        The cutoffs are fixed when a run starts and kept in `maintenance_state` until it
+        finishes, so a run that is interrupted (or stops after max_chunks chunks) resumes
+        with the same cutoffs on the next call. Databases created without incremental
+        auto_vacuum reuse the freed pages for new rows instead (see enable_incremental_vacuum).
+        """
+        policy = policy or RetentionPolicy()
+        cur = self.connection.cursor()
+        cur.execute(price_schema(self.layout)[2])
+        cur.execute("CREATE TABLE IF NOT EXISTS maintenance_state (job TEXT PRIMARY KEY, state TEXT)")
+        cur.execute("SELECT state FROM maintenance_state WHERE job = ?", (self.RETENTION_JOB,))
+        row = cur.fetchone()
+        if row:
+            cutoffs = json.loads(row[0])
+        else:
+            today = _epoch(pd.Timestamp.now(tz="UTC") if now is None else now)
+            cutoff = lambda age: None if age is None else (today - int(age.total_seconds())) // 86400 * 86400
+            cutoffs = {"base": cutoff(policy.raw), "hourly": cutoff(policy.hourly)}
+            cur.execute("INSERT OR REPLACE INTO maintenance_state (job, state) VALUES (?, ?)", (self.RETENTION_JOB, json.dumps(cutoffs)))
+        self.connection.commit()
+
+        report = RetentionReport()
+        chunks = 0
+        for level, cutoff in ((BASE, cutoffs["base"]), (HOURLY, cutoffs["hourly"])):
+            if cutoff is None:
+                continue
+            for ticker_id in self._tickers_before(level, cutoff):
+                done = False
+                while not done:
+                    if max_chunks is not None and chunks >= max_chunks:
+                        report.complete = False
+                        return report
+                    done = self._compact(ticker_id, level, cutoff, policy.chunk_size, report)
+                    chunks += 1
+                    report.vacuumed_pages += self._incremental_vacuum(policy.vacuum_pages)
+        cur.execute("DELETE FROM maintenance_state WHERE job = ?", (self.RETENTION_JOB,))
+        self.connection.commit()
+        report.vacuumed_pages += self._incremental_vacuum()
+        return report
+
+    def _level_table(self, level: int) -> Tuple[str, str]:
+        """Table and filter holding a retention level's bars."""
+        if level == BASE:
+            return "historical_prices", ""
+        return "price_rollups", f"resolution = {level} AND "
+
+    def _tickers_before(self, level: int, cutoff: int) -> List[int]:
+        """Tickers with bars of a retention level older than cutoff (one index probe each)."""
+        table, where = self._level_table(level)
+        cur = self.connection.cursor()
+        cur.execute(
+            f"SELECT ticker_id FROM tickers t WHERE EXISTS (SELECT 1 FROM {table} WHERE {where}ticker_id = t.ticker_id AND datetime < ?)",
+            (self._stored(cutoff),),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+    def _compact(self, ticker_id: int, level: int, cutoff: int, chunk_size: int, report: RetentionReport) -> bool:
+        """
+        Downsample and delete the oldest chunk of a ticker's bars of one level below cutoff.
+        Returns True once nothing of that level is left below cutoff.
+        """
+        table, where = self._level_table(level)
+        cur = self.connection.cursor()
+        cur.execute(f"SELECT MIN(datetime) FROM {table} WHERE {where}ticker_id = ? AND datetime < ?", (ticker_id, self._stored(cutoff)))
+        first = cur.fetchone()[0]
+        if first is None:
+            return True
+        cur.execute(
+            f"SELECT datetime FROM {table} WHERE {where}ticker_id = ? AND datetime < ? ORDER BY datetime LIMIT 1 OFFSET ?",
+            (ticker_id, self._stored(cutoff), chunk_size - 1),
+        )
+        row = cur.fetchone()
+        upper = cutoff if row is None else min(_epoch(row[0]) // 86400 * 86400 + 86400, cutoff)
+        start = _epoch(first) // 86400 * 86400
+        stored = self._stored
+        if level == BASE:
+            # Hourly and daily buckets of the chunk from its base bars, before they go
+            self.refresh_rollups(ticker_id, start, upper - 1)
+            cur.execute("DELETE FROM historical_prices WHERE ticker_id = ? AND datetime < ?", (ticker_id, stored(upper)))
+            report.bars += cur.rowcount
+            cur.execute("DELETE FROM price_rollups WHERE resolution = 300 AND ticker_id = ? AND datetime < ?", (ticker_id, stored(upper)))
+            report.five_minute += cur.rowcount
+        else:
+            self._aggregate(cur, ticker_id, 86400, stored(start), stored(upper - 1), "price_rollups", f"resolution = {HOURLY} AND ")
+            cur.execute("DELETE FROM price_rollups WHERE resolution = ? AND ticker_id = ? AND datetime < ?", (HOURLY, ticker_id, stored(upper)))
+            report.hourly += cur.rowcount
+        cur.execute(
+            '''INSERT INTO price_retention (ticker_id, level, compacted_before) VALUES (?, ?, ?)
+               ON CONFLICT(ticker_id, level) DO UPDATE SET compacted_before = MAX(compacted_before, excluded.compacted_before)''',
+            (ticker_id, level, upper),
+        )
+        self.connection.commit()
+        return upper >= cutoff
+
+    def _compacted(self, ticker_id: int) -> Dict[int, int]:
+        """Retention level -> epoch below which a ticker's bars of that level were deleted."""
+        cur = self.connection.cursor()
+        try:
+            cur.execute("SELECT level, compacted_before FROM price_retention WHERE ticker_id = ?", (ticker_id,))
+        except sql.OperationalError:
+            # Database created before retention existed
+            return {}
+        return dict(cur.fetchall())
+
+    def _forget_compaction(self, cur: sql.Cursor, ticker_id: int | None = None) -> None:
+        """Drop retention watermarks once a ticker's (or every) bar is deleted."""
+        try:
+            if ticker_id is None:
+                cur.execute("DELETE FROM price_retention")
+            else:
+                cur.execute("DELETE FROM price_retention WHERE ticker_id = ?", (ticker_id,))
+        except sql.OperationalError:
+            pass
+
+    def _incremental_vacuum(self, pages: int | None = None) -> int:
+        """Release up to `pages` (default: all) free pages; returns how many were released."""
+        if getattr(self.connection, "batching", False):
+            # executescript would commit the caller's transaction; a later run releases them
+            return 0
+        cur = self.connection.cursor()
+        cur.execute("PRAGMA auto_vacuum")
+        if cur.fetchone()[0] != 2:
+            return 0
+        cur.execute("PRAGMA freelist_count")
+        before = cur.fetchone()[0]
+        # Every step of the pragma frees one page and execute() only steps it once;
+        # executescript runs it to completion (0 frees the whole freelist)
+        self.connection.executescript(f"PRAGMA incremental_vacuum({int(pages or 0)});")
+        cur.execute("PRAGMA freelist_count")
+        return before - cur.fetchone()[0]
+
+    def enable_incremental_vacuum(self) -> None:
+        """
+        Switch an existing database to incremental auto_vacuum (new databases start with it).
+        Rewrites the whole file once with VACUUM.
+        """
+        self.connection.commit()
+        self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.connection.execute("VACUUM")
+
+    # ---------- MIGRATION ----------
+
+    MIGRATION_JOB = "historical_prices_epoch"
+
+    def migrate_to_epoch(self, batch_size: int = 50_000, *, vacuum: bool = False) -> int:
+        """
+        Convert a "text" layout database to the "epoch" layout in place, in batches.
+
+        Rows are copied into a WITHOUT ROWID table in primary-key order, committing
+        every `batch_size` rows, so other connections keep reading and writing between
+        batches; triggers mirror their writes into the new table meanwhile. Progress is
+        kept in `maintenance_state`, so an interrupted migration resumes where it stopped.
+        The swap (and the rollup conversion) happens in one final transaction.
+        Returns number of rows copied by the batches (0 if already migrated).
+        """
+        if self.detect_layout() == "epoch":
+            return 0
+        cur = self.connection.cursor()
+        for statement in price_schema("epoch", prices="historical_prices_epoch", rollups="price_rollups_epoch"):
+            cur.execute(statement)
+        cur.execute("CREATE TABLE IF NOT EXISTS maintenance_state (job TEXT PRIMARY KEY, state TEXT)")
+        as_epoch = "CAST(strftime('%s', {}.datetime) AS INTEGER)"
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS migrate_prices_insert AFTER INSERT ON historical_prices BEGIN
+                INSERT OR REPLACE INTO historical_prices_epoch (ticker_id, datetime, open, high, low, close, volume)
+                VALUES (NEW.ticker_id, {as_epoch.format("NEW")}, NEW.open, NEW.high, NEW.low, NEW.close, NEW.volume);
+            END
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS migrate_prices_update AFTER UPDATE ON historical_prices BEGIN
+                DELETE FROM historical_prices_epoch WHERE ticker_id = OLD.ticker_id AND datetime = {as_epoch.format("OLD")};
+                INSERT OR REPLACE INTO historical_prices_epoch (ticker_id, datetime, open, high, low, close, volume)
+                VALUES (NEW.ticker_id, {as_epoch.format("NEW")}, NEW.open, NEW.high, NEW.low, NEW.close, NEW.volume);
+            END
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS migrate_prices_delete AFTER DELETE ON historical_prices BEGIN
+                DELETE FROM historical_prices_epoch WHERE ticker_id = OLD.ticker_id AND datetime = {as_epoch.format("OLD")};
+            END
+            """
+        )
         self.connection.commit()
-        return cur.rowcount
\ No newline at end of file
+
+        cur.execute("SELECT state FROM maintenance_state WHERE job = ?", (self.MIGRATION_JOB,))
+        row = cur.fetchone()
+        state = json.loads(row[0]) if row else [-1, ""]
+        # "done": every batch was copied, a run stopped before the swap committed
+        position = None if state == ["done"] else tuple(state)
+        copied = 0
+        while position is not None:
+            cur.execute(
+                """
+                SELECT ticker_id, datetime FROM historical_prices
+                WHERE (ticker_id, datetime) > (?, ?)
+                ORDER BY ticker_id, datetime
+                LIMIT 1 OFFSET ?
+                """,
+                (*position, batch_size - 1),
+            )
+            upper = cur.fetchone()
+            bounds = "(ticker_id, datetime) > (?, ?)" + (" AND (ticker_id, datetime) <= (?, ?)" if upper else "")
+            cur.execute(
+                f"""
+                INSERT OR IGNORE INTO historical_prices_epoch (ticker_id, datetime, open, high, low, close, volume)
+                SELECT ticker_id, {as_epoch.format("historical_prices")}, open, high, low, close, volume
+                FROM historical_prices
+                WHERE {bounds}
+                ORDER BY ticker_id, datetime
+                """,
+                (*position, *(upper or ())),
+            )
+            copied += cur.rowcount
+            position = tuple(upper) if upper else None
+            cur.execute(
+                "INSERT OR REPLACE INTO maintenance_state (job, state) VALUES (?, ?)",
+                (self.MIGRATION_JOB, json.dumps(position if position else ["done"])),
+            )
+            self.connection.commit()
+
+        # One transaction, so an interrupted swap leaves the triggers and the state row in place
+        with self.connection.transaction():
+            cur.execute("DROP TRIGGER IF EXISTS migrate_prices_insert")
+            cur.execute("DROP TRIGGER IF EXISTS migrate_prices_update")
+            cur.execute("DROP TRIGGER IF EXISTS migrate_prices_delete")
+            cur.execute(
+                f"""
+                INSERT OR IGNORE INTO price_rollups_epoch (ticker_id, resolution, datetime, open, high, low, close, volume)
+                SELECT ticker_id, resolution, {as_epoch.format("price_rollups")}, open, high, low, close, volume
+                FROM price_rollups
+                """
+            )
+            cur.execute("DROP INDEX IF EXISTS idx_prices_ticker_time")
+            cur.execute("DROP TABLE historical_prices")
+            cur.execute("DROP TABLE price_rollups")
+            cur.execute("ALTER TABLE historical_prices_epoch RENAME TO historical_prices")
+            cur.execute("ALTER TABLE price_rollups_epoch RENAME TO price_rollups")
+            cur.execute("DELETE FROM maintenance_state WHERE job = ?", (self.MIGRATION_JOB,))
+        self.detect_layout()
+
+        if vacuum:
+            # Give the freed pages of the old table back to the filesystem, and switch to
+            # incremental auto_vacuum for enforce_retention while the file is rewritten
+            self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.connection.execute("VACUUM")
+        return copied
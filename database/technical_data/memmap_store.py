@@ -0,0 +1,367 @@
+from __future__ import annotations
+import os
+import shutil
+import sqlite3 as sql
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from .historical_prices import HistoricalPricesRepository, BAR_DTYPE, CLOSE_DTYPE, Output, RetentionPolicy, RetentionReport, CLOSE_LOOKBACK, bar_arrays, resolutions, _epoch, _last_close_before
+
+# On-disk column files: fixed-width little-endian, one value per bar
+COLUMN_TYPES = {"datetime": "<i8", "open": "<f8", "high": "<f8", "low": "<f8", "close": "<f8", "volume": "<f8"}
+
+RAW = "raw"
+
+
+class BarSeries:
+    """
+    One ticker/resolution of a MemmapBarStore: read-only np.memmap views of its column
+    files plus a sparse index (every BLOCK-th datetime, kept in memory) for range lookups.
+    """
+    BLOCK = 4096
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        sizes = [(folder / f"{name}.bin").stat().st_size // 8 for name in COLUMN_TYPES]
+        # A crash during an append can leave columns of different lengths; only whole bars count
+        self.length = min(sizes)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.memmap(folder / f"{name}.bin", dtype=dtype, mode="r", shape=(self.length,)) if self.length else np.empty(0, dtype=dtype)
+            for name, dtype in COLUMN_TYPES.items()
+        }
+        self.index = np.array(self.columns["datetime"][::self.BLOCK])
+
+    def bounds(self, start: int | None, end: int | None) -> Tuple[int, int]:
+        """Positions [lo, hi) of the bars with start <= datetime <= end."""
+        return self._position(start, "left") if start is not None else 0, self._position(end, "right") if end is not None else self.length
+
+    def _position(self, epoch: int, side: str) -> int:
+        # The sparse index narrows the search to one block, so only its pages are touched
+        block = max(int(np.searchsorted(self.index, epoch, side=side)) - 1, 0)
+        lo, hi = block * self.BLOCK, min((block + 1) * self.BLOCK, self.length)
+        stamps = self.columns["datetime"]
+        position = lo + int(np.searchsorted(stamps[lo:hi], epoch, side=side))
+        while position == hi and hi < self.length and (stamps[hi] < epoch or (side == "right" and stamps[hi] == epoch)):
+            lo, hi = hi, min(hi + self.BLOCK, self.length)
+            position = lo + int(np.searchsorted(stamps[lo:hi], epoch, side=side))
+        return position
+
+    def slice(self, start: int | None, end: int | None) -> Dict[str, np.ndarray]:
+        """Zero-copy column views of the bars in [start, end]."""
+        lo, hi = self.bounds(start, end)
+        return {name: column[lo:hi] for name, column in self.columns.items()}
+
+
+class MemmapBarStore:
+    """
+    Append-only binary column store for bars:
+
+        <root>/ticker_id=<id>/<resolution>/{datetime,open,high,low,close,volume}.bin
+
+    datetime is int64 UTC epoch seconds, the rest float64, in datetime order. Bars after
+    the last stored one are appended in place; anything else rewrites the series into new
+    files swapped in atomically, so open memmaps keep reading a consistent old copy.
+    Opened series are cached and reopened only when their files grow or are replaced.
+    """
+
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+        self._series: Dict[Tuple[int, str], Tuple[Tuple[int, int], BarSeries]] = {}
+        self._lock = threading.Lock()
+
+    def _folder(self, ticker_id: int, resolution: int | str = RAW) -> Path:
+        return self.root / f"ticker_id={int(ticker_id)}" / str(resolution)
+
+    # ---------- READ ----------
+
+    def series(self, ticker_id: int, resolution: int | str = RAW) -> BarSeries | None:
+        """The (cached) BarSeries of a ticker/resolution, or None if nothing is stored."""
+        folder = self._folder(ticker_id, resolution)
+        try:
+            stat = (folder / "datetime.bin").stat()
+        except FileNotFoundError:
+            return None
+        version = (stat.st_ino, stat.st_size)
+        key = (int(ticker_id), str(resolution))
+        with self._lock:
+            cached = self._series.get(key)
+            if cached is None or cached[0] != version:
+                cached = self._series[key] = (version, BarSeries(folder))
+        return cached[1]
+
+    def read(self, ticker_id: int, start: int | None = None, end: int | None = None, resolution: int | str = RAW) -> Dict[str, np.ndarray]:
+        """Zero-copy column views of one ticker's bars with start <= datetime <= end (epoch seconds)."""
+        series = self.series(ticker_id, resolution)
+        if series is None:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_TYPES.items()}
+        return series.slice(start, end)
+
+    def tickers(self) -> List[int]:
+        """Ticker ids with stored bars."""
+        if not self.root.is_dir():
+            return []
+        return sorted(int(entry.name[10:]) for entry in self.root.iterdir() if entry.name.startswith("ticker_id="))
+
+    # ---------- WRITE ----------
+
+    def write(self, ticker_id: int, columns: Dict[str, np.ndarray], *, overwrite: bool, resolution: int | str = RAW) -> Tuple[int, int]:
+        """
+        Store bars given as epoch-stamped columns. Existing datetimes are replaced when
+        overwrite is set and kept otherwise. Returns (inserted, updated).
+        """
+        if not len(columns["datetime"]):
+            return 0, 0
+        order = np.argsort(columns["datetime"], kind="stable")
+        new = {name: np.asarray(columns[name], dtype=dtype)[order] for name, dtype in COLUMN_TYPES.items()}
+        # Last occurrence wins within the batch, as with executemany upserts
+        stamps = new["datetime"]
+        last = np.append(stamps[1:] != stamps[:-1], True)
+        new = {name: values[last] for name, values in new.items()}
+
+        folder = self._folder(ticker_id, resolution)
+        series = self.series(ticker_id, resolution)
+        if series is None or series.length == 0 or new["datetime"][0] > series.columns["datetime"][-1]:
+            self._append(folder, new, series.length if series is not None else 0)
+            return len(new["datetime"]), 0
+
+        old = series.columns
+        exists = np.isin(new["datetime"], old["datetime"])
+        if not overwrite:
+            new = {name: values[~exists] for name, values in new.items()}
+            if not len(new["datetime"]):
+                return 0, 0
+        merged = {name: np.concatenate([old[name], new[name]]) for name in COLUMN_TYPES}
+        order = np.argsort(merged["datetime"], kind="stable")
+        merged = {name: values[order] for name, values in merged.items()}
+        keep = np.append(merged["datetime"][1:] != merged["datetime"][:-1], True)
+        self._rewrite(folder, {name: values[keep] for name, values in merged.items()})
+        updated = int(exists.sum()) if overwrite else 0
+        return len(new["datetime"]) - updated, updated
+
+    def _append(self, folder: Path, columns: Dict[str, np.ndarray], length: int) -> None:
+        folder.mkdir(parents=True, exist_ok=True)
+        # datetime last: readers size a series by its shortest column
+        for name in [*list(COLUMN_TYPES)[1:], "datetime"]:
+            with open(folder / f"{name}.bin", "r+b" if (folder / f"{name}.bin").exists() else "wb") as f:
+                f.truncate(length * 8)
+                f.seek(length * 8)
+                f.write(columns[name].astype(COLUMN_TYPES[name]).tobytes())
+
+    def _rewrite(self, folder: Path, columns: Dict[str, np.ndarray]) -> None:
+        """Write a whole series into fresh files and swap them in."""
+        for name in [*list(COLUMN_TYPES)[1:], "datetime"]:
+            tmp = folder / f"{name}.bin.tmp"
+            columns[name].astype(COLUMN_TYPES[name]).tofile(tmp)
+            os.replace(tmp, folder / f"{name}.bin")
+
+    # ---------- DELETE ----------
+
+    def delete_range(self, ticker_id: int, start: int, end: int, resolution: int | str = RAW) -> int:
+        """Remove bars with start <= datetime <= end. Returns number removed."""
+        series = self.series(ticker_id, resolution)
+        if series is None:
+            return 0
+        lo, hi = series.bounds(start, end)
+        if lo == hi:
+            return 0
+        self._rewrite(series.folder, {name: np.concatenate([column[:lo], column[hi:]]) for name, column in series.columns.items()})
+        return hi - lo
+
+    def drop(self, ticker_id: int | None = None) -> int:
+        """Remove all bars of a ticker (or of every ticker). Returns number of base bars removed."""
+        tickers = self.tickers() if ticker_id is None else [ticker_id]
+        removed = 0
+        for tid in tickers:
+            series = self.series(tid)
+            removed += series.length if series is not None else 0
+            shutil.rmtree(self.root / f"ticker_id={int(tid)}", ignore_errors=True)
+        return removed
+
+
+class MemmapPricesRepository(HistoricalPricesRepository):
+    """
+    HistoricalPricesRepository backed by a MemmapBarStore instead of the historical_prices table.
+
+    Same read/write interface and output modes; the connection is still used for ticker and
+    exchange lookups (sessions for resample). Reads slice memory-mapped column files found
+    with a sparse index, so repeated reads of a hot series run at page-cache speed with no
+    per-row Python work; `columns()` returns the zero-copy views themselves.
+    Rollups (5 minutes, 1 hour, 1 day) are aggregated from the base bars on read with the
+    vectorized resampler, on the same UTC buckets as `price_rollups`.
+    """
+
+    def __init__(self, connection: sql.Connection, root: str | os.PathLike):
+        super().__init__(connection)
+        self.store = MemmapBarStore(root)
+        # Rows come back with epoch datetimes, as in the "epoch" SQLite layout
+        self._layout = "epoch"
+
+    def detect_layout(self) -> str:
+        return self._layout
+
+    # ---------- READ ----------
+
+    def columns(self, ticker_id: int, start_date: datetime | None = None, end_date: datetime | None = None) -> Dict[str, np.ndarray]:
+        """Zero-copy read-only column views (datetime as epoch seconds) for a ticker and range."""
+        return self.store.read(ticker_id, _bound(start_date), _bound(end_date))
+
+    def get_all(self) -> List[Tuple[Any, ...]]:
+        """Return all stored bars as (ticker_id, datetime, open, high, low, close, volume) rows."""
+        rows = []
+        for ticker_id in self.store.tickers():
+            rows += self.fetch_raw(ticker_id, 0)
+        return rows
+
+    def fetch_raw(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
+        """
+        Return the stored base bars for a given ticker_id and datetime range.
+        If end_date is None, return all data from start_date onwards.
+        """
+        bars = self._bars(ticker_id, start_date, end_date, BAR_DTYPE)
+        return self._adjusted(bars, ticker_id, output, BAR_DTYPE) if adjusted else self._columnar(bars, output, ticker_id)
+
+    def get_close_prices(self, ticker_id: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
+        """
+        Return (datetime, close) for a given ticker_id and date range.
+        If end_date is None, return all data from start_date onwards.
+        """
+        bars = self._bars(ticker_id, start_date, end_date, CLOSE_DTYPE)
+        return self._adjusted(bars, ticker_id, output, CLOSE_DTYPE) if adjusted else self._columnar(bars, output)
+
+    def fetch_rollup(self, ticker_id: int, resolution: int, start_date: datetime, end_date: datetime | None = None, *, output: Output = "rows", adjusted: bool = False) -> Any:
+        """
+        Return bars of the given rollup resolution (seconds), aggregated from the base bars
+        of every bucket overlapping the range and stamped with their UTC bucket start.
+        """
+        from .resample import resample
+        if resolution not in resolutions.values():
+            raise ValueError("Invalid resolution")
+        start = _epoch(start_date)
+        end = _epoch(end_date) if end_date else None
+        first = start // resolution * resolution
+        last = None if end is None else end // resolution * resolution + resolution - 1
+        bars = self._bars(ticker_id, first, last, BAR_DTYPE)
+        if adjusted:
+            bars = self.adjustment_factors(ticker_id).apply(bars)
+        bars = resample(bars, f"{resolution}s")
+        keep = (bars["datetime"] >= start) & (True if end is None else bars["datetime"] <= end)
+        return self._columnar(bars[keep], output, ticker_id)
+
+    def _closes_before(self, ticker_id: int, ex: np.ndarray) -> np.ndarray:
+        """Last daily close in the two weeks before each ex-date epoch, from one read spanning them all."""
+        days = self.fetch_daily(ticker_id, int(ex.min()) - CLOSE_LOOKBACK, int(ex.max()) - 1, output="numpy")
+        return _last_close_before(days, ex)
+
+    def _bars(self, ticker_id: int, start_date: Any, end_date: Any, dtype: np.dtype) -> np.ndarray:
+        columns = self.store.read(ticker_id, _bound(start_date), _bound(end_date))
+        out = np.empty(len(columns["datetime"]), dtype=dtype)
+        for name in dtype.names:
+            out[name] = columns[name]
+        return out
+
+    # ---------- CREATE ----------
+
+    def create(self, ticker_id: int, datetime: datetime, close: float, *, open: float, high: float, low: float, volume: int) -> int:
+        """Insert one bar. Returns 1 if it was stored, 0 if the datetime already existed."""
+        return self.create_many(ticker_id, [(datetime, open, high, low, close, volume)])
+
+    def create_many(self, ticker_id: int, bars: Any, *, chunk_size: int | None = None, resolution: int | None = None, covered: Tuple[datetime, datetime] | None = None) -> int:
+        """
+        Bulk insert bars for a ticker, skipping datetimes that already exist.
+        `bars` is anything accepted by `bar_arrays`. Returns number of bars inserted.
+        """
+        columns = _columns(bars)
+        inserted = self.store.write(ticker_id, columns, overwrite=False)[0]
+        self._cover(ticker_id, columns["datetime"], resolution, covered)
+        return inserted
+
+    def upsert_many(self, ticker_id: int, bars: Any, *, chunk_size: int | None = None, resolution: int | None = None, covered: Tuple[datetime, datetime] | None = None) -> Tuple[int, int]:
+        """
+        Bulk insert bars for a ticker, overwriting existing datetimes.
+        Returns (inserted, updated) counts.
+        """
+        columns = _columns(bars)
+        counts = self.store.write(ticker_id, columns, overwrite=True)
+        self._cover(ticker_id, columns["datetime"], resolution, covered)
+        return counts
+
+    def get_or_create(self, ticker_id: int, datetime: str, *, open: float, high: float, low: float, close: float, volume: int) -> int:
+        """Insert a bar unless its datetime exists. Returns the bar's epoch datetime."""
+        self.create_many(ticker_id, [(datetime, open, high, low, close, volume)])
+        return _epoch(datetime)
+
+    # ---------- UPDATE ----------
+
+    def update(self, ticker_id: int, datetime: datetime, *, open: float, high: float, low: float, close: float, volume: int) -> int:
+        """Overwrite an existing bar. Returns number of bars updated."""
+        epoch = _epoch(datetime)
+        stored = self.store.read(ticker_id, epoch, epoch)["datetime"]
+        if not len(stored):
+            return 0
+        return self.store.write(ticker_id, _columns([(datetime, open, high, low, close, volume)]), overwrite=True)[1]
+
+    # ---------- DELETE ----------
+
+    def delete(self, ticker_id: int) -> int:
+        """Delete all bars of a ticker. Returns number of bars deleted."""
+        self._uncover(ticker_id)
+        self.connection.commit()
+        return self.store.drop(ticker_id)
+
+    def delete_days(self, ticker_id: int, start_date: datetime, end_date: datetime) -> int:
+        """Delete a ticker's bars with start_date <= datetime <= end_date. Returns number deleted."""
+        self._uncover(ticker_id, _epoch(start_date), _epoch(end_date) + 1)
+        self.connection.commit()
+        return self.store.delete_range(ticker_id, _epoch(start_date), _epoch(end_date))
+
+    def delete_all(self) -> int:
+        """Delete ALL stored bars. Returns number of bars deleted."""
+        self._uncover()
+        self.connection.commit()
+        return self.store.drop()
+
+    # ---------- ROLLUPS ----------
+
+    def refresh_rollups(self, ticker_id: int, start_date: datetime, end_date: datetime) -> None:
+        """Rollups are aggregated on read; nothing to refresh."""
+
+    def rebuild_rollups(self, ticker_id: int | None = None) -> None:
+        """Rollups are aggregated on read; nothing to rebuild."""
+
+    # ---------- RETENTION ----------
+
+    def enforce_retention(self, policy: RetentionPolicy | None = None, *, now: datetime | None = None, max_chunks: int | None = None) -> RetentionReport:
+        """
+        Delete base bars older than policy.raw (whole UTC days) from the bar store, one
+        ticker per chunk, through delete_days. Rollups are aggregated on read from the
+        base bars, so they cannot outlive them: pruned days are gone at every resolution
+        and policy.hourly does not apply. Pruning is idempotent, so a run stopped after
+        max_chunks tickers (report.complete False) simply carries on at the next call.
+        """
+        policy = policy or RetentionPolicy()
+        today = _epoch(pd.Timestamp.now(tz="UTC") if now is None else now)
+        cutoff = (today - int(policy.raw.total_seconds())) // 86400 * 86400
+        report = RetentionReport()
+        chunks = 0
+        for ticker_id in self.store.tickers():
+            series = self.store.series(ticker_id)
+            if series is None or not series.length or series.columns["datetime"][0] >= cutoff:
+                continue
+            if max_chunks is not None and chunks >= max_chunks:
+                report.complete = False
+                return report
+            report.bars += self.delete_days(ticker_id, int(series.columns["datetime"][0]), cutoff - 1)
+            chunks += 1
+        return report
+
+def _bound(value: Any) -> int | None:
+    return None if value is None else _epoch(value)
+
+def _columns(bars: Any) -> Dict[str, np.ndarray]:
+    """Normalise bars with `bar_arrays` into epoch-stamped columns."""
+    arrays = bar_arrays(bars)
+    arrays["datetime"] = arrays["datetime"].astype("datetime64[s]").astype("int64")
+    return arrays
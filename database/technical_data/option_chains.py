@@ -0,0 +1,597 @@
+from __future__ import annotations
+import sqlite3 as sql
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Literal, NamedTuple, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from ..bulk import BulkRepository
+from ..registry import registry_for
+from .historical_prices import _epoch, _nullable, datetime_text
+
+Right = Literal["C", "P"]
+
+# (expiration_date 'YYYY-MM-DD', strike, right) -> option_id, per ticker
+ContractKey = Tuple[str, float, str]
+
+# Anything with r_cc_vec (datahub's YieldCurve), a function of T, or a flat rate
+Rates = Union[Any, Callable[[np.ndarray], Any], float, None]
+
+YEAR_SECONDS = 365.0 * 24 * 3600.0
+
+# Row layout of surface_arrays, streamed from the cursor by np.fromiter
+SURFACE_DTYPE = np.dtype([("K", "f8"), ("P", "f8"), ("S", "f8"), ("expiry", "i8"), ("cp", "i4")])
+
+def option_schema() -> List[str]:
+    """DDL for the option contract and quote tables."""
+    return [
+        '''CREATE TABLE IF NOT EXISTS option_chains (
+                        option_id INTEGER PRIMARY KEY,
+                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+                        symbol TEXT NOT NULL,
+                        creation_date DATE,
+                        expiration_date DATE NOT NULL,
+                        strike_price REAL NOT NULL,
+                        option_type TEXT NOT NULL,
+                        UNIQUE(ticker_id, expiration_date, strike_price, option_type)
+                    )''',
+        '''CREATE INDEX IF NOT EXISTS idx_option_chains_symbol ON option_chains (symbol)''',
+        '''CREATE INDEX IF NOT EXISTS idx_option_chains_expiration ON option_chains (expiration_date)''',
+        '''CREATE TABLE IF NOT EXISTS option_prices (
+                        option_id INTEGER NOT NULL REFERENCES option_chains(option_id) ON DELETE CASCADE,
+                        datetime DATETIME NOT NULL,
+                        bid REAL,
+                        ask REAL,
+                        last_price REAL NOT NULL,
+                        volume INTEGER,
+                        open_interest INTEGER,
+                        underlying REAL,
+                        PRIMARY KEY (option_id, datetime)
+                    )''',
+        '''CREATE INDEX IF NOT EXISTS idx_option_prices_id_time ON option_prices (option_id, datetime)''',
+        '''CREATE TABLE IF NOT EXISTS option_snapshots (
+                        ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+                        datetime DATETIME NOT NULL,
+                        underlying REAL,
+                        contracts INTEGER NOT NULL,
+                        PRIMARY KEY (ticker_id, datetime)
+                    )''',
+    ]
+
+def repair_option_schema(connection: sql.Connection) -> bool:
+    """
+    Bring option tables created by older versions up to date: add the underlying column
+    to option_prices, list the snapshots of quotes stored before option_snapshots existed
+    and rebuild option_chains if it still references the old equity_data table (which
+    never existed, so every insert failed with foreign keys on).
+    Returns True if anything changed.
+    """
+    changed = False
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(option_prices)").fetchall()}
+    if "underlying" not in columns:
+        connection.execute("ALTER TABLE option_prices ADD COLUMN underlying REAL")
+        connection.commit()
+        changed = True
+    if connection.execute("SELECT 1 FROM option_snapshots LIMIT 1").fetchone() is None and connection.execute("SELECT 1 FROM option_prices LIMIT 1").fetchone() is not None:
+        connection.execute(
+            '''INSERT INTO option_snapshots (ticker_id, datetime, underlying, contracts)
+               SELECT c.ticker_id, p.datetime, MAX(p.underlying), COUNT(*)
+               FROM option_prices p JOIN option_chains c ON c.option_id = p.option_id
+               JOIN tickers t ON t.ticker_id = c.ticker_id
+               GROUP BY c.ticker_id, p.datetime'''
+        )
+        connection.commit()
+        changed = True
+    references = {row[2] for row in connection.execute("PRAGMA foreign_key_list(option_chains)").fetchall()}
+    if "equity_data" not in references:
+        return changed
+    connection.commit()
+    # Dropping the old table must not cascade into option_prices
+    connection.execute("PRAGMA foreign_keys = OFF")
+    try:
+        connection.execute("ALTER TABLE option_chains RENAME TO option_chains_old")
+        connection.execute(option_schema()[0])
+        connection.execute("INSERT INTO option_chains SELECT * FROM option_chains_old")
+        connection.execute("DROP TABLE option_chains_old")
+        for statement in option_schema()[1:3]:
+            connection.execute(statement)
+        connection.commit()
+    finally:
+        connection.execute("PRAGMA foreign_keys = ON")
+    return True
+
+def occ_symbol(root: str, expiration: str, right: str, strike: float) -> str:
+    """OCC contract symbol, e.g. occ_symbol("SPY", "2025-01-17", "C", 500) -> 'SPY   250117C00500000'."""
+    return f"{root.upper():<6}{expiration[2:4]}{expiration[5:7]}{expiration[8:10]}{right}{int(round(strike * 1000)):08d}"
+
+def _strike(value: float) -> float:
+    # Keys compare strikes after rounding so 500.0 from a frame matches 500.0 read back from SQLite
+    return round(float(value), 4)
+
+def _text(stamp: Any) -> str:
+    """UTC 'YYYY-MM-DD HH:MM:SS' for a datetime, string or Timestamp (naive values are taken as UTC)."""
+    return datetime_text(_epoch(stamp))
+
+
+@dataclass
+class OptionContract:
+    """
+    Data class representing one listed option contract.
+    """
+
+    id: int
+    ticker_id: int
+    symbol: str
+    creation_date: Optional[str]
+    expiration_date: str
+    strike: float
+    option_type: str
+
+
+class OptionArrays(NamedTuple):
+    """Pricer inputs in the order OptionsData.to_arrays returns them, one entry per contract."""
+    K: np.ndarray   # strike, float64
+    P: np.ndarray   # working price: bid/ask mid, else last price, float64
+    S: np.ndarray   # underlying spot at the quote time, float64
+    r: np.ndarray   # continuously compounded rate for T, float64
+    q: np.ndarray   # dividend yield, float64
+    T: np.ndarray   # years to expiry (365-day years, floored at 1e-8), float64
+    cp: np.ndarray  # +1 call, -1 put, int32
+
+
+class OptionChainsRepository(BulkRepository):
+    """
+    Data-access layer for the `option_chains` contracts and their `option_prices` quotes.
+
+    Schema:
+        option_chains:
+            option_id INTEGER PRIMARY KEY,
+            ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+            symbol TEXT NOT NULL,                       -- OCC contract symbol
+            creation_date DATE,
+            expiration_date DATE NOT NULL,
+            strike_price REAL NOT NULL,
+            option_type TEXT NOT NULL,                  -- 'C' or 'P'
+            UNIQUE(ticker_id, expiration_date, strike_price, option_type)
+        option_prices:
+            option_id INTEGER NOT NULL REFERENCES option_chains(option_id) ON DELETE CASCADE,
+            datetime DATETIME NOT NULL,
+            bid REAL, ask REAL, last_price REAL NOT NULL, volume INTEGER, open_interest INTEGER,
+            underlying REAL,                            -- spot of the underlier at the quote time
+            PRIMARY KEY (option_id, datetime)
+        option_snapshots:
+            ticker_id INTEGER NOT NULL REFERENCES tickers(ticker_id) ON DELETE CASCADE,
+            datetime DATETIME NOT NULL,                 -- one row per ingested snapshot
+            underlying REAL,
+            contracts INTEGER NOT NULL,                 -- quotes in the chain (not rows written)
+            PRIMARY KEY (ticker_id, datetime)
+
+    Chain snapshots (the DataFrame OptionsData.chain returns) are ingested with
+    ingest_snapshot() in one transaction: contract ids come from an in-memory
+    (expiry, strike, right) map per ticker, loaded with one indexed query the first time
+    a ticker is seen, so only contracts new to the chain are inserted; every quote then
+    goes into option_prices with one executemany.
+
+    With delta=True only quotes whose bid/ask/last/volume/open interest changed since the
+    contract's last stored row are written, compared against a per-ticker cache of those
+    rows. Reads reconstruct the chain as of a snapshot by forward-filling: each contract
+    reports its latest row at or before the snapshot time (so a contract missing from later
+    snapshots keeps its last quote until it expires).
+
+    A snapshot older than the ticker's latest one is written in full. Where one of its
+    quotes would otherwise be forward-filled into the next snapshot (which skipped the
+    contract as unchanged), the value that held there is written at that snapshot too.
+
+    Function Returns:
+        gets:
+            get_info(option_id: int) -> Optional[OptionContract]
+            get_by_symbol(symbol: str) -> Optional[OptionContract]
+            get_chain(ticker_id: int, expiration: str | None = None) -> List[OptionContract]
+            expirations(ticker_id: int) -> List[str]
+            get_snapshot(ticker_id: int, quote_time=None, *, expiration=None) -> pd.DataFrame
+            get_quotes(option_id: int, start=None, end=None) -> List[Tuple]
+            surface_arrays(ticker_id: int, as_of=None, *, curve=None, q=0.0, spot=None, expiration=None, max_age=None) -> OptionArrays
+        creates:
+            create(ticker_id, expiration, strike, right, *, symbol=None, creation_date=None) -> int
+            contract_ids(ticker_id, keys, *, root=None, creation_date=None) -> List[int]
+            ingest_snapshot(chain: pd.DataFrame, ticker_id: int | None = None, *, quote_time=None, delta=False) -> Tuple[int, int]
+        deletes:
+            delete(option_id: int) -> int
+            delete_expired(before: str) -> int
+            delete_all() -> int
+    """
+
+    TABLE_NAME = "option_chains"
+    ID_COL     = "option_id"
+    COLUMNS    = ["option_id", "ticker_id", "symbol", "creation_date", "expiration_date", "strike_price", "option_type"]
+
+    def __init__(self, connection: sql.Connection):
+        self.connection = connection
+        # Ensure foreign key constraints are enforced
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.registry = registry_for(connection)
+
+    def _contract(self, row: Tuple[Any, ...]) -> OptionContract:
+        return OptionContract(*row)
+
+    # ---------- READ ----------
+
+    def get_info(self, option_id: int) -> Optional[OptionContract]:
+        """Return a contract by option_id or None if not found."""
+        rows = self._select_in(["option_id"], [option_id])
+        return self._contract(rows[0]) if rows else None
+
+    def get_by_symbol(self, symbol: str) -> Optional[OptionContract]:
+        """Return a contract by its OCC symbol or None if not found."""
+        rows = self._select_in(["symbol"], [symbol])
+        return self._contract(rows[0]) if rows else None
+
+    def get_chain(self, ticker_id: int, expiration: str | None = None) -> List[OptionContract]:
+        """Contracts of a ticker (optionally one expiration), ordered by expiration, right and strike."""
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM option_chains WHERE ticker_id = ?"
+        params: Tuple[Any, ...] = (ticker_id,)
+        if expiration is not None:
+            query += " AND expiration_date = ?"
+            params += (str(pd.Timestamp(expiration).date()),)
+        cur = self.connection.cursor()
+        cur.execute(query + " ORDER BY expiration_date, option_type, strike_price", params)
+        return [self._contract(row) for row in cur.fetchall()]
+
+    def expirations(self, ticker_id: int) -> List[str]:
+        """Listed expiration dates of a ticker."""
+        cur = self.connection.cursor()
+        cur.execute("SELECT DISTINCT expiration_date FROM option_chains WHERE ticker_id = ? ORDER BY expiration_date", (ticker_id,))
+        return [row[0] for row in cur.fetchall()]
+
+    def get_snapshot(self, ticker_id: int, quote_time: Any = None, *, expiration: str | None = None) -> pd.DataFrame:
+        """
+        The chain as of its latest snapshot at or before quote_time (default: the latest),
+        in the column layout of OptionsData.chain:
+            ticker_id, expiry, right, strike, bid, ask, last, volume, open_interest, quote_time, underlying, mid, px
+        Every contract not expired at the snapshot reports its latest quote at or before it.
+        """
+        query = '''WITH snapshot AS (
+                       SELECT datetime, underlying FROM option_snapshots
+                       WHERE ticker_id = ?{until} ORDER BY datetime DESC LIMIT 1
+                   )
+                   SELECT c.option_id, c.expiration_date, c.option_type, c.strike_price, p.bid, p.ask, p.last_price, p.volume, p.open_interest,
+                          snapshot.datetime, COALESCE(snapshot.underlying, p.underlying)
+                   FROM snapshot, option_chains c JOIN option_prices p ON p.option_id = c.option_id
+                   WHERE c.ticker_id = ? AND c.expiration_date >= date(snapshot.datetime)
+                     AND p.datetime = (SELECT MAX(q.datetime) FROM option_prices q WHERE q.option_id = c.option_id AND q.datetime <= snapshot.datetime)'''
+        params: List[Any] = [ticker_id]
+        until = ""
+        if quote_time is not None:
+            until = " AND datetime <= ?"
+            params.append(_text(quote_time))
+        params.append(ticker_id)
+        if expiration is not None:
+            query += " AND c.expiration_date = ?"
+            params.append(str(pd.Timestamp(expiration).date()))
+        cur = self.connection.cursor()
+        cur.execute(query.format(until=until) + " ORDER BY c.expiration_date, c.option_type, c.strike_price", params)
+        frame = pd.DataFrame(cur.fetchall(), columns=["option_id", "expiry", "right", "strike", "bid", "ask", "last", "volume", "open_interest", "quote_time", "underlying"])
+        frame.insert(0, "ticker_id", ticker_id)
+        # Few distinct expiries and one quote time: parse each distinct value once
+        for column, format in (("expiry", "%Y-%m-%d"), ("quote_time", "ISO8601")):
+            codes, values = pd.factorize(frame[column])
+            frame[column] = pd.DatetimeIndex(pd.to_datetime(values, utc=True, format=format)).take(codes)
+        for column in ("strike", "bid", "ask", "last", "volume", "open_interest", "underlying"):
+            frame[column] = pd.to_numeric(frame[column], errors="coerce")
+        frame["mid"] = 0.5 * (frame["bid"] + frame["ask"])
+        frame["px"] = frame["mid"]
+        return frame.set_index("option_id")
+
+    def get_quotes(self, option_id: int, start: Any = None, end: Any = None) -> List[Tuple[Any, ...]]:
+        """
+        Stored quote history (datetime, bid, ask, last_price, volume, open_interest) of one
+        contract; for delta ingested snapshots that is the rows where the quote changed.
+        """
+        query = "SELECT datetime, bid, ask, last_price, volume, open_interest FROM option_prices WHERE option_id = ?"
+        params: List[Any] = [option_id]
+        if start is not None:
+            query += " AND datetime >= ?"
+            params.append(_text(start))
+        if end is not None:
+            query += " AND datetime <= ?"
+            params.append(_text(end))
+        cur = self.connection.cursor()
+        cur.execute(query + " ORDER BY datetime", params)
+        return cur.fetchall()
+
+    def surface_arrays(self, ticker_id: int, as_of: Any = None, *, curve: Rates = None, q: Any = 0.0, spot: Any = None, expiration: str | None = None, max_age: timedelta | None = None) -> OptionArrays:
+        """
+        The latest quote at or before as_of (default: now) of every contract of a ticker not
+        yet expired at as_of, as contiguous arrays ready for the blackscholes/binomial_tree
+        pipelines (see OptionArrays), ordered by expiration, right and strike.
+
+        One query seeks each contract's latest quote through the option_prices primary key
+        and streams the rows into NumPy; T, r and q are then filled in vectorized:
+            curve  -> rates for T: anything with r_cc_vec(T) (YieldCurve), a function of the
+                      T array (or, failing that, of one T at a time) or a flat rate; None is 0
+            q      -> dividend yield, a scalar or an array per contract
+            spot   -> overrides the underlying of the snapshot at as_of (NaN where none was stored)
+            max_age -> drops contracts whose latest stored quote is older than as_of - max_age
+                      (for delta ingested snapshots: whose quote has not changed since)
+        """
+        now = pd.Timestamp.now(tz="UTC") if as_of is None else as_of
+        stamp = _text(now)
+        query = '''SELECT c.strike_price, COALESCE((p.bid + p.ask) / 2, p.last_price),
+                          COALESCE((SELECT s.underlying FROM option_snapshots s WHERE s.ticker_id = ? AND s.datetime <= ? ORDER BY s.datetime DESC LIMIT 1), p.underlying),
+                          CAST(strftime('%s', c.expiration_date) AS INTEGER),
+                          CASE c.option_type WHEN 'C' THEN 1 ELSE -1 END
+                   FROM option_chains c JOIN option_prices p ON p.option_id = c.option_id
+                   WHERE c.ticker_id = ? AND c.expiration_date >= ?
+                     AND p.datetime = (SELECT MAX(q.datetime) FROM option_prices q WHERE q.option_id = c.option_id AND q.datetime <= ?)'''
+        params: List[Any] = [ticker_id, stamp, ticker_id, stamp[:10], stamp]
+        if expiration is not None:
+            query += " AND c.expiration_date = ?"
+            params.append(str(pd.Timestamp(expiration).date()))
+        if max_age is not None:
+            query += " AND p.datetime >= ?"
+            params.append(_text(pd.Timestamp(stamp) - max_age))
+        cur = self.connection.cursor()
+        cur.execute(query + " ORDER BY c.expiration_date, c.option_type, c.strike_price", params)
+        rows = np.fromiter(cur, dtype=SURFACE_DTYPE)
+
+        T = np.clip((rows["expiry"] - _epoch(stamp)) / YEAR_SECONDS, 1e-8, None)
+        S = rows["S"] if spot is None else np.broadcast_to(np.asarray(spot, dtype="float64"), T.shape)
+        return OptionArrays(
+            K=np.ascontiguousarray(rows["K"]),
+            P=np.ascontiguousarray(rows["P"]),
+            S=np.ascontiguousarray(S, dtype="float64"),
+            r=_rates(curve, T),
+            q=np.ascontiguousarray(np.broadcast_to(np.asarray(q, dtype="float64"), T.shape)),
+            T=T,
+            cp=np.ascontiguousarray(rows["cp"]),
+        )
+
+    # ---------- CREATE ----------
+
+    def create(self, ticker_id: int, expiration: str, strike: float, right: Right, *, symbol: str | None = None, creation_date: str | None = None) -> int:
+        """Insert one contract and return its option_id."""
+        return self.contract_ids(ticker_id, [(expiration, strike, right)], symbols=None if symbol is None else [symbol], creation_date=creation_date)[0]
+
+    def contract_ids(self, ticker_id: int, keys: Iterable[ContractKey], *, root: str | None = None, symbols: List[str] | None = None, creation_date: str | None = None) -> List[int]:
+        """
+        option_ids for (expiration 'YYYY-MM-DD', strike, right) keys of one ticker, in order,
+        inserting the contracts not listed yet (OCC symbols from `symbols` or built from `root`).
+        """
+        keys = [(str(expiration)[:10], _strike(strike), str(right).upper()[0]) for expiration, strike, right in keys]
+        known = self._known(ticker_id)
+        missing = [i for i, key in enumerate(keys) if key not in known]
+        if missing:
+            if root is None and symbols is None:
+                root = self._root(ticker_id)
+            rows = []
+            for i in missing:
+                expiration, strike, right = keys[i]
+                symbol = symbols[i] if symbols is not None else occ_symbol(root, expiration, right, strike)
+                rows.append((ticker_id, symbol, creation_date, expiration, strike, right))
+            cur = self.connection.cursor()
+            cur.executemany(
+                "INSERT OR IGNORE INTO option_chains (ticker_id, symbol, creation_date, expiration_date, strike_price, option_type) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.connection.commit()
+            known.update(self._load(ticker_id))
+        return [known[key] for key in keys]
+
+    def ingest_snapshot(self, chain: pd.DataFrame, ticker_id: int | None = None, *, quote_time: Any = None, delta: bool = False) -> Tuple[int, int]:
+        """
+        Store one chain snapshot (columns as OptionsData.chain: ticker, expiry, right, strike,
+        bid, ask, last, volume, open_interest, quote_time, optionally underlying, px/mid and
+        contractSymbol) in one transaction. Quotes for a contract and time already stored are
+        overwritten. last_price falls back to the mid (px) where the last trade is missing.
+        With delta=True a quote is skipped when it equals the contract's last stored row
+        (snapshots older than the ticker's latest one are always written in full, see
+        _carried). Returns (contracts created, quotes written).
+        """
+        if chain.empty:
+            return 0, 0
+        if ticker_id is None:
+            ticker_id = self._ticker_id(str(chain["ticker"].iloc[0]))
+        # A chain has a handful of expiries: format each once instead of once per row
+        codes, expiries = pd.factorize(pd.to_datetime(chain["expiry"], utc=True))
+        expirations = np.asarray(expiries.strftime("%Y-%m-%d"), dtype=object)[codes].tolist()
+        rights = chain["right"].astype(str).str.upper().str[0].tolist()
+        strikes = pd.to_numeric(chain["strike"], errors="coerce").to_numpy("float64")
+        keys = list(zip(expirations, strikes.tolist(), rights))
+        if quote_time is None:
+            quote_time = chain["quote_time"].iloc[0] if "quote_time" in chain.columns else pd.Timestamp.now(tz="UTC")
+        stamp = _text(quote_time)
+
+        bid = _column(chain, "bid")
+        ask = _column(chain, "ask")
+        last = _column(chain, "last", "lastPrice")
+        mid = _column(chain, "px", "mid")
+        mid = np.where(np.isnan(mid), 0.5 * (bid + ask), mid)
+        last = np.where(np.isnan(last), mid, last)
+        keep = ~np.isnan(last) & ~np.isnan(strikes)
+        indices = np.flatnonzero(keep).tolist()
+        symbols = chain["contractSymbol"].astype(str).tolist() if "contractSymbol" in chain.columns else None
+        root = str(chain["ticker"].iloc[0]) if symbols is None and "ticker" in chain.columns else None
+        quotes = (
+            _nullable(bid[keep]),
+            _nullable(ask[keep]),
+            last[keep].tolist(),
+            _nullable(_column(chain, "volume")[keep], int),
+            _nullable(_column(chain, "open_interest", "openInterest")[keep], int),
+        )
+        underlying = _column(chain, "underlying")
+        underlying = underlying[~np.isnan(underlying)]
+        spot = float(underlying[0]) if len(underlying) else None
+
+        try:
+            with self._batch():
+                before = len(self._known(ticker_id))
+                ids = self.contract_ids(
+                    ticker_id,
+                    [keys[i] for i in indices],
+                    root=root,
+                    symbols=None if symbols is None else [symbols[i] for i in indices],
+                    creation_date=stamp[:10],
+                )
+                created = len(self._known(ticker_id)) - before
+                values = list(zip(*quotes))
+                cur = self.connection.cursor()
+                cur.execute("SELECT MIN(datetime) FROM option_snapshots WHERE ticker_id = ? AND datetime > ?", (ticker_id, stamp))
+                following = cur.fetchone()[0]
+                latest = self._last_quotes(ticker_id) if delta else self.registry.cached_relation("option_last_quotes", ticker_id)
+                written = range(len(ids))
+                if delta and following is None:
+                    written = [i for i, (option_id, quote) in enumerate(zip(ids, values)) if _changed(latest.get(option_id), stamp, quote)]
+                rows = [(ids[i], stamp, *values[i], spot) for i in written]
+                if following is not None:
+                    rows += self._carried(ticker_id, rows, following)
+                cur.executemany(
+                    '''INSERT INTO option_prices (option_id, datetime, bid, ask, last_price, volume, open_interest, underlying)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(option_id, datetime) DO UPDATE SET
+                           bid = excluded.bid, ask = excluded.ask, last_price = excluded.last_price,
+                           volume = excluded.volume, open_interest = excluded.open_interest,
+                           underlying = excluded.underlying''',
+                    rows,
+                )
+                cur.execute(
+                    '''INSERT INTO option_snapshots (ticker_id, datetime, underlying, contracts) VALUES (?, ?, ?, ?)
+                       ON CONFLICT(ticker_id, datetime) DO UPDATE SET underlying = excluded.underlying, contracts = excluded.contracts''',
+                    (ticker_id, stamp, spot, len(ids)),
+                )
+                self.connection.commit()
+                if latest is not None:
+                    for option_id, at, *quote in rows:
+                        previous = latest.get(option_id)
+                        if previous is None or previous[0] <= at:
+                            latest[option_id] = (at, *quote[:5])
+        except Exception:
+            # Contracts inserted by a rolled back snapshot are gone again (a failing
+            # DataBase.transaction() block also invalidates the registry)
+            self.registry.invalidate()
+            raise
+        return created, len(rows)
+
+    def _known(self, ticker_id: int) -> Dict[ContractKey, int]:
+        """
+        The contract map of one ticker. It is cached in the registry, so it is dropped with
+        the identity map on writes through the other repositories (e.g. a ticker delete
+        cascading into option_chains) and on rolled back transactions.
+        """
+        return self.registry.relation("option_contracts", ticker_id, lambda: self._load(ticker_id))
+
+    def _last_quotes(self, ticker_id: int) -> Dict[int, Tuple[Any, ...]]:
+        """
+        option_id -> (datetime, bid, ask, last_price, volume, open_interest) of the latest
+        stored row of each contract of a ticker, cached in the registry like _known.
+        """
+        def load() -> Dict[int, Tuple[Any, ...]]:
+            cur = self.connection.cursor()
+            cur.execute(
+                '''SELECT p.option_id, p.datetime, p.bid, p.ask, p.last_price, p.volume, p.open_interest
+                   FROM option_chains c JOIN option_prices p ON p.option_id = c.option_id
+                   WHERE c.ticker_id = ? AND p.datetime = (SELECT MAX(q.datetime) FROM option_prices q WHERE q.option_id = c.option_id)''',
+                (ticker_id,),
+            )
+            return {row[0]: row[1:] for row in cur.fetchall()}
+        return self.registry.relation("option_last_quotes", ticker_id, load)
+
+    def _carried(self, ticker_id: int, rows: List[Tuple[Any, ...]], following: str) -> List[Tuple[Any, ...]]:
+        """
+        Rows keeping the `following` snapshot as it was when back-filled `rows` land before
+        it: a contract with no row after the back-filled one up to `following` reported its
+        previous row there, so that row is written again at `following` (unless the
+        back-filled quote is the same).
+        """
+        cur = self.connection.cursor()
+        cur.execute(
+            '''SELECT p.option_id, p.datetime, p.bid, p.ask, p.last_price, p.volume, p.open_interest, p.underlying
+               FROM option_chains c JOIN option_prices p ON p.option_id = c.option_id
+               WHERE c.ticker_id = ? AND p.datetime = (SELECT MAX(q.datetime) FROM option_prices q WHERE q.option_id = c.option_id AND q.datetime <= ?)''',
+            (ticker_id, following),
+        )
+        previous = {row[0]: row[1:] for row in cur.fetchall()}
+        carried = []
+        for option_id, stamp, *quote in rows:
+            prior = previous.get(option_id)
+            if prior is not None and prior[0] <= stamp and tuple(prior[1:6]) != tuple(quote[:5]):
+                carried.append((option_id, following, *prior[1:]))
+        return carried
+
+    def _load(self, ticker_id: int) -> Dict[ContractKey, int]:
+        cur = self.connection.cursor()
+        cur.execute("SELECT option_id, expiration_date, strike_price, option_type FROM option_chains WHERE ticker_id = ?", (ticker_id,))
+        return {(expiration, _strike(strike), right): option_id for option_id, expiration, strike, right in cur.fetchall()}
+
+    def _root(self, ticker_id: int) -> str:
+        cur = self.connection.cursor()
+        cur.execute("SELECT symbol FROM tickers WHERE ticker_id = ?", (ticker_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Ticker {ticker_id} not found")
+        return row[0]
+
+    def _ticker_id(self, symbol: str) -> int:
+        cur = self.connection.cursor()
+        cur.execute("SELECT ticker_id FROM tickers WHERE symbol = ?", (symbol.upper(),))
+        rows = cur.fetchall()
+        if len(rows) != 1:
+            raise ValueError(f"{'No' if not rows else 'More than one'} ticker with symbol '{symbol}', pass ticker_id")
+        return rows[0][0]
+
+    def _batch(self):
+        """One transaction for a snapshot (a savepoint inside an outer DataBase.transaction())."""
+        transaction = getattr(self.connection, "transaction", None)
+        return transaction() if transaction is not None else nullcontext()
+
+    # ---------- DELETE ----------
+
+    def delete(self, option_id: int) -> int:
+        """Delete a contract and its quotes. Returns number of contracts deleted."""
+        return self._delete_in(["option_id"], [option_id])
+
+    def delete_expired(self, before: Any) -> int:
+        """Delete contracts that expired before a date, with their quotes. Returns number deleted."""
+        cur = self.connection.cursor()
+        cur.execute("DELETE FROM option_chains WHERE expiration_date < ?", (str(pd.Timestamp(before).date()),))
+        self._written()
+        return cur.rowcount
+
+    def delete_all(self) -> int:
+        """Delete ALL contracts, quotes and snapshots. Returns number of contracts deleted."""
+        cur = self.connection.cursor()
+        cur.execute("DELETE FROM option_chains")
+        deleted = cur.rowcount
+        cur.execute("DELETE FROM option_snapshots")
+        self._written()
+        return deleted
+
+def _changed(last: Optional[Tuple[Any, ...]], stamp: str, quote: Tuple[Any, ...]) -> bool:
+    """
+    Whether a delta snapshot at stamp must store quote, given the contract's last stored
+    (datetime, *values) row: when there is none, when it is newer (filling in history)
+    or when the values differ.
+    """
+    return last is None or last[0] > stamp or tuple(last[1:]) != tuple(quote)
+
+def _rates(curve: Rates, T: np.ndarray) -> np.ndarray:
+    """Continuously compounded rates for T from a curve, rate function or flat rate."""
+    if curve is None:
+        return np.zeros_like(T)
+    if hasattr(curve, "r_cc_vec"):
+        r = curve.r_cc_vec(T)
+    elif callable(curve):
+        try:
+            r = curve(T)
+        except TypeError:
+            r = [curve(t) for t in T.tolist()]
+    else:
+        r = curve
+    return np.ascontiguousarray(np.broadcast_to(np.asarray(r, dtype="float64"), T.shape))
+
+def _column(frame: pd.DataFrame, *names: str) -> np.ndarray:
+    """First present column of names as float64 (NaN where missing)."""
+    for name in names:
+        if name in frame.columns:
+            return pd.to_numeric(frame[name], errors="coerce").to_numpy("float64")
+    return np.full(len(frame), np.nan)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import re
+from typing import Tuple
+import numpy as np
+import pandas as pd
+from ..core.calendars import TradingSession
+from .historical_prices import BAR_DTYPE
+
+# Unit aliases -> (seconds per unit, bucket kind). Calendar kinds are bucketed on local dates.
+_UNITS = {
+    "s": (1, "intraday"), "sec": (1, "intraday"), "secs": (1, "intraday"), "second": (1, "intraday"), "seconds": (1, "intraday"),
+    "m": (60, "intraday"), "min": (60, "intraday"), "mins": (60, "intraday"), "minute": (60, "intraday"), "minutes": (60, "intraday"),
+    "h": (3600, "intraday"), "hr": (3600, "intraday"), "hour": (3600, "intraday"), "hours": (3600, "intraday"),
+    "d": (86400, "day"), "day": (86400, "day"), "days": (86400, "day"),
+    "w": (7 * 86400, "week"), "wk": (7 * 86400, "week"), "week": (7 * 86400, "week"), "weeks": (7 * 86400, "week"),
+    "mo": (0, "month"), "mon": (0, "month"), "month": (0, "month"), "months": (0, "month"),
+}
+
+def parse_interval(interval: str) -> Tuple[int, int, str]:
+    """
+    Parse an interval such as "1m", "15min", "4h", "1d", "1w", "1mo" or "5 Minutes".
+    Returns (count, seconds, kind) where seconds is the bucket width for intraday kinds
+    and kind is one of "intraday", "day", "week", "month". Upper-case "M" means months.
+    """
+    match = re.fullmatch(r"\s*(\d*)\s*([A-Za-z]+)\s*", interval or "")
+    if not match:
+        raise ValueError(f"Invalid interval: {interval!r}")
+    count = int(match.group(1) or 1)
+    unit = match.group(2)
+    unit = "mo" if unit == "M" else unit.lower()
+    if unit not in _UNITS or count <= 0:
+        raise ValueError(f"Invalid interval: {interval!r}")
+    seconds, kind = _UNITS[unit]
+    return count, count * seconds, kind
+
+def local_offsets(epochs: np.ndarray, timezone: str) -> np.ndarray:
+    """UTC offset in seconds of each UTC epoch in the given timezone (DST aware)."""
+    if not timezone or timezone.upper() == "UTC" or len(epochs) == 0:
+        return np.zeros(len(epochs), dtype="int64")
+    utc = pd.DatetimeIndex(epochs.astype("datetime64[s]").astype("datetime64[ns]"), tz="UTC")
+    local = utc.tz_convert(timezone).tz_localize(None).asi8 // 1_000_000_000
+    return local - epochs
+
+def bucket_keys(epochs: np.ndarray, interval: str, session: TradingSession | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (keys, offsets): the local-time bucket start of every epoch and its UTC offset.
+    Intraday buckets are anchored on the local session open of each day, calendar
+    buckets on local dates (weeks start Monday, months on the 1st).
+    """
+    session = session or TradingSession()
+    count, width, kind = parse_interval(interval)
+    offsets = local_offsets(epochs, session.timezone)
+    local = epochs + offsets
+    days = local // 86400
+
+    if kind == "intraday":
+        anchor = days * 86400 + session.open_seconds
+        keys = anchor + (local - anchor) // width * width
+    elif kind == "day":
+        keys = days // count * count * 86400
+    elif kind == "week":
+        # 1970-01-01 was a Thursday, so (days + 3) // 7 counts Mondays
+        keys = ((days + 3) // 7 // count * count * 7 - 3) * 86400
+    else:
+        months = local.astype("datetime64[s]").astype("datetime64[M]").astype("int64")
+        keys = (months // count * count).astype("datetime64[M]").astype("datetime64[s]").astype("int64")
+    return keys, offsets
+
+def resample(bars: np.ndarray, interval: str, session: TradingSession | None = None, *, start: int | None = None, end: int | None = None, session_only: bool = False) -> np.ndarray:
+    """
+    Aggregate bars (a BAR_DTYPE array sorted by datetime, epoch seconds) to any interval
+    in one vectorized pass. Bucket boundaries follow the exchange session's local time;
+    each output bar is stamped with the UTC epoch of its bucket start.
+    `start`/`end` (epoch seconds, inclusive) slice the input with np.searchsorted.
+    `session_only` drops bars outside the session's trading hours and days.
+    """
+    session = session or TradingSession()
+    epochs = bars["datetime"]
+    if len(epochs) > 1 and np.any(epochs[1:] < epochs[:-1]):
+        bars = bars[np.argsort(epochs, kind="stable")]
+        epochs = bars["datetime"]
+    lo = 0 if start is None else np.searchsorted(epochs, start, side="left")
+    hi = len(epochs) if end is None else np.searchsorted(epochs, end, side="right")
+    bars = bars[lo:hi]
+
+    keys, offsets = bucket_keys(bars["datetime"], interval, session)
+    if session_only and len(bars):
+        local = bars["datetime"] + offsets
+        seconds = local % 86400
+        weekday = (local // 86400 + 3) % 7
+        keep = (seconds >= session.open_seconds) & (seconds < session.close_seconds) & np.isin(weekday, session.weekdays)
+        bars, keys, offsets = bars[keep], keys[keep], offsets[keep]
+
+    out = np.empty(0, dtype=BAR_DTYPE)
+    if len(bars) == 0:
+        return out
+    # Bucket runs: keys only change at bucket edges (they can step back across a DST fall-back)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    ends = np.append(starts[1:], len(bars)) - 1
+
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out["datetime"] = keys[starts] - offsets[starts]
+    out["open"] = bars["open"][starts]
+    out["high"] = np.fmax.reduceat(bars["high"], starts)
+    out["low"] = np.fmin.reduceat(bars["low"], starts)
+    out["close"] = bars["close"][ends]
+    out["volume"] = np.add.reduceat(np.nan_to_num(bars["volume"]), starts)
+    return out
@@ -0,0 +1,556 @@
+from database.db import DataBase
+from database.technical_data.historical_prices import RetentionPolicy
+from database.async_db import AsyncDataBase
+from .markets import create_test_exchange
+from .tickers import create_test_market, fetch_exchange_id
+import sqlite3 as sql
+import os
+import threading
+import asyncio
+import tempfile
+import contextlib
+import io
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+test_env_path = os.getenv("TESTING_DATABASE_PATH")
+
+# --- Historical Price Tests ---
+def fetch_test_ticker_id(path = test_env_path):
+    db = DataBase(path)
+    ticker_repo = db.ticker_repo
+    return ticker_repo.get_or_create("TEST_PRICES", 1, fetch_exchange_id("TEST_EXCHANGE"), currency="USD", source="manual")
+
+def make_test_bars(start = "2025-01-02 14:30", periods = 78, freq = "5min"):
+    index = pd.date_range(start, periods=periods, freq=freq, tz="UTC")
+    close = 100 + np.cumsum(np.linspace(-0.5, 0.5, periods))
+    return pd.DataFrame({
+        "Open": close - 0.1,
+        "High": close + 0.25,
+        "Low": close - 0.25,
+        "Close": close,
+        "Volume": np.arange(periods) + 100,
+    }, index=index)
+
+def test_bulk_create(path = test_env_path):
+    db = DataBase(path)
+    prices_repo = db.prices_repo
+    ticker_id = fetch_test_ticker_id(path)
+
+    print("Bulk inserting bars...")
+    bars = make_test_bars()
+    inserted = prices_repo.create_many(ticker_id, bars, chunk_size=20)
+    again = prices_repo.create_many(ticker_id, bars)
+    if inserted == len(bars) and again == 0:
+        print(f"Inserted {inserted} bars, duplicates skipped.")
+        return True
+    else:
+        print(f"Unexpected counts: inserted={inserted}, re-inserted={again}")
+        return False
+
+def test_bulk_upsert(path = test_env_path):
+    db = DataBase(path)
+    prices_repo = db.prices_repo
+    ticker_id = fetch_test_ticker_id(path)
+
+    print("Bulk upserting bars...")
+    bars = make_test_bars(start="2025-01-02 20:30", periods=12)  # 6 overlap the session, 6 new
+    inserted, updated = prices_repo.upsert_many(ticker_id, bars)
+    if inserted == 6 and updated == 6:
+        print(f"Upsert inserted {inserted}, updated {updated}.")
+        return True
+    else:
+        print(f"Unexpected counts: inserted={inserted}, updated={updated}")
+        return False
+
+def test_columnar_read(path = test_env_path):
+    db = DataBase(path)
+    prices_repo = db.prices_repo
+    ticker_id = fetch_test_ticker_id(path)
+
+    print("Reading bars as arrays...")
+    rows = prices_repo.get_info(ticker_id, "5 Minutes", "2025-01-02")
+    array = prices_repo.get_info(ticker_id, "5 Minutes", "2025-01-02", output="numpy")
+    frame = prices_repo.get_close_prices(ticker_id, "2025-01-02", output="pandas")
+    # Epoch-stamped arrays written back must land on the same datetimes
+    raw = prices_repo.fetch_raw(ticker_id, "2025-01-02", output="numpy")
+    written = prices_repo.upsert_many(ticker_id, raw)
+    same = np.array_equal(prices_repo.fetch_raw(ticker_id, "2025-01-02", output="numpy"), raw)
+    expected = pd.Timestamp("2025-01-02 14:30", tz="UTC")
+    if (len(rows) == len(array) == len(frame)
+            and array["datetime"][0] == expected.timestamp()
+            and frame.index[0] == expected
+            and np.allclose(array["close"], [row[5] for row in rows])
+            and written == (0, len(raw)) and same):
+        print(f"Read {len(array)} bars in columnar form.")
+        return True
+    else:
+        print(f"Columnar read does not match row read (array written back: {written}, unchanged: {same}).")
+        return False
+
+def test_rollups(path = test_env_path):
+    db = DataBase(path)
+    prices_repo = db.prices_repo
+    ticker_id = fetch_test_ticker_id(path)
+
+    print("Checking hourly rollups...")
+    daily = prices_repo.get_info(ticker_id, "1 Day", "2025-01-02", output="pandas")
+    hourly = prices_repo.get_info(ticker_id, "1 Hour", "2025-01-02", output="pandas")
+    first_hour = make_test_bars().iloc[:6]  # 14:30 - 14:55
+    expected = [first_hour["Open"].iloc[0], first_hour["High"].max(), first_hour["Low"].min(), first_hour["Close"].iloc[-1], first_hour["Volume"].sum()]
+    if len(daily) == 1 and len(hourly) == 8 and np.allclose(hourly.iloc[0].to_numpy(), expected):
+        print(f"Rollups found: {len(hourly)} hourly bars, {len(daily)} daily bar.")
+        return True
+    else:
+        print("Rollups do not match the stored bars.")
+        return False
+
+def test_resample(path = test_env_path):
+    db = DataBase(path)
+    prices_repo = db.prices_repo
+    ticker_id = fetch_test_ticker_id(path)
+
+    print("Resampling to 30 minute bars...")
+    resampled = prices_repo.resample(ticker_id, "30m", "2025-01-02", output="pandas")
+    bars = make_test_bars().iloc[:72]  # bars before the upsert overlap
+    expected = bars.resample("30min").agg({"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"})
+    if len(resampled) == 14 and np.allclose(resampled.iloc[:12].to_numpy(), expected.iloc[:12].to_numpy()):
+        print(f"Resampled into {len(resampled)} bars.")
+        return True
+    else:
+        print("Resampled bars do not match.")
+        return False
+
+def test_concurrent_reads(path = test_env_path):
+    db = DataBase(path, concurrent=True, readers=2)
+    prices_repo = db.prices_repo
+    ticker_id = fetch_test_ticker_id(path)
+
+    print("Reading while ingesting through the connection pool...")
+    counts, errors = [], []
+    def reader():
+        try:
+            for _ in range(20):
+                counts.append(len(prices_repo.fetch_raw(ticker_id, "2025-01-06", "2025-01-07", output="numpy")))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    inserted = prices_repo.create_many(ticker_id, make_test_bars("2025-01-06 14:30"), chunk_size=10)
+    for thread in threads:
+        thread.join()
+    mode = db.get_custom("PRAGMA journal_mode")[0][0]
+    db.connection.close()
+    if inserted == 78 and not errors and mode == "wal" and all(count in range(0, 79) for count in counts):
+        print(f"Read {len(counts)} snapshots during ingest.")
+        return True
+    else:
+        print(f"Concurrent reads failed: {errors or mode}")
+        return False
+
+def test_pooled_single_writes(path = test_env_path):
+    print("Writing outside a transaction from two threads...")
+    with tempfile.TemporaryDirectory() as folder:
+        pool_path = os.path.join(folder, "pool.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(pool_path).create_db()
+        db = DataBase(pool_path, concurrent=True, readers=2)
+        prices_repo = db.prices_repo
+        exchange_id = db.exchange_repo.get_or_create("TEST_POOL", timezone="UTC")
+        db.market_repo.get_or_create(1, exchange_id)
+        ticker_id = db.ticker_repo.get_or_create("TEST_POOL", 1, exchange_id, currency="USD", source="manual")
+        stamp = pd.Timestamp("2025-01-02 14:30", tz="UTC")
+        # create() never commits: the write lock must not stay with this thread
+        prices_repo.create(ticker_id, stamp, 100.0, open=100.0, high=101.0, low=99.0, volume=10)
+        db.connection.execute("UPDATE historical_prices SET volume = 20 WHERE ticker_id = ?", (ticker_id,))
+        updated = []
+        other = threading.Thread(target=lambda: updated.append(prices_repo.update(ticker_id, stamp, open=100.0, high=102.0, low=99.0, close=101.0, volume=30)), daemon=True)
+        other.start()
+        other.join(timeout=10)
+        blocked = other.is_alive()
+        bars = prices_repo.fetch_raw(ticker_id, "2025-01-02", output="numpy") if not blocked else []
+        if not blocked:
+            db.connection.close()
+    if not blocked and updated == [1] and len(bars) == 1 and bars["close"][0] == 101.0 and bars["volume"][0] == 30:
+        print("Single writes committed and released the writer.")
+        return True
+    else:
+        print(f"Pooled writes failed: blocked {blocked}, updated {updated}, bars {bars}.")
+        return False
+
+def test_cold_tier(path = test_env_path):
+    try:
+        import pyarrow
+    except ImportError:
+        print("pyarrow not installed, skipping cold tier test.")
+        return True
+    print("Moving old bars to the Parquet cold tier...")
+    with tempfile.TemporaryDirectory() as folder:
+        cold_db_path = os.path.join(folder, "cold.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(cold_db_path).create_db()
+        db = DataBase(cold_db_path, cold_path=os.path.join(folder, "cold"))
+        prices_repo = db.prices_repo
+        exchange_id = db.exchange_repo.get_or_create("TEST_COLD", timezone="UTC")
+        db.market_repo.get_or_create(1, exchange_id)
+        ticker_id = db.ticker_repo.get_or_create("TEST_COLD", 1, exchange_id, currency="USD", source="manual")
+        for day in ("2025-01-02", "2025-01-06", "2025-01-07"):
+            prices_repo.create_many(ticker_id, make_test_bars(f"{day} 14:30"))
+
+        before = prices_repo.fetch_raw(ticker_id, "2025-01-01", output="numpy")
+        daily = prices_repo.fetch_daily(ticker_id, "2025-01-01", output="numpy")
+        horizon = timedelta(days=(pd.Timestamp.now(tz="UTC") - pd.Timestamp("2025-01-03", tz="UTC")).days)
+        moved = prices_repo.tier_to_cold(horizon, ticker_id=ticker_id)
+        hot = db.get_custom("SELECT COUNT(*) FROM historical_prices WHERE ticker_id = ?", (ticker_id,))[0][0]
+        after = prices_repo.fetch_raw(ticker_id, "2025-01-01", output="numpy")
+        tiered_daily = prices_repo.fetch_daily(ticker_id, "2025-01-01", output="numpy")
+        # Cold bars must come back as epoch seconds, like the hot ones
+        same_stamps = np.array_equal(after["datetime"], before["datetime"]) and np.array_equal(tiered_daily["datetime"], daily["datetime"])
+        db.close()
+    if moved == 78 and hot == len(before) - 78 and same_stamps and np.array_equal(before, after) and np.array_equal(tiered_daily, daily):
+        print(f"Moved {moved} bars; reads merge both tiers.")
+        return True
+    else:
+        print(f"Cold tier mismatch: moved {moved}, {hot} hot rows left, same timestamps: {same_stamps}.")
+        return False
+
+def test_memmap_store(path = test_env_path):
+    db = DataBase(path)
+    ticker_id = fetch_test_ticker_id(path)
+    with tempfile.TemporaryDirectory() as store_path:
+        memmap_db = DataBase(path, bar_store_path=store_path)
+        prices_repo = memmap_db.prices_repo
+
+        print("Storing bars in memory-mapped column files...")
+        before = db.prices_repo.fetch_raw(ticker_id, "2025-01-01", output="numpy")
+        hourly = db.prices_repo.fetch_hourly(ticker_id, "2025-01-01", output="numpy")
+        # Newest day first, so the older days go through the out-of-order rewrite
+        for day in ("2025-01-06", "2025-01-03", "2025-01-02"):
+            prices_repo.create_many(ticker_id, db.prices_repo.fetch_raw(ticker_id, day, pd.Timestamp(day) + pd.Timedelta(hours=23), output="pandas"))
+        skipped = prices_repo.create_many(ticker_id, make_test_bars())
+        rewritten = prices_repo.upsert_many(ticker_id, prices_repo.fetch_raw(ticker_id, "2025-01-01", output="numpy"))
+        after = prices_repo.fetch_raw(ticker_id, "2025-01-01", output="numpy")
+        same_hourly = np.array_equal(prices_repo.fetch_hourly(ticker_id, "2025-01-01", output="numpy"), hourly)
+        view = prices_repo.columns(ticker_id, "2025-01-02", "2025-01-02 23:59")["close"]
+        deleted = prices_repo.delete_days(ticker_id, "2025-01-06", "2025-01-06 23:59")
+        memmap_db.close()
+        if skipped == 0 and rewritten == (0, len(before)) and np.array_equal(before, after) and same_hourly and isinstance(view, np.memmap) and deleted == 78:
+            print(f"Memmap store matches SQLite for {len(after)} bars.")
+            return True
+        else:
+            print(f"Memmap store mismatch: {len(after)} of {len(before)} bars, {deleted} deleted.")
+            return False
+
+def test_async_database(path = test_env_path):
+    ticker_id = fetch_test_ticker_id(path)
+
+    print("Persisting bars from an event loop...")
+    async def ingest():
+        async with AsyncDataBase(path) as adb:
+            ticks = 0
+            async def heartbeat():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+            pump = asyncio.create_task(heartbeat())
+            # Pages are queued without awaiting, as while IB requests are in flight
+            pages = [adb.prices_repo.upsert_many(ticker_id, make_test_bars(f"2025-01-0{day} 14:30")) for day in (7, 8, 9)]
+            failed = adb.ticker_repo.create("TEST_PRICES", 1, -1, currency="USD", source="manual")
+            await adb.flush()
+            pump.cancel()
+            stored = await adb.prices_repo.fetch_raw(ticker_id, "2025-01-07", output="numpy")
+            await adb.prices_repo.delete_days(ticker_id, "2025-01-07", "2025-01-09 23:59")
+            return [page.result() for page in pages], failed.exception() is not None, len(stored), ticks
+    written, rejected, count, ticks = asyncio.run(ingest())
+    if written == [(78, 0)] * 3 and rejected and count == 234 and ticks > 0:
+        print(f"Persisted {count} bars without blocking the loop.")
+        return True
+    else:
+        print(f"Async ingest mismatch: {written}, {count} bars stored.")
+        return False
+
+def test_async_failed_start(path = test_env_path):
+    print("Queueing calls while the database thread fails to start...")
+    async def queue_calls(missing):
+        adb = AsyncDataBase(missing)
+        calls = []
+        for _ in range(500):
+            try:
+                calls.append(adb.get_custom("SELECT 1"))
+            except sql.OperationalError:
+                # Raised once the failed start is seen
+                break
+        done, pending = await asyncio.wait(calls, timeout=10) if calls else (set(), set())
+        return len(calls), len(pending), all(call.exception() is not None for call in done)
+    with tempfile.TemporaryDirectory() as folder:
+        calls, pending, failed = asyncio.run(queue_calls(os.path.join(folder, "missing", "prices.db")))
+    if pending == 0 and failed:
+        print(f"All {calls} calls failed with the start error.")
+        return True
+    else:
+        print(f"Failed start left {pending} of {calls} calls pending.")
+        return False
+
+def test_retention(path = test_env_path):
+    print("Compacting aged bars under a retention policy...")
+    with tempfile.TemporaryDirectory() as folder:
+        retention_path = os.path.join(folder, "retention.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(retention_path).create_db()
+        db = DataBase(retention_path)
+        prices_repo = db.prices_repo
+        exchange_id = db.exchange_repo.get_or_create("TEST_RETENTION", timezone="UTC")
+        db.market_repo.get_or_create(1, exchange_id)
+        ticker_id = db.ticker_repo.get_or_create("TEST_RETENTION", 1, exchange_id, currency="USD", source="manual")
+        for day in pd.bdate_range("2024-01-02", periods=40):
+            prices_repo.create_many(ticker_id, make_test_bars(f"{day.date()} 14:30"))
+        base_cutoff, hourly_cutoff = pd.Timestamp("2024-02-01", tz="UTC"), pd.Timestamp("2024-01-16", tz="UTC")
+        expected = len(prices_repo.fetch_raw(ticker_id, "2024-01-01", base_cutoff - pd.Timedelta(seconds=1), output="numpy"))
+        hourly = prices_repo.fetch_hourly(ticker_id, hourly_cutoff, output="numpy")
+        daily = prices_repo.fetch_daily(ticker_id, "2024-01-01", output="numpy")
+        pages = db.get_custom("PRAGMA page_count")[0][0]
+
+        # Stopped after two chunks, then resumed later with the cutoffs of the first run
+        policy = RetentionPolicy(raw=timedelta(days=14), hourly=timedelta(days=30), chunk_size=200, vacuum_pages=5)
+        first = prices_repo.enforce_retention(policy, now="2024-02-15 12:00", max_chunks=2)
+        second = prices_repo.enforce_retention(policy, now="2024-03-15 12:00")
+        bars = first.bars + second.bars
+        kept = prices_repo.fetch_raw(ticker_id, "2024-01-01", output="numpy")
+        same_hourly = np.array_equal(prices_repo.fetch_hourly(ticker_id, "2024-01-01", output="numpy"), hourly)
+        five_minute = len(prices_repo.fetch_five_minute(ticker_id, "2024-01-01", base_cutoff - pd.Timedelta(seconds=1), output="numpy"))
+        freed = db.get_custom("PRAGMA freelist_count")[0][0] == 0 and db.get_custom("PRAGMA page_count")[0][0] < pages
+        # A late write into the compacted range must not rebuild rollups from it
+        prices_repo.create_many(ticker_id, make_test_bars("2024-01-03 14:30", periods=3))
+        same_daily = np.array_equal(prices_repo.fetch_daily(ticker_id, "2024-01-01", output="numpy"), daily)
+        db.close()
+    if (not first.complete and second.complete and bars == expected and first.five_minute + second.five_minute == expected
+            and len(kept) == 40 * 78 - expected and kept["datetime"].min() >= base_cutoff.timestamp()
+            and same_hourly and five_minute == 0 and same_daily and freed):
+        print(f"Compacted {bars} bars and {first.hourly + second.hourly} hourly rollups; released {first.vacuumed_pages + second.vacuumed_pages} pages.")
+        return True
+    else:
+        print(f"Retention mismatch: {bars} of {expected} bars, hourly kept: {same_hourly}, daily kept: {same_daily}, pages freed: {freed}.")
+        return False
+
+def test_memmap_retention(path = test_env_path):
+    print("Pruning aged bars from the memmap store...")
+    with tempfile.TemporaryDirectory() as folder:
+        retention_path = os.path.join(folder, "retention.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(retention_path).create_db()
+        policy = RetentionPolicy(raw=timedelta(days=14))
+        db = DataBase(retention_path, bar_store_path=os.path.join(folder, "bars"), retention=policy)
+        prices_repo = db.prices_repo
+        exchange_id = db.exchange_repo.get_or_create("TEST_RETENTION", timezone="UTC")
+        db.market_repo.get_or_create(1, exchange_id)
+        ids = db.ticker_repo.get_or_create_many(["TEST_RETENTION_A", "TEST_RETENTION_B"], 1, exchange_id, currency="USD", source="manual")
+        for ticker_id in ids.values():
+            for day in pd.bdate_range("2024-01-02", periods=40):
+                prices_repo.create_many(ticker_id, make_test_bars(f"{day.date()} 14:30"))
+        cutoff = pd.Timestamp("2024-02-01", tz="UTC")
+        ticker_id = ids["TEST_RETENTION_A"]
+        expected = len(prices_repo.fetch_raw(ticker_id, "2024-01-01", cutoff - pd.Timedelta(seconds=1), output="numpy"))
+        daily = prices_repo.fetch_daily(ticker_id, cutoff, output="numpy")
+
+        # Stopped after one ticker, then finished by the next run
+        first = prices_repo.enforce_retention(policy, now="2024-02-15 12:00", max_chunks=1)
+        second = prices_repo.enforce_retention(policy, now="2024-02-15 12:00")
+        kept = prices_repo.fetch_raw(ticker_id, "2024-01-01", output="numpy")
+        same_daily = np.array_equal(prices_repo.fetch_daily(ticker_id, "2024-01-01", output="numpy"), daily)
+        gaps = prices_repo.missing_ranges(ticker_id, 300, "2024-01-02", cutoff)
+        db.close()
+    if (not first.complete and second.complete and first.bars == second.bars == expected
+            and len(kept) == 40 * 78 - expected and kept["datetime"].min() >= cutoff.timestamp() and same_daily and gaps):
+        print(f"Pruned {first.bars + second.bars} bars from the bar store.")
+        return True
+    else:
+        print(f"Memmap retention mismatch: {first.bars + second.bars} of {2 * expected} bars, daily kept: {same_daily}, gaps reported: {bool(gaps)}.")
+        return False
+
+def test_adjusted_reads(path = test_env_path):
+    db = DataBase(path)
+    prices_repo = db.prices_repo
+    ticker_id = db.ticker_repo.get_or_create("TEST_ACTIONS", 1, fetch_exchange_id("TEST_EXCHANGE"), currency="USD", source="manual")
+
+    print("Reading split and dividend adjusted bars...")
+    days = pd.date_range("2024-03-01", periods=10, freq="D", tz="UTC")
+    prices_repo.create_many(ticker_id, pd.DataFrame({"Open": 100.0, "High": 101.0, "Low": 99.0, "Close": 100.0, "Volume": 1000}, index=days))
+    # yfinance reports the dividend in post-split shares: 0.5 is 1.0 per share on the ex-date
+    actions = pd.DataFrame({"Dividends": [0.5, 0.0], "Stock Splits": [0.0, 2.0]}, index=pd.DatetimeIndex(["2024-03-05", "2024-03-08"], tz="America/New_York"))
+    db.actions_repo.upsert_many(ticker_id, actions)
+    raw = prices_repo.fetch_raw(ticker_id, "2024-03-01", output="numpy")
+    adjusted = prices_repo.fetch_raw(ticker_id, "2024-03-01", output="numpy", adjusted=True)
+    closes = prices_repo.get_close_prices(ticker_id, "2024-03-01", output="numpy", adjusted=True)
+    daily = prices_repo.fetch_daily(ticker_id, "2024-03-01", output="pandas", adjusted=True)
+    cached = db.registry.cached_relation("adjustment_factors", ticker_id) is not None
+    # Every ex-date in one lookup; one without a close in the two weeks before it stays NaN
+    ex = np.array([pd.Timestamp(day, tz="UTC").timestamp() for day in ("2024-03-05", "2024-01-10", "2024-03-12")], dtype="int64")
+    before = prices_repo._closes_before(ticker_id, ex)
+    db.actions_repo.upsert_many(ticker_id, actions)
+    factors = [action.factor for action in db.actions_repo.get_actions(ticker_id)]
+    db.ticker_repo.delete(ticker_id=ticker_id)
+    expected = np.repeat([100.0 * 0.99 * 0.5, 50.0, 100.0], [4, 3, 3])
+    if ((raw["close"] == 100.0).all() and np.allclose(adjusted["close"], expected) and np.allclose(closes["close"], expected)
+            and np.allclose(daily["close"].to_numpy(), expected) and (adjusted["volume"][:7] == 2000).all() and (adjusted["volume"][7:] == 1000).all()
+            and cached and np.allclose(factors, [0.99, 0.5]) and np.allclose(before, [100.0, np.nan, 100.0], equal_nan=True)):
+        print("Adjusted reads applied the cached factors; raw bars untouched.")
+        return True
+    else:
+        print(f"Adjusted reads mismatch: {adjusted['close'].tolist()}, factors {factors}, closes before {before}, cached: {cached}.")
+        return False
+
+def test_missing_ranges(path = test_env_path):
+    print("Finding coverage gaps on the exchange calendar...")
+    with tempfile.TemporaryDirectory() as folder:
+        coverage_path = os.path.join(folder, "coverage.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(coverage_path).create_db()
+        db = DataBase(coverage_path)
+        prices_repo = db.prices_repo
+        exchange_id = db.exchange_repo.get_or_create("NYSE", timezone="America/New_York")
+        db.market_repo.get_or_create(1, exchange_id)
+        ticker_id = db.ticker_repo.get_or_create("TEST_COVERAGE", 1, exchange_id, currency="USD", source="manual")
+        for day in ("2024-03-04", "2024-03-05", "2024-03-07"):
+            prices_repo.create_many(ticker_id, make_test_bars(f"{day} 14:30"))
+        prices_repo.upsert_many(ticker_id, make_test_bars("2024-03-08 14:30", periods=39), resolution=300)
+        ts = lambda text: pd.Timestamp(text, tz="UTC")
+        gaps = prices_repo.missing_ranges(ticker_id, 300, "2024-03-04", "2024-03-12")
+        hourly = prices_repo.missing_ranges(ticker_id, 3600, "2024-03-04", "2024-03-12")
+        intervals = db.get_custom("SELECT COUNT(*) FROM price_coverage WHERE ticker_id = ?", (ticker_id,))[0][0]
+        # A requested window that came back empty (e.g. a halt) still counts as covered
+        prices_repo.create_many(ticker_id, [], resolution=300, covered=("2024-03-06 14:30", "2024-03-06 21:00"))
+        filled = prices_repo.missing_ranges(ticker_id, 300, "2024-03-04", "2024-03-12")
+        merged = db.get_custom("SELECT COUNT(*) FROM price_coverage WHERE ticker_id = ?", (ticker_id,))[0][0]
+        prices_repo.delete_days(ticker_id, "2024-03-05", "2024-03-05 23:59:59")
+        deleted = prices_repo.missing_ranges(ticker_id, 300, "2024-03-04", "2024-03-07")
+        db.close()
+    expected = [(ts("2024-03-06 14:30"), ts("2024-03-06 21:00")), (ts("2024-03-08 17:45"), ts("2024-03-11 20:00"))]
+    if (gaps == expected and hourly == expected and intervals == 2 and filled == expected[1:] and merged == 1
+            and deleted == [(ts("2024-03-05 14:30"), ts("2024-03-05 21:00"))]):
+        print(f"Found {len(gaps)} gaps to backfill across {intervals} covered intervals.")
+        return True
+    else:
+        print(f"Coverage mismatch: gaps {gaps}, after fill {filled}, after delete {deleted}, {intervals}/{merged} intervals.")
+        return False
+
+def test_epoch_migration(path = test_env_path):
+    print("Migrating a text layout database to epoch seconds...")
+    with tempfile.TemporaryDirectory() as folder:
+        migration_path = os.path.join(folder, "migration.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(migration_path).create_db(layout="text")
+        db = DataBase(migration_path)
+        prices_repo = db.prices_repo
+        exchange_id = db.exchange_repo.get_or_create("TEST_MIGRATION", timezone="UTC")
+        db.market_repo.get_or_create(1, exchange_id)
+        ticker_id = db.ticker_repo.get_or_create("TEST_MIGRATION", 1, exchange_id, currency="USD", source="manual")
+        for day in pd.bdate_range("2024-01-02", periods=5):
+            prices_repo.create_many(ticker_id, make_test_bars(f"{day.date()} 14:30"))
+        before = prices_repo.fetch_raw(ticker_id, "2024-01-01", output="numpy")
+
+        # Every batch copied, then the swap fails: the next run picks up at the swap
+        db.connection.set_authorizer(lambda action, *args: sql.SQLITE_DENY if action == sql.SQLITE_DROP_TABLE else sql.SQLITE_OK)
+        try:
+            prices_repo.migrate_to_epoch(batch_size=100)
+            interrupted = False
+        except sql.DatabaseError:
+            interrupted = True
+        db.connection.set_authorizer(None)
+        state = db.get_custom("SELECT state FROM maintenance_state WHERE job = ?", (prices_repo.MIGRATION_JOB,))
+        # Written between the runs: the triggers still mirror it
+        prices_repo.create_many(ticker_id, make_test_bars("2024-01-09 14:30"))
+        resumed = prices_repo.migrate_to_epoch(batch_size=100)
+        again = prices_repo.migrate_to_epoch(batch_size=100)
+        after = prices_repo.fetch_raw(ticker_id, "2024-01-01", output="numpy")
+        layout = prices_repo.detect_layout()
+        db.close()
+    if (interrupted and state == [('["done"]',)] and resumed == 0 and again == 0 and layout == "epoch"
+            and len(after) == len(before) + 78 and np.array_equal(after[:len(before)], before)):
+        print(f"Migrated {len(after)} bars across an interrupted swap.")
+        return True
+    else:
+        print(f"Migration mismatch: interrupted {interrupted}, state {state}, {len(after)} of {len(before) + 78} bars, layout {layout}.")
+        return False
+
+def test_prices_deletion(path = test_env_path):
+    db = DataBase(path)
+    ticker_repo = db.ticker_repo
+    prices_repo = db.prices_repo
+
+    print("Deleting price history...")
+    ticker_id = fetch_test_ticker_id(path)
+    prices_repo.delete(ticker_id)
+    ticker_repo.delete(ticker_id=ticker_id)
+    remaining = db.get_custom("SELECT COUNT(*) FROM historical_prices WHERE ticker_id = ?", (ticker_id,))[0][0]
+    if remaining == 0:
+        print("Price history successfully deleted.")
+        return True
+    else:
+        print("Failed to delete price history.")
+        return False
+
+def historical_price_tests():
+    print("HISTORICAL PRICE TESTS")
+    create_test_exchange()
+    create_test_market()
+    check = True
+    if not test_bulk_create():
+        print("Bulk create test failed.")
+        check = False
+    if not test_bulk_upsert():
+        print("Bulk upsert test failed.")
+        check = False
+    if not test_columnar_read():
+        print("Columnar read test failed.")
+        check = False
+    if not test_rollups():
+        print("Rollup test failed.")
+        check = False
+    if not test_resample():
+        print("Resample test failed.")
+        check = False
+    if not test_concurrent_reads():
+        print("Concurrent read test failed.")
+        check = False
+    if not test_pooled_single_writes():
+        print("Pooled single write test failed.")
+        check = False
+    if not test_cold_tier():
+        print("Cold tier test failed.")
+        check = False
+    if not test_async_database():
+        print("Async database test failed.")
+        check = False
+    if not test_async_failed_start():
+        print("Async failed start test failed.")
+        check = False
+    if not test_memmap_store():
+        print("Memmap store test failed.")
+        check = False
+    if not test_retention():
+        print("Retention test failed.")
+        check = False
+    if not test_memmap_retention():
+        print("Memmap retention test failed.")
+        check = False
+    if not test_adjusted_reads():
+        print("Adjusted reads test failed.")
+        check = False
+    if not test_missing_ranges():
+        print("Missing ranges test failed.")
+        check = False
+    if not test_epoch_migration():
+        print("Epoch migration test failed.")
+        check = False
+    if not test_prices_deletion():
+        print("Price deletion test failed.")
+        check = False
+    if check:
+        print("All historical price tests passed.")
+    else:
+        print("Some historical price tests failed.")
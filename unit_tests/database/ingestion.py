@@ -0,0 +1,224 @@
+from database.db import DataBase
+from database.async_db import AsyncDataBase
+from database.ingestion.backfill import HistoricalBackfill
+from database.ingestion.pacing import Pacing
+from database.ingestion.realtime import RealTimeBarStream, watchlist
+from types import SimpleNamespace
+import os
+import time
+import asyncio
+import tempfile
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+test_env_path = os.getenv("TESTING_DATABASE_PATH")
+
+# --- Ingestion Tests ---
+class FakeRequestError(Exception):
+    """Stands in for ib_insync's RequestError."""
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+class FakeIB:
+    """Serves 5-minute NYSE session bars for any window, refusing the first `violations` requests for pacing."""
+    RaiseRequestErrors = False
+
+    def __init__(self, violations = 1):
+        self.violations = violations
+        self.calls = []
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH, formatDate = 1, timeout = 60):
+        self.calls.append((time.monotonic(), contract, endDateTime, durationStr))
+        await asyncio.sleep(0.001)
+        if self.violations:
+            self.violations -= 1
+            raise FakeRequestError(162, "Historical Market Data Service error message:API historical data query cancelled: pacing violation")
+        amount, unit = durationStr.split()
+        end = pd.Timestamp(endDateTime.replace("-", " "), tz="UTC")
+        index = pd.date_range(end - pd.Timedelta(seconds=int(amount) * {"S": 1, "D": 86400}[unit]), end, freq="5min", inclusive="left")
+        local = index.tz_convert("America/New_York")
+        minutes = local.hour * 60 + local.minute
+        index = index[(local.weekday < 5) & (minutes >= 570) & (minutes < 960)]
+        return [SimpleNamespace(date=stamp.to_pydatetime(), open=1.0, high=1.0, low=1.0, close=1.0, volume=10) for stamp in index]
+
+def test_historical_backfill(path = test_env_path):
+    print("Backfilling a universe under IB pacing limits...")
+    with tempfile.TemporaryDirectory() as folder:
+        backfill_path = os.path.join(folder, "backfill.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(backfill_path).create_db()
+        db = DataBase(backfill_path)
+        exchange_id = db.exchange_repo.get_or_create("NYSE", timezone="America/New_York")
+        db.market_repo.get_or_create(1, exchange_id)
+        ids = db.ticker_repo.get_or_create_many(["TEST_A", "TEST_B", "TEST_C"], 1, exchange_id, currency="USD", source="ibkr")
+        db.close()
+
+        ib = FakeIB()
+        pacing = Pacing(requests=4, window=0.3, per_contract=2, contract_window=0.1, identical_gap=0.05, in_flight=3)
+        async def backfill():
+            async with AsyncDataBase(backfill_path) as adb:
+                contracts = {ticker_id: symbol for symbol, ticker_id in ids.items()}
+                first = await HistoricalBackfill(ib, adb, bar_size="5 mins", pacing=pacing).run(contracts, "2024-03-04", "2024-03-16")
+                again = await HistoricalBackfill(ib, adb, bar_size="5 mins", pacing=pacing).run(contracts, "2024-03-04", "2024-03-16")
+                stored = [len(await adb.prices_repo.fetch_raw(ticker_id, "2024-03-01", output="numpy")) for ticker_id in ids.values()]
+                return first, again, stored
+        first, again, stored = asyncio.run(backfill())
+    times = np.array(sorted(call[0] for call in ib.calls))
+    paced = bool((times[pacing.requests:] - times[:-pacing.requests] >= pacing.window * 0.95).all())
+    if (first.bars == 3 * 780 and stored == [780] * 3 and first.requests == 7 and first.retries == 1 and first.pacing_violations == 1
+            and not first.failed and again.requests == 0 and paced and not ib.RaiseRequestErrors):
+        print(f"Backfilled {first.bars} bars in {first.requests} requests; the rerun requested nothing.")
+        return True
+    else:
+        print(f"Backfill mismatch: {first}, rerun {again.requests} requests, stored {stored}, paced: {paced}.")
+        return False
+
+class FakeEvent:
+    """Stands in for ib_insync's eventkit Event (+= connects a handler, -= disconnects it)."""
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.handlers.remove(handler)
+        return self
+
+    def emit(self, *args):
+        for handler in list(self.handlers):
+            handler(*args)
+
+class FakeBarList(list):
+    def __init__(self, contract, bars = ()):
+        super().__init__(bars)
+        self.contract = contract
+        self.updateEvent = FakeEvent()
+
+    def push(self, bar):
+        self.append(bar)
+        self.updateEvent.emit(self, True)
+
+class FakeStreamingIB:
+    """Hands out bar lists for reqRealTimeBars / keepUpToDate requests; the test pushes bars into them."""
+    def __init__(self, history = 0):
+        self.history = history
+        self.streams = {}
+        self.cancelled = []
+
+    def reqRealTimeBars(self, contract, barSize, whatToShow, useRTH, realTimeBarsOptions = []):
+        self.streams[contract] = FakeBarList(contract)
+        return self.streams[contract]
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH, formatDate = 1, keepUpToDate = False, timeout = 60):
+        start = pd.Timestamp("2024-03-04 14:30", tz="UTC")
+        history = [SimpleNamespace(date=(start + pd.Timedelta(minutes=5 * i)).to_pydatetime(), open=1.0, high=1.0, low=1.0, close=1.0, volume=10) for i in range(self.history)]
+        self.streams[contract] = FakeBarList(contract, history)
+        return self.streams[contract]
+
+    def cancelRealTimeBars(self, bars):
+        self.cancelled.append(bars.contract)
+
+    def cancelHistoricalData(self, bars):
+        self.cancelled.append(bars.contract)
+
+def _streaming_db(folder, symbols):
+    path = os.path.join(folder, "stream.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        DataBase(path).create_db()
+    db = DataBase(path)
+    exchange_id = db.exchange_repo.get_or_create("NYSE", timezone="America/New_York")
+    db.market_repo.get_or_create(1, exchange_id)
+    ids = db.ticker_repo.get_or_create_many(symbols, 1, exchange_id, currency="USD", source="ibkr")
+    db.close()
+    return path, ids
+
+def test_realtime_stream(path = test_env_path):
+    print("Streaming real-time bars for a watchlist...")
+    symbols = [f"TEST_{i}" for i in range(200)]
+    start = pd.Timestamp("2024-03-04 14:30", tz="UTC")
+    with tempfile.TemporaryDirectory() as folder:
+        stream_path, ids = _streaming_db(folder, symbols)
+        ib = FakeStreamingIB()
+        async def stream():
+            async with AsyncDataBase(stream_path) as adb:
+                contracts = await watchlist(adb, lambda ticker: ticker.symbol, symbols=symbols)
+                async with RealTimeBarStream(ib, adb, bar_size="1 min", flush_interval=0.01, flush_size=150) as live:
+                    await live.subscribe(contracts)
+                    # Two full minutes and the start of a third, 5-second bars, every symbol each tick
+                    for k in range(26):
+                        for symbol in symbols:
+                            ib.streams[symbol].push(SimpleNamespace(time=(start + pd.Timedelta(seconds=5 * k)).to_pydatetime(), open_=1.0 + k, high=2.0 + k, low=0.5 + k, close=1.5 + k, volume=10, wap=1.0, count=1))
+                        await asyncio.sleep(0)
+                handlers = sum(len(bars.updateEvent.handlers) for bars in ib.streams.values())
+                stored = await adb.prices_repo.fetch_raw(ids["TEST_7"], "2024-03-04", output="numpy")
+                gaps = await adb.prices_repo.missing_ranges(ids["TEST_7"], 60, start, start + pd.Timedelta(minutes=2))
+                return live.report, handlers, stored, gaps
+        report, handlers, stored, gaps = asyncio.run(stream())
+    expected = [(1.0, 13.0, 0.5, 12.5, 120.0), (13.0, 25.0, 12.5, 24.5, 120.0)]
+    bars = [(row["open"], row["high"], row["low"], row["close"], row["volume"]) for row in stored]
+    if (report.subscribed == 200 and report.received == 200 * 26 and report.written == 400 and report.flushes > 1 and not report.failed
+            and len(ib.cancelled) == 200 and handlers == 0 and bars == expected and gaps == []):
+        print(f"Wrote {report.written} bars in {report.flushes} flushes, peak buffer {report.peak_buffered}.")
+        return True
+    else:
+        print(f"Stream mismatch: {report}, handlers left {handlers}, bars {bars}, gaps {gaps}.")
+        return False
+
+def test_keep_up_to_date_stream(path = test_env_path):
+    print("Streaming keepUpToDate bars with back-pressure...")
+    symbols = [f"TEST_{i}" for i in range(20)]
+    start = pd.Timestamp("2024-03-04 14:30", tz="UTC")
+    with tempfile.TemporaryDirectory() as folder:
+        stream_path, ids = _streaming_db(folder, symbols)
+        ib = FakeStreamingIB(history=3)
+        pacing = Pacing(requests=100, window=1, per_contract=5, contract_window=1, in_flight=5)
+        async def stream():
+            async with AsyncDataBase(stream_path) as adb:
+                live = RealTimeBarStream(ib, adb, source="keep_up_to_date", bar_size="5 mins", flush_interval=60, flush_size=1, high_water=4, pacing=pacing)
+                await live.subscribe({ids[symbol]: symbol for symbol in symbols})
+                for symbol in symbols:
+                    bars = ib.streams[symbol]
+                    # An update of the forming bar, then a new bar completing it
+                    bars.updateEvent.emit(bars, False)
+                    bars.push(SimpleNamespace(date=(start + pd.Timedelta(minutes=15)).to_pydatetime(), open=1.0, high=1.0, low=1.0, close=1.0, volume=10))
+                await live.stop()
+                stored = [len(await adb.prices_repo.fetch_raw(ids[symbol], "2024-03-04", output="numpy")) for symbol in symbols]
+                gaps = [await adb.prices_repo.missing_ranges(ids[symbol], 300, start, start + pd.Timedelta(minutes=15)) for symbol in symbols]
+                return live.report, stored, gaps
+        report, stored, gaps = asyncio.run(stream())
+    dropped_gap = [(start + pd.Timedelta(minutes=10), start + pd.Timedelta(minutes=15))]
+    # The history fits (subscriptions wait for room); the burst of new bars overruns the buffer
+    if (report.subscribed == 20 and report.received == 60 and report.stalls > 0 and report.dropped > 0
+            and report.written + report.dropped == 60 and report.written >= 40 and sum(stored) == report.written
+            and min(stored) >= 2 and report.peak_buffered <= 4 and len(ib.cancelled) == 20
+            and all(gap == ([] if count == 3 else dropped_gap) for count, gap in zip(stored, gaps))):
+        print(f"Wrote {report.written} bars, dropped {report.dropped} over the high-water mark; subscriptions waited on the flusher {report.stalls} times.")
+        return True
+    else:
+        print(f"keepUpToDate mismatch: {report}, stored {stored}, gaps {gaps[:3]}.")
+        return False
+
+def ingestion_tests():
+    print("INGESTION TESTS")
+    check = True
+    if not test_historical_backfill():
+        print("Historical backfill test failed.")
+        check = False
+    if not test_realtime_stream():
+        print("Real-time stream test failed.")
+        check = False
+    if not test_keep_up_to_date_stream():
+        print("keepUpToDate stream test failed.")
+        check = False
+    if check:
+        print("All ingestion tests passed.")
+    else:
+        print("Some ingestion tests failed.")
@@ -0,0 +1,254 @@
+from database.db import DataBase
+from .markets import create_test_exchange
+from .tickers import create_test_market, fetch_exchange_id
+import sqlite3 as sql
+import os
+import io
+import time
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+test_env_path = os.getenv("TESTING_DATABASE_PATH")
+
+# --- Option Chain Tests ---
+def fetch_option_ticker_id(path = test_env_path):
+    db = DataBase(path)
+    return db.ticker_repo.get_or_create("TEST_OPTIONS", 1, fetch_exchange_id("TEST_EXCHANGE"), currency="USD", source="manual")
+
+def make_test_chain(quote_time = "2025-01-02 15:00", expiries = ("2025-01-17", "2025-02-21"), strikes = 200, spot = 100.0):
+    """A chain frame in the layout OptionsData.chain returns."""
+    frames = []
+    for expiry in expiries:
+        for right in ("C", "P"):
+            strike = np.round(np.linspace(0.5, 1.5, strikes) * spot, 2)
+            intrinsic = np.maximum(spot - strike, 0) if right == "C" else np.maximum(strike - spot, 0)
+            bid = intrinsic + 0.5
+            frames.append(pd.DataFrame({
+                "ticker": "TEST_OPTIONS",
+                "expiry": pd.Timestamp(expiry, tz="UTC"),
+                "right": right,
+                "strike": strike,
+                "bid": bid,
+                "ask": bid + 0.1,
+                "last": np.where(np.arange(strikes) % 5 == 0, np.nan, bid + 0.05),
+                "volume": np.arange(strikes, dtype=float),
+                "open_interest": np.arange(strikes, dtype=float) * 10,
+                "quote_time": pd.Timestamp(quote_time, tz="UTC"),
+            }))
+    chain = pd.concat(frames, ignore_index=True)
+    chain["underlying"] = spot
+    chain["mid"] = chain["px"] = 0.5 * (chain["bid"] + chain["ask"])
+    return chain
+
+def test_snapshot_ingest(path = test_env_path):
+    db = DataBase(path)
+    options_repo = db.options_repo
+    ticker_id = fetch_option_ticker_id(path)
+
+    print("Ingesting option chain snapshots...")
+    chain = make_test_chain()
+    first = options_repo.ingest_snapshot(chain, ticker_id)
+    start = time.perf_counter()
+    second = options_repo.ingest_snapshot(make_test_chain("2025-01-02 15:05"))
+    elapsed = time.perf_counter() - start
+    snapshot = options_repo.get_snapshot(ticker_id)
+    contract = options_repo.get_by_symbol("TEST_OPTIONS250117C00050000")
+    if first == (800, 800) and second == (0, 800) and len(snapshot) == 800 and (snapshot["quote_time"] == pd.Timestamp("2025-01-02 15:05", tz="UTC")).all() and contract is not None and contract.strike == 50.0:
+        print(f"Stored {first[0]} contracts; repeat snapshot of {second[1]} quotes took {elapsed * 1e3:.1f} ms.")
+        return True
+    else:
+        print(f"Snapshot ingest mismatch: {first}, {second}, {len(snapshot)} quotes read back.")
+        return False
+
+def test_snapshot_rollback(path = test_env_path):
+    db = DataBase(path)
+    options_repo = db.options_repo
+    ticker_id = fetch_option_ticker_id(path)
+
+    print("Rolling back a failed snapshot...")
+    chain = make_test_chain("2025-01-02 15:10", expiries=("2025-03-21",), strikes=10)
+    contracts = len(options_repo.get_chain(ticker_id))
+    try:
+        with db.transaction():
+            options_repo.ingest_snapshot(chain, ticker_id)
+            raise RuntimeError("feed dropped")
+    except RuntimeError:
+        pass
+    rolled_back = len(options_repo.get_chain(ticker_id)) == contracts
+    created, quotes = options_repo.ingest_snapshot(chain, ticker_id)
+    if rolled_back and created == 20 and quotes == 20:
+        print("Failed snapshot left no contracts behind.")
+        return True
+    else:
+        print("Rolled back contracts are still cached or stored.")
+        return False
+
+class FlatCurve:
+    """Stands in for datahub's YieldCurve (only r_cc_vec is used)."""
+    def r_cc_vec(self, T):
+        return np.full(len(T), 0.04)
+
+def test_surface_arrays(path = test_env_path):
+    db = DataBase(path)
+    options_repo = db.options_repo
+    ticker_id = fetch_option_ticker_id(path)
+
+    print("Reading the option surface as pricer arrays...")
+    K, P, S, r, q, T, cp = options_repo.surface_arrays(ticker_id, "2025-01-02 15:07", curve=FlatCurve(), q=0.01)
+    latest = options_repo.surface_arrays(ticker_id, "2025-01-02 15:10")
+    recent = options_repo.surface_arrays(ticker_id, "2025-01-02 15:10", max_age=pd.Timedelta(minutes=1), curve=lambda T: 0.05)
+    arrays_ok = all(a.flags.c_contiguous and a.dtype == np.float64 for a in (K, P, S, r, q, T)) and cp.dtype == np.int32
+    first_T = (pd.Timestamp("2025-01-17", tz="UTC") - pd.Timestamp("2025-01-02 15:07", tz="UTC")).total_seconds() / (365 * 24 * 3600)
+    values_ok = (
+        len(K) == 800 and np.isclose(T[0], first_T) and (S == 100.0).all() and (r == 0.04).all() and (q == 0.01).all()
+        and set(cp.tolist()) == {1, -1} and np.allclose(P[:200], np.maximum(100.0 - K[:200], 0) + 0.55)
+    )
+    if arrays_ok and values_ok and len(latest.K) == 820 and len(recent.K) == 20 and (recent.r == 0.05).all():
+        print(f"Surface of {len(K)} contracts read as contiguous arrays.")
+        return True
+    else:
+        print(f"Surface arrays mismatch: {len(K)}, {len(latest.K)}, {len(recent.K)} contracts, arrays ok: {arrays_ok}.")
+        return False
+
+def test_delta_ingest(path = test_env_path):
+    db = DataBase(path)
+    options_repo = db.options_repo
+    ticker_id = db.ticker_repo.get_or_create("TEST_DELTA", 1, fetch_exchange_id("TEST_EXCHANGE"), currency="USD", source="manual")
+
+    print("Ingesting change-only option snapshots...")
+    first = make_test_chain("2025-01-02 15:00", expiries=("2025-01-17",), strikes=50)
+    moved = make_test_chain("2025-01-02 15:05", expiries=("2025-01-17",), strikes=50)
+    moved.loc[:9, ["bid", "ask", "mid", "px"]] += 0.25
+    same = moved.assign(quote_time=pd.Timestamp("2025-01-02 15:10", tz="UTC"))
+    written = [
+        options_repo.ingest_snapshot(first, ticker_id, delta=True),
+        options_repo.ingest_snapshot(moved, ticker_id, delta=True),
+        options_repo.ingest_snapshot(same, ticker_id, delta=True),
+        # An older snapshot fills in history, so it is stored in full
+        options_repo.ingest_snapshot(first, ticker_id, quote_time="2025-01-02 14:55", delta=True),
+    ]
+    rows = db.get_custom("SELECT COUNT(*) FROM option_prices p JOIN option_chains c ON c.option_id = p.option_id WHERE c.ticker_id = ?", (ticker_id,))[0][0]
+    latest = options_repo.get_snapshot(ticker_id)
+    earlier = options_repo.get_snapshot(ticker_id, "2025-01-02 15:03")
+    surface = options_repo.surface_arrays(ticker_id, "2025-01-02 15:10")
+    db.ticker_repo.delete(ticker_id=ticker_id)
+    filled = (
+        len(latest) == 100 and (latest["quote_time"] == pd.Timestamp("2025-01-02 15:10", tz="UTC")).all()
+        and np.allclose(latest["bid"].to_numpy(), moved["bid"].to_numpy()) and np.allclose(earlier["bid"].to_numpy(), first["bid"].to_numpy())
+        and np.allclose(surface.P, moved["mid"].to_numpy())
+    )
+    if written == [(100, 100), (0, 10), (0, 0), (0, 100)] and rows == 210 and filled:
+        print(f"Stored {rows} quote rows for 400 quotes; as-of reads forward-filled.")
+        return True
+    else:
+        print(f"Delta ingest mismatch: {written}, {rows} rows stored, forward fill ok: {filled}.")
+        return False
+
+def test_late_delta_snapshot(path = test_env_path):
+    db = DataBase(path)
+    options_repo = db.options_repo
+    ticker_id = db.ticker_repo.get_or_create("TEST_LATE", 1, fetch_exchange_id("TEST_EXCHANGE"), currency="USD", source="manual")
+
+    print("Back-filling a snapshot before a delta snapshot that skipped it...")
+    first = make_test_chain("2025-01-02 15:00", expiries=("2025-01-17",), strikes=50)
+    late = make_test_chain("2025-01-02 15:05", expiries=("2025-01-17",), strikes=50)
+    late.loc[:9, ["bid", "ask", "mid", "px"]] += 1.0
+    written = [
+        options_repo.ingest_snapshot(first, ticker_id, delta=True),
+        options_repo.ingest_snapshot(first, ticker_id, quote_time="2025-01-02 15:10", delta=True),
+        # Arrives after 15:10, which stored nothing as the chain had not changed
+        options_repo.ingest_snapshot(late, ticker_id, delta=True),
+        options_repo.ingest_snapshot(first, ticker_id, quote_time="2025-01-02 15:15", delta=True),
+    ]
+    at_late = options_repo.get_snapshot(ticker_id, "2025-01-02 15:05")
+    after = options_repo.get_snapshot(ticker_id, "2025-01-02 15:10")
+    latest = options_repo.get_snapshot(ticker_id)
+    db.ticker_repo.delete(ticker_id=ticker_id)
+    kept = (
+        np.allclose(at_late["bid"].to_numpy(), late["bid"].to_numpy())
+        and np.allclose(after["bid"].to_numpy(), first["bid"].to_numpy())
+        and np.allclose(latest["bid"].to_numpy(), first["bid"].to_numpy())
+    )
+    if written == [(100, 100), (0, 0), (0, 110), (0, 0)] and kept:
+        print("Later snapshots kept their quotes.")
+        return True
+    else:
+        print(f"Late snapshot mismatch: {written}, later snapshots kept: {kept}.")
+        return False
+
+def test_schema_repair(path = test_env_path):
+    print("Repairing the legacy option_chains foreign key...")
+    with tempfile.TemporaryDirectory() as folder:
+        legacy = os.path.join(folder, "legacy.db")
+        con = sql.connect(legacy)
+        con.execute("CREATE TABLE option_chains (option_id INTEGER PRIMARY KEY, ticker_id INTEGER NOT NULL REFERENCES equity_data(ticker_id) ON DELETE CASCADE, symbol TEXT NOT NULL, creation_date DATE, expiration_date DATE NOT NULL, strike_price REAL NOT NULL, option_type TEXT NOT NULL, UNIQUE(ticker_id, expiration_date, strike_price, option_type))")
+        con.execute("CREATE TABLE option_prices (option_id INTEGER NOT NULL REFERENCES option_chains(option_id) ON DELETE CASCADE, datetime DATETIME NOT NULL, bid REAL, ask REAL, last_price REAL NOT NULL, volume INTEGER, open_interest INTEGER, PRIMARY KEY (option_id, datetime))")
+        con.execute("INSERT INTO option_chains VALUES (1, 1, 'X', NULL, '2025-01-17', 10.0, 'C')")
+        con.execute("INSERT INTO option_prices VALUES (1, '2025-01-02 15:00:00', 1.0, 1.1, 1.05, 1, 1)")
+        con.commit()
+        con.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            DataBase(legacy).create_db()
+        db = DataBase(legacy)
+        references = {row[2] for row in db.get_custom("PRAGMA foreign_key_list(option_chains)")}
+        quotes = db.get_custom("SELECT COUNT(*) FROM option_prices")[0][0]
+        columns = {row[1] for row in db.get_custom("PRAGMA table_info(option_prices)")}
+        db.close()
+    if references == {"tickers"} and quotes == 1 and "underlying" in columns:
+        print("option_chains now references tickers; quotes kept.")
+        return True
+    else:
+        print(f"Schema repair failed: {references}, {quotes} quotes.")
+        return False
+
+def test_option_deletion(path = test_env_path):
+    db = DataBase(path)
+    options_repo = db.options_repo
+    ticker_id = fetch_option_ticker_id(path)
+
+    print("Deleting expired contracts and the option ticker...")
+    expired = options_repo.delete_expired("2025-02-01")
+    db.ticker_repo.delete(ticker_id=ticker_id)
+    contracts = db.get_custom("SELECT COUNT(*) FROM option_chains WHERE ticker_id = ?", (ticker_id,))[0][0]
+    orphans = db.get_custom("SELECT COUNT(*) FROM option_prices p LEFT JOIN option_chains c ON c.option_id = p.option_id WHERE c.option_id IS NULL")[0][0]
+    if expired == 400 and contracts == 0 and orphans == 0:
+        print("Expired contracts and cascaded quotes deleted.")
+        return True
+    else:
+        print(f"Option deletion failed: {expired} expired, {contracts} contracts left, {orphans} orphan quotes.")
+        return False
+
+def option_chain_tests():
+    print("OPTION CHAIN TESTS")
+    create_test_exchange()
+    create_test_market()
+    check = True
+    if not test_snapshot_ingest():
+        print("Snapshot ingest test failed.")
+        check = False
+    if not test_snapshot_rollback():
+        print("Snapshot rollback test failed.")
+        check = False
+    if not test_surface_arrays():
+        print("Surface arrays test failed.")
+        check = False
+    if not test_delta_ingest():
+        print("Delta ingest test failed.")
+        check = False
+    if not test_late_delta_snapshot():
+        print("Late delta snapshot test failed.")
+        check = False
+    if not test_schema_repair():
+        print("Schema repair test failed.")
+        check = False
+    if not test_option_deletion():
+        print("Option deletion test failed.")
+        check = False
+    if check:
+        print("All option chain tests passed.")
+    else:
+        print("Some option chain tests failed.")
@@ -0,0 +1,150 @@
+from database.db import DataBase
+from database.instrumentation import Instrumentation
+import os
+import re
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+test_env_path = os.getenv("TESTING_DATABASE_PATH")
+
+# Methods that read or rewrite whole tables by design
+FULL_SCANS = ("get_all", "load_universe", "delete_all", "rebuild_rollups", "migrate_to_epoch")
+
+# Plan steps that walk a whole table (or a whole index) instead of searching it;
+# scans of json_each and constant rows only read the bound parameter
+_SCAN = re.compile(r"^SCAN (?!json_each|CONSTANT ROW)(\w+)")
+_SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)")
+
+# --- Query Plan Tests ---
+def table_scans(plan):
+    """The tables a plan scans in full (walking a materialized subquery is not a table scan)."""
+    subqueries = {match.group(1) for step in plan if (match := _SUBQUERY.match(step))}
+    return [match.group(1) for step in plan if (match := _SCAN.match(step)) and match.group(1) not in subqueries]
+
+def populate_plan_schema(db):
+    """Create a small exchange/market/ticker/equity/price set for the planner to work on."""
+    exchange_id = db.exchange_repo.get_or_create("TEST_PLANS", timezone="UTC")
+    db.market_repo.get_or_create(1, exchange_id)
+    ids = db.ticker_repo.get_or_create_many([f"PLAN_{i}" for i in range(50)], 1, exchange_id, currency="USD", source="manual")
+    db.equity_repo.get_or_create_many([{"ticker_id": ticker_id, "symbol": symbol, "sector": "Test"} for symbol, ticker_id in ids.items()])
+    index = pd.date_range("2025-01-02 14:30", periods=12, freq="5min", tz="UTC")
+    bars = pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": np.arange(12.0), "Volume": 1}, index=index)
+    db.prices_repo.create_many(ids["PLAN_0"], bars)
+    chain = pd.DataFrame({"ticker": "PLAN_0", "expiry": pd.Timestamp("2025-01-17", tz="UTC"), "right": ["C", "P"] * 10, "strike": np.repeat(np.arange(95.0, 105.0), 2), "bid": 1.0, "ask": 1.1, "quote_time": index[0]})
+    db.options_repo.ingest_snapshot(chain, ids["PLAN_0"])
+    return exchange_id, ids
+
+def run_repository_queries(db, exchange_id, ids):
+    """Call every lookup/update/delete access path of the repositories once."""
+    ticker_id = ids["PLAN_0"]
+    calls = [
+        lambda: db.exchange_repo.get_info(exchange_id=exchange_id),
+        lambda: db.exchange_repo.get_info(exchange_name="TEST_PLANS"),
+        lambda: db.exchange_repo.get_many(exchange_names=["TEST_PLANS"]),
+        lambda: db.exchange_repo.update(exchange_id, timezone="UTC"),
+        lambda: db.market_repo.get_info(1, exchange_id),
+        lambda: db.market_repo.get_by_exchange(exchange_id),
+        lambda: db.market_repo.get_many([(1, exchange_id)]),
+        lambda: db.ticker_repo.get_info(ticker_id=ticker_id),
+        lambda: db.ticker_repo.get_info(symbol="PLAN_1"),
+        lambda: db.ticker_repo.get_by_market(1, exchange_id),
+        lambda: db.ticker_repo.get_by_market(1),
+        lambda: db.ticker_repo.get_by_exchange(exchange_id, include=("market", "exchange", "equity")),
+        lambda: db.ticker_repo.get_many(symbols=["PLAN_1", "PLAN_2"], exchange_id=exchange_id),
+        lambda: db.ticker_repo.get_many(ticker_ids=list(ids.values())),
+        lambda: db.ticker_repo.get_or_create("PLAN_1", 1, exchange_id, currency="USD", source="manual"),
+        lambda: db.ticker_repo.update(ids["PLAN_2"], description="plan"),
+        lambda: db.ticker_repo.delete(symbol="PLAN_49"),
+        lambda: db.equity_repo.get_info(ticker_id=ids["PLAN_3"]),
+        lambda: db.equity_repo.get_info(symbol="PLAN_4"),
+        lambda: db.equity_repo.get_many(symbols=["PLAN_5", "PLAN_6"]),
+        lambda: db.equity_repo.update(ids["PLAN_5"], sector="Plans"),
+        lambda: db.equity_repo.delete(symbol="PLAN_48"),
+        lambda: db.prices_repo.fetch_raw(ticker_id, "2025-01-02"),
+        lambda: db.prices_repo.fetch_hourly(ticker_id, "2025-01-02", "2025-01-03"),
+        lambda: db.prices_repo.get_close_prices(ticker_id, "2025-01-02"),
+        lambda: db.prices_repo.upsert_many(ticker_id, db.prices_repo.fetch_raw(ticker_id, "2025-01-02", output="pandas")),
+        lambda: db.prices_repo.missing_ranges(ticker_id, 300, "2025-01-01", "2025-01-10"),
+        lambda: db.prices_repo.delete_days(ticker_id, "2025-01-02 15:00", "2025-01-02 15:30"),
+        lambda: db.actions_repo.upsert_many(ticker_id, [("2025-01-02", "dividend", 0.5), ("2025-01-03", "split", 2.0)]),
+        lambda: db.actions_repo.get_actions(ticker_id, "2025-01-01", "2025-12-31"),
+        lambda: db.prices_repo.fetch_raw(ticker_id, "2025-01-02", adjusted=True),
+        lambda: db.actions_repo.delete(ticker_id),
+        lambda: db.options_repo.get_info(1),
+        lambda: db.options_repo.get_by_symbol("PLAN_0250117C00100000"),
+        lambda: db.options_repo.get_chain(ticker_id, "2025-01-17"),
+        lambda: db.options_repo.expirations(ticker_id),
+        lambda: db.options_repo.get_snapshot(ticker_id),
+        lambda: db.options_repo.get_snapshot(ticker_id, "2025-01-02 15:00", expiration="2025-01-17"),
+        lambda: db.options_repo.get_quotes(1, "2025-01-02"),
+        lambda: db.options_repo.surface_arrays(ticker_id, "2025-01-02 15:00", max_age=pd.Timedelta(hours=1)),
+        lambda: db.options_repo.ingest_snapshot(db.options_repo.get_snapshot(ticker_id).assign(ticker="PLAN_0"), ticker_id),
+        lambda: db.options_repo.delete_expired("2025-01-01"),
+    ]
+    for call in calls:
+        db.registry.invalidate()
+        call()
+
+def test_query_plans(path = test_env_path):
+    instrumentation = Instrumentation(threshold_ms=0, on_slow=None, keep_slow=100_000)
+    db = DataBase(path, trace=instrumentation)
+
+    print("Checking repository query plans for full table scans...")
+    exchange_id, ids = populate_plan_schema(db)
+    instrumentation.reset()
+    run_repository_queries(db, exchange_id, ids)
+    checked, scans = 0, []
+    for query in instrumentation.slow:
+        if not query.plan or query.caller.rsplit(".", 1)[-1] in FULL_SCANS:
+            continue
+        checked += 1
+        if table_scans(query.plan):
+            scans.append(f"{query.caller}: {query.sql}\n    " + "\n    ".join(query.plan))
+    db.exchange_repo.delete(exchange_id=exchange_id)
+    db.close()
+    if checked and not scans:
+        print(f"No full scans in {checked} repository queries.")
+        return True
+    else:
+        print("Queries scanning whole tables:\n" + "\n".join(scans))
+        return False
+
+def test_foreign_key_indexes(path = test_env_path):
+    db = DataBase(path)
+
+    print("Checking that every foreign key has a supporting index...")
+    missing = []
+    tables = [row[0] for row in db.get_custom("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for table in tables:
+        # Leading columns of every index (including primary keys) on the child table
+        prefixes = [[row[2] for row in db.get_custom(f"PRAGMA index_info('{index[1]}')")] for index in db.get_custom(f"PRAGMA index_list('{table}')")]
+        prefixes.append([row[1] for row in sorted(db.get_custom(f"PRAGMA table_info('{table}')"), key=lambda row: row[5]) if row[5]])
+        keys = {}
+        for row in db.get_custom(f"PRAGMA foreign_key_list('{table}')"):
+            keys.setdefault(row[0], []).append(row[3])
+        for columns in keys.values():
+            if not any(prefix[:len(columns)] == columns or sorted(prefix[:len(columns)]) == sorted(columns) for prefix in prefixes):
+                missing.append(f"{table}({', '.join(columns)})")
+    db.close()
+    if not missing:
+        print("Every foreign key is indexed.")
+        return True
+    else:
+        print(f"Unindexed foreign keys (cascades scan the child table): {', '.join(missing)}")
+        return False
+
+def query_plan_tests():
+    print("QUERY PLAN TESTS")
+    check = True
+    if not test_query_plans():
+        print("Query plan test failed.")
+        check = False
+    if not test_foreign_key_indexes():
+        print("Foreign key index test failed.")
+        check = False
+    if check:
+        print("All query plan tests passed.")
+    else:
+        print("Some query plan tests failed.")
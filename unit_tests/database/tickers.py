@@ -1,8 +1,12 @@
 from database.db import DataBase
+from database.instrumentation import Instrumentation
+from database.registry import MISSING
 from .markets import create_test_exchange
 import sqlite3 as sql
 import os
 import time
+import pickle
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -70,6 +74,168 @@ def test_ticker_links(path = test_env_path):
         print("Ticker not found.")
         return False
     
+def test_eager_loading(path = test_env_path):
+    db = DataBase(path)
+    ticker_repo = db.ticker_repo
+
+    print("Loading tickers with their relations in one query...")
+    queries = []
+    db.connection.set_trace_callback(queries.append)
+    tickers = ticker_repo.get_by_exchange(fetch_exchange_id("TEST_EXCHANGE"), include=("market", "exchange", "equity"))
+    linked = [(ticker.market, ticker.exchange, ticker.equity_info) for ticker in tickers]
+    db.connection.set_trace_callback(None)
+    if tickers and len(queries) == 1 and all(market and exchange for market, exchange, _ in linked):
+        print(f"Loaded {len(tickers)} ticker(s) with relations in {len(queries)} query.")
+        return True
+    else:
+        print(f"Eager loading issued {len(queries)} queries.")
+        return False
+
+def test_ticker_universe(path = test_env_path):
+    db = DataBase(path)
+    ticker_repo = db.ticker_repo
+
+    print("Loading compact ticker universe...")
+    universe = ticker_repo.load_universe()
+    usd = universe.filter(market_id=1, exchange_id=fetch_exchange_id("TEST_EXCHANGE"), currency="USD")
+    restored = pickle.loads(pickle.dumps(usd))
+    frame = restored.to_pandas()
+    if len(usd) == 1 and restored[0].symbol == "TEST_TICKER" and frame["currency"].iloc[0] == "USD" and universe.get(restored[0].id) == restored[0]:
+        print(f"Universe of {len(universe)} ticker(s) filtered to {len(usd)}.")
+        return True
+    else:
+        print("Ticker universe returned unexpected rows.")
+        return False
+
+def test_identity_map(path = test_env_path):
+    db = DataBase(path)
+    ticker_repo = db.ticker_repo
+
+    print("Checking shared ticker objects...")
+    ticker = ticker_repo.get_info(symbol="TEST_TICKER")
+    if ticker is None:
+        print("Ticker not found.")
+        return False
+    same = ticker_repo.get_info(ticker_id=ticker.id) is ticker and ticker.market.tickers[0].market is ticker.market
+    shared = ticker.exchange is ticker.market.exchange
+    ticker_repo.update(ticker.id, description="IDENTITY_TEST")
+    refreshed = ticker_repo.get_info(ticker_id=ticker.id)
+    if same and shared and refreshed is not ticker and refreshed.description == "IDENTITY_TEST":
+        print("Identity map returns shared objects and refreshes after writes.")
+        return True
+    else:
+        print("Identity map returned unexpected objects.")
+        return False
+
+def test_shared_registry(path = test_env_path):
+    db = DataBase(path, concurrent=True, readers=2)
+    ticker_repo = db.ticker_repo
+
+    print("Sharing the identity map across threads...")
+    ticker_id = ticker_repo.get_info(symbol="TEST_TICKER").id
+    errors = []
+    def walk():
+        try:
+            for _ in range(50):
+                ticker = ticker_repo.get_info(ticker_id=ticker_id)
+                if ticker is None or ticker.market.tickers is None:
+                    errors.append("missing ticker")
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=walk) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(10):
+        db.registry.invalidate()
+    for thread in threads:
+        thread.join()
+    same = ticker_repo.get_info(ticker_id=ticker_id) is ticker_repo.get_info(ticker_id=ticker_id)
+    # A get_all that raced a write must not mark the emptied map complete
+    generation = db.registry.generation
+    db.registry.invalidate()
+    db.registry.mark_complete("ticker", generation)
+    stale = db.registry.lookup("ticker", ticker_id) is not MISSING
+    db.connection.close()
+    if not errors and same and not stale:
+        print("Threads shared one identity map.")
+        return True
+    else:
+        print(f"Shared registry failed: {errors[:3]}, same object: {same}, stale complete: {stale}.")
+        return False
+
+def test_sql_tracing(path = test_env_path):
+    instrumentation = Instrumentation(threshold_ms=0, on_slow=None)
+    db = DataBase(path, trace=instrumentation)
+    ticker_repo = db.ticker_repo
+
+    print("Tracing repository queries...")
+    ticker_repo.get_info(symbol="TEST_TICKER")
+    ticker_repo.get_all()
+    ticker_repo.update(ticker_repo.get_info(symbol="TEST_TICKER").id, description="TRACE_TEST")
+    callers = set()
+    for stats in instrumentation.summary():
+        callers.update(stats["callers"])
+    planned = any(slow.plan and slow.caller == "TickerRepository.get_all" for slow in instrumentation.slow)
+    db.close()
+    if {"TickerRepository.get_info", "TickerRepository.get_all", "TickerRepository.update"} <= callers and planned and "COMMIT" in instrumentation.stats:
+        print(f"Traced {len(instrumentation.stats)} statements.")
+        return True
+    else:
+        print(f"Tracing missed queries: {sorted(callers)}")
+        return False
+
+def test_bulk_tickers(path = test_env_path):
+    db = DataBase(path)
+    ticker_repo = db.ticker_repo
+    exchange_id = fetch_exchange_id("TEST_EXCHANGE")
+
+    print("Reconciling tickers in bulk...")
+    symbols = [f"TEST_BULK_{i}" for i in range(200)]
+    first = ticker_repo.get_or_create_many(symbols[:100], 1, exchange_id, currency="USD", source="manual")
+    second = ticker_repo.get_or_create_many([{"symbol": symbol, "full_name": symbol.title()} for symbol in symbols], 1, exchange_id, currency="USD", source="manual")
+    found = ticker_repo.get_many(symbols=symbols[:10], exchange_id=exchange_id)
+    deleted = ticker_repo.delete_many(symbols=symbols)
+    if len(first) == 100 and len(second) == 200 and all(second[s] == first[s] for s in first) and len(found) == 10 and deleted == 200:
+        print(f"Created {len(second)} tickers in bulk and deleted {deleted}.")
+        return True
+    else:
+        print("Bulk ticker operations returned unexpected results.")
+        return False
+
+def test_transaction_batching(path = test_env_path):
+    db = DataBase(path)
+    ticker_repo = db.ticker_repo
+    exchange_id = fetch_exchange_id("TEST_EXCHANGE")
+
+    print("Creating tickers in one transaction...")
+    with db.transaction():
+        for i in range(50):
+            ticker_repo.create(f"TEST_BATCH_{i}", 1, exchange_id, currency="USD", source="manual")
+        try:
+            with db.transaction():
+                ticker_repo.create("TEST_BATCH_INNER", 1, exchange_id, currency="USD", source="manual")
+                raise RuntimeError("inner failure")
+        except RuntimeError:
+            pass
+        pending = db.connection.in_transaction
+    try:
+        with db.batch():
+            ticker_repo.create("TEST_BATCH_FAILED", 1, exchange_id, currency="USD", source="manual")
+            raise RuntimeError("outer failure")
+    except RuntimeError:
+        pass
+
+    count = lambda pattern: db.get_custom("SELECT COUNT(*) FROM tickers WHERE symbol LIKE ?", (pattern,))[0][0]
+    created, inner, failed = count("TEST_BATCH_%"), count("TEST_BATCH_INNER"), count("TEST_BATCH_FAILED")
+    db.get_custom("DELETE FROM tickers WHERE symbol LIKE 'TEST_BATCH_%'")
+    db.connection.commit()
+    if pending and created == 50 and inner == 0 and failed == 0:
+        print("Batched writes committed once; failed blocks rolled back.")
+        return True
+    else:
+        print(f"Unexpected batch result: {created} created, {inner} inner, {failed} failed.")
+        return False
+
 def test_ticker_update(path = test_env_path):
     db = DataBase(path)
     ticker_repo = db.ticker_repo
@@ -119,12 +285,33 @@ def ticker_tests():
     if not test_ticker_retrieval():
         print("Ticker retrieval test failed.")
         check = False
+    if not test_shared_registry():
+        print("Shared registry test failed.")
+        check = False
+    if not test_sql_tracing():
+        print("SQL tracing test failed.")
+        check = False
+    if not test_bulk_tickers():
+        print("Bulk ticker test failed.")
+        check = False
+    if not test_transaction_batching():
+        print("Transaction batching test failed.")
+        check = False
     if not test_ticker_update():
         print("Ticker update test failed.")
         check = False
     if not test_ticker_links():
         print("Ticker links test failed.")
         check = False
+    if not test_eager_loading():
+        print("Eager loading test failed.")
+        check = False
+    if not test_ticker_universe():
+        print("Ticker universe test failed.")
+        check = False
+    if not test_identity_map():
+        print("Identity map test failed.")
+        check = False
     if not test_ticker_deletion():
         print("Ticker deletion test failed.")
         check = False
@@ -0,0 +1,301 @@
+from database.db import DataBase
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3 as sql
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+# Synthetic sessions: 78 five-minute bars a weekday, 14:30 - 21:00 UTC
+BARS_PER_DAY = 78
+SESSION_OPEN = np.timedelta64(14 * 3600 + 30 * 60, "s")
+TIMEZONES = ["America/New_York", "Europe/London", "Asia/Tokyo", "Europe/Frankfurt", "Australia/Sydney"]
+
+
+class SyntheticMarket:
+    """
+    Deterministic synthetic dataset: `exchanges` exchanges with one market each,
+    `tickers` tickers spread across them, `days` weekdays of 5-minute bars per ticker
+    (random walk) and an option chain of `expirations` x `strikes` calls and puts per
+    ticker for the first `option_tickers` tickers.
+    """
+
+    def __init__(self, *, exchanges: int = 3, tickers: int = 2000, days: int = 20, option_tickers: int = 50, expirations: int = 4, strikes: int = 20, seed: int = 7):
+        self.exchanges = [(f"BENCH_X{i}", TIMEZONES[i % len(TIMEZONES)]) for i in range(exchanges)]
+        self.symbols = [f"B{i:05d}" for i in range(tickers)]
+        self.days = pd.bdate_range("2024-01-02", periods=days).to_numpy().astype("datetime64[s]")
+        self.option_tickers = min(option_tickers, tickers)
+        self.expirations = expirations
+        self.strikes = strikes
+        self.seed = seed
+
+    @property
+    def bar_count(self) -> int:
+        return len(self.symbols) * len(self.days) * BARS_PER_DAY
+
+    def exchange_of(self, i: int) -> int:
+        """Index of the exchange listing ticker i."""
+        return i % len(self.exchanges)
+
+    def stamps(self) -> np.ndarray:
+        offsets = SESSION_OPEN + np.arange(BARS_PER_DAY) * np.timedelta64(300, "s")
+        return (self.days[:, None] + offsets[None, :]).ravel()
+
+    def bars(self, i: int) -> dict:
+        """Column arrays of ticker i's bars (as accepted by HistoricalPricesRepository.create_many)."""
+        rng = np.random.default_rng(self.seed + i)
+        stamps = self.stamps()
+        close = 50 + 50 * rng.random() + np.cumsum(rng.normal(0, 0.1, len(stamps)))
+        spread = np.abs(rng.normal(0, 0.05, len(stamps)))
+        return {
+            "datetime": stamps,
+            "open": close - rng.normal(0, 0.05, len(stamps)),
+            "high": close + spread,
+            "low": close - spread,
+            "close": close,
+            "volume": rng.integers(100, 10_000, len(stamps)).astype("float64"),
+        }
+
+    def option_chain(self, symbol: str, spot: float, quote_time) -> pd.DataFrame:
+        """
+        A chain snapshot around spot in the layout OptionsData.chain returns. Only contracts
+        within 5% of spot are requoted between snapshots; the wings keep their quotes.
+        """
+        start = pd.Timestamp(self.days[0], tz="UTC")
+        expirations = [start + pd.offsets.Week(n + 1, weekday=4) for n in range(self.expirations)]
+        strikes = np.round(spot * np.linspace(0.8, 1.2, self.strikes), 1)
+        expiry, strike, right = (a.ravel() for a in np.meshgrid(np.array(expirations, dtype=object), strikes, np.array(["C", "P"]), indexing="ij"))
+        rng = np.random.default_rng(self.seed + int(pd.Timestamp(quote_time).timestamp()))
+        active = np.abs(strike / spot - 1) <= 0.05
+        bid = np.maximum(np.where(right == "C", spot - strike, strike - spot), 0) + np.where(active, rng.random(len(strike)), 0.5)
+        return pd.DataFrame({
+            "ticker": symbol,
+            "expiry": list(expiry),
+            "right": right,
+            "strike": strike,
+            "bid": bid,
+            "ask": bid + 0.1,
+            "last": bid + 0.05,
+            "volume": 10.0,
+            "open_interest": 100.0,
+            "quote_time": pd.Timestamp(quote_time, tz="UTC"),
+            "contractSymbol": [f"{symbol} {e.strftime('%y%m%d')}{r}{int(k * 1000):08d}" for e, k, r in zip(expiry, strike, right)],
+        })
+
+class Benchmark:
+    """Collects timings as {"name", "seconds", "operations", "per_second", latency percentiles}."""
+
+    def __init__(self):
+        self.results = []
+
+    @contextlib.contextmanager
+    def timed(self, name: str, operations: int, unit: str = "ops"):
+        started = time.perf_counter()
+        yield
+        self.add(name, time.perf_counter() - started, operations, unit)
+
+    def add(self, name: str, seconds: float, operations: int, unit: str = "ops", latencies: list | None = None) -> None:
+        result = {"name": name, "seconds": round(seconds, 6), "operations": operations, "unit": unit, "per_second": round(operations / seconds, 1) if seconds else None}
+        if latencies:
+            latencies = np.asarray(latencies) * 1e3
+            result.update({"p50_ms": round(float(np.percentile(latencies, 50)), 4), "p95_ms": round(float(np.percentile(latencies, 95)), 4), "max_ms": round(float(latencies.max()), 4)})
+        self.results.append(result)
+        rate = f"{result['per_second']:>12,.0f} {unit}/s" if result["per_second"] else ""
+        percentiles = f"  p50 {result['p50_ms']:.3f} ms  p95 {result['p95_ms']:.3f} ms" if latencies is not None and len(latencies) else ""
+        print(f"{name:<40} {seconds:>9.3f} s {rate}{percentiles}")
+
+    def latencies(self, name: str, calls: list, unit: str = "lookups") -> None:
+        """Time each call separately (point lookups and range reads)."""
+        timings = []
+        for call in calls:
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+        self.add(name, sum(timings), len(timings), unit, timings)
+
+
+# --- Stages ---
+def bench_reference_ingest(bench, db, market):
+    with bench.timed("ingest exchanges+markets", len(market.exchanges), "rows"):
+        exchange_ids = db.exchange_repo.get_or_create_many(dict(market.exchanges))
+        db.market_repo.get_or_create_many([(1, exchange_ids[name]) for name, _ in market.exchanges])
+    ticker_ids = {}
+    with bench.timed("ingest tickers", len(market.symbols), "rows"):
+        for x, (name, _) in enumerate(market.exchanges):
+            symbols = [symbol for i, symbol in enumerate(market.symbols) if market.exchange_of(i) == x]
+            ticker_ids.update(db.ticker_repo.get_or_create_many(symbols, 1, exchange_ids[name], currency="USD", source="bench"))
+    with bench.timed("ingest equities", len(ticker_ids), "rows"):
+        db.equity_repo.create_many([{"ticker_id": ticker_id, "symbol": symbol, "sector": "Synthetic"} for symbol, ticker_id in ticker_ids.items()])
+    return exchange_ids, ticker_ids
+
+def bench_bar_ingest(bench, db, market, ticker_ids):
+    generated = [(ticker_ids[symbol], market.bars(i)) for i, symbol in enumerate(market.symbols)]
+    with bench.timed("ingest 5-minute bars (with rollups)", market.bar_count, "bars"):
+        for ticker_id, bars in generated:
+            db.prices_repo.create_many(ticker_id, bars)
+    # Re-sending the last day of every ticker, as an incremental fetch would
+    last_day = [(ticker_id, {name: values[-BARS_PER_DAY:] for name, values in bars.items()}) for ticker_id, bars in generated]
+    with bench.timed("upsert overlapping bars", len(last_day) * BARS_PER_DAY, "bars"):
+        for ticker_id, bars in last_day:
+            db.prices_repo.upsert_many(ticker_id, bars)
+
+def bench_point_lookups(bench, db, market, exchange_ids, ticker_ids, rng, samples):
+    symbols = rng.choice(market.symbols, samples)
+    ids = [ticker_ids[symbol] for symbol in symbols]
+    names = [name for name, _ in market.exchanges]
+
+    def cold(call):
+        # Drop the identity map first so every lookup reaches SQLite
+        def run():
+            db.registry.invalidate()
+            call()
+        return run
+    bench.latencies("ticker by symbol", [cold(lambda s=s: db.ticker_repo.get_info(symbol=s)) for s in symbols])
+    bench.latencies("ticker by id", [cold(lambda t=t: db.ticker_repo.get_info(ticker_id=t)) for t in ids])
+    bench.latencies("ticker by id (identity map)", [lambda t=t: db.ticker_repo.get_info(ticker_id=t) for t in ids])
+    bench.latencies("equity by symbol", [cold(lambda s=s: db.equity_repo.get_info(symbol=s)) for s in symbols])
+    bench.latencies("exchange by name", [cold(lambda n=names[i % len(names)]: db.exchange_repo.get_info(exchange_name=n)) for i in range(samples)])
+    bench.latencies("markets of exchange", [cold(lambda x=exchange_ids[names[i % len(names)]]: db.market_repo.get_by_exchange(x)) for i in range(samples)])
+    with bench.timed("get_many 1000 symbols", 1000, "rows"):
+        db.ticker_repo.get_many(symbols=list(rng.choice(market.symbols, 1000, replace=False)) if len(market.symbols) >= 1000 else market.symbols)
+    with bench.timed("load ticker universe", len(market.symbols), "rows"):
+        db.ticker_repo.load_universe()
+
+def bench_range_reads(bench, db, market, ticker_ids, rng, samples):
+    ids = [ticker_ids[symbol] for symbol in rng.choice(market.symbols, samples)]
+    first, last = pd.Timestamp(market.days[0]), pd.Timestamp(market.days[-1]) + pd.Timedelta(days=1)
+    day = pd.Timestamp(market.days[len(market.days) // 2])
+    bench.latencies("fetch_raw one day (numpy)", [lambda t=t: db.prices_repo.fetch_raw(t, day, day + pd.Timedelta(days=1), output="numpy") for t in ids], "reads")
+    bench.latencies("fetch_raw full history (numpy)", [lambda t=t: db.prices_repo.fetch_raw(t, first, last, output="numpy") for t in ids], "reads")
+    bench.latencies("fetch_raw full history (rows)", [lambda t=t: db.prices_repo.fetch_raw(t, first, last) for t in ids], "reads")
+    bench.latencies("close prices full history (numpy)", [lambda t=t: db.prices_repo.get_close_prices(t, first, last, output="numpy") for t in ids], "reads")
+
+def bench_aggregation(bench, db, market, ticker_ids, rng, samples):
+    ids = [ticker_ids[symbol] for symbol in rng.choice(market.symbols, samples)]
+    first, last = pd.Timestamp(market.days[0]), pd.Timestamp(market.days[-1]) + pd.Timedelta(days=1)
+    bench.latencies("5-minute rollup read", [lambda t=t: db.prices_repo.fetch_five_minute(t, first, last, output="numpy") for t in ids], "reads")
+    bench.latencies("hourly rollup read", [lambda t=t: db.prices_repo.fetch_hourly(t, first, last, output="numpy") for t in ids], "reads")
+    bench.latencies("daily rollup read", [lambda t=t: db.prices_repo.fetch_daily(t, first, last, output="numpy") for t in ids], "reads")
+    bench.latencies("resample to 30 minutes", [lambda t=t: db.prices_repo.resample(t, "30m", first, last) for t in ids], "reads")
+    with bench.timed("rebuild all rollups", market.bar_count, "bars"):
+        db.prices_repo.rebuild_rollups()
+
+def bench_option_chains(bench, db, market, ticker_ids, rng, samples):
+    symbols = market.symbols[:market.option_tickers]
+    stamps = market.stamps()[::12]
+    spots = {symbol: 50.0 + i % 50 for i, symbol in enumerate(symbols)}
+    first = [(ticker_ids[symbol], market.option_chain(symbol, spots[symbol], stamps[0])) for symbol in symbols]
+    contracts = sum(len(chain) for _, chain in first)
+    with bench.timed("ingest option chains", contracts, "contracts"):
+        for ticker_id, chain in first:
+            db.options_repo.ingest_snapshot(chain, ticker_id)
+    # Every quote for half of the tickers, change-only (delta) for the other half
+    half = len(symbols) // 2
+    for name, delta, group in (("ingest option snapshots", False, symbols[:half]), ("ingest option snapshots (delta)", True, symbols[half:])):
+        later = [(ticker_ids[symbol], market.option_chain(symbol, spots[symbol], stamp)) for stamp in stamps[1:] for symbol in group]
+        written = 0
+        with bench.timed(name, sum(len(chain) for _, chain in later), "quotes"):
+            for ticker_id, chain in later:
+                written += db.options_repo.ingest_snapshot(chain, ticker_id, delta=delta)[1]
+        bench.results[-1]["rows_written"] = written
+    picks = rng.choice(len(first), samples)
+    rows = rng.integers(0, len(first[0][1]), samples)
+    expiry = lambda k, j: first[k][1]["expiry"].iloc[j]
+    bench.latencies("option chain for expiry", [lambda k=k, j=j: db.options_repo.get_chain(first[k][0], expiry(k, j)) for k, j in zip(picks, rows)])
+    bench.latencies("option contract by symbol", [lambda k=k, j=j: db.options_repo.get_by_symbol(first[k][1]["contractSymbol"].iloc[j]) for k, j in zip(picks, rows)])
+    bench.latencies("latest option snapshot", [lambda k=k: db.options_repo.get_snapshot(first[k][0]) for k in picks], "reads")
+    as_of = [pd.Timestamp(stamps[j], tz="UTC") for j in rng.integers(0, len(stamps), samples)]
+    bench.latencies("option surface arrays as of", [lambda k=k, t=t: db.options_repo.surface_arrays(first[k][0], t, curve=0.04) for k, t in zip(picks, as_of)], "reads")
+
+def bench_deletes(bench, db, market, exchange_ids, ticker_ids):
+    symbol = market.symbols[0]
+    with bench.timed("delete one ticker's bars", len(market.days) * BARS_PER_DAY, "bars"):
+        db.prices_repo.delete(ticker_ids[symbol])
+    name = market.exchanges[-1][0]
+    listed = sum(1 for i in range(len(market.symbols)) if market.exchange_of(i) == len(market.exchanges) - 1)
+    with bench.timed("cascade delete exchange", listed * len(market.days) * BARS_PER_DAY, "bars"):
+        db.exchange_repo.delete(exchange_id=exchange_ids[name])
+
+# --- Runner ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(market, *, path, layout="epoch", concurrent=False, samples=200, stages=None):
+    """Build a fresh database at path, run every stage and return the JSON-ready report."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        DataBase(path).create_db(layout=layout)
+    db = DataBase(path, concurrent=concurrent)
+    bench = Benchmark()
+    rng = np.random.default_rng(market.seed)
+    wanted = lambda stage: stages is None or stage in stages
+    exchange_ids, ticker_ids = bench_reference_ingest(bench, db, market)
+    if wanted("ingest"):
+        bench_bar_ingest(bench, db, market, ticker_ids)
+    if wanted("lookups"):
+        bench_point_lookups(bench, db, market, exchange_ids, ticker_ids, rng, samples)
+    if wanted("ranges"):
+        bench_range_reads(bench, db, market, ticker_ids, rng, samples)
+    if wanted("aggregation"):
+        bench_aggregation(bench, db, market, ticker_ids, rng, samples)
+    if wanted("options"):
+        bench_option_chains(bench, db, market, ticker_ids, rng, samples)
+    if wanted("deletes"):
+        bench_deletes(bench, db, market, exchange_ids, ticker_ids)
+    size = os.path.getsize(path)
+    db.close()
+    return {
+        "meta": {
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sql.sqlite_version,
+            "platform": platform.platform(),
+            "layout": layout,
+            "concurrent": concurrent,
+            "exchanges": len(market.exchanges),
+            "tickers": len(market.symbols),
+            "days": len(market.days),
+            "bars": market.bar_count,
+            "samples": samples,
+            "database_bytes": size,
+        },
+        "results": bench.results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the database layer on synthetic data (offline, temporary SQLite file).")
+    parser.add_argument("--exchanges", type=int, default=3)
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=20, help="Weekdays of 5-minute bars per ticker (78 bars a day).")
+    parser.add_argument("--option-tickers", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=200, help="Calls per lookup/read benchmark.")
+    parser.add_argument("--layout", choices=["epoch", "text"], default="epoch")
+    parser.add_argument("--concurrent", action="store_true", help="Run through the WAL connection pool.")
+    parser.add_argument("--stages", nargs="*", choices=["ingest", "lookups", "ranges", "aggregation", "options", "deletes"])
+    parser.add_argument("--quick", action="store_true", help="Small dataset for a smoke run.")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.tickers, args.days, args.option_tickers, args.samples = 100, 5, 5, 50
+    market = SyntheticMarket(exchanges=args.exchanges, tickers=args.tickers, days=args.days, option_tickers=args.option_tickers)
+    print(f"Benchmarking {len(market.symbols)} tickers, {market.bar_count:,} bars ({args.layout} layout)")
+    with tempfile.TemporaryDirectory() as folder:
+        report = run_benchmarks(market, path=os.path.join(folder, "bench.db"), layout=args.layout, concurrent=args.concurrent, samples=args.samples, stages=args.stages)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@ from .database.basic import basic_tests
 from .database.exchanges import exchange_tests
 from .database.markets import market_tests
 from .database.tickers import ticker_tests
+from .database.historical_prices import historical_price_tests
+from .database.option_chains import option_chain_tests
+from .database.query_plans import query_plan_tests
+from .database.ingestion import ingestion_tests
 import argparse
 
 def main():
@@ -9,9 +13,9 @@ def main():
     parser.add_argument(
         "--test",
         type=str,
-        choices=["basic", "exchanges", "markets", "tickers", "all"],
+        choices=["basic", "exchanges", "markets", "tickers", "prices", "options", "plans", "ingestion", "all"],
         default="all",
-        help="Specify which tests to run: 'basic', 'exchanges', 'markets', 'tickers', or 'all'. Default is 'all'.",
+        help="Specify which tests to run: 'basic', 'exchanges', 'markets', 'tickers', 'prices', 'options', 'plans', 'ingestion', or 'all'. Default is 'all'.",
     )
     args = parser.parse_args()
 
@@ -23,11 +27,23 @@ def main():
         market_tests()
     elif args.test == "tickers":
         ticker_tests()
+    elif args.test == "prices":
+        historical_price_tests()
+    elif args.test == "options":
+        option_chain_tests()
+    elif args.test == "plans":
+        query_plan_tests()
+    elif args.test == "ingestion":
+        ingestion_tests()
     elif args.test == "all":
         basic_tests()
         exchange_tests()
         market_tests()
         ticker_tests()
+        historical_price_tests()
+        option_chain_tests()
+        query_plan_tests()
+        ingestion_tests()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file